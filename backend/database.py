@@ -0,0 +1,40 @@
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase
+from typing import Optional, Any
+from services.pool_monitor import pool_monitor
+import os
+
+_client: Optional[AsyncIOMotorClient] = None
+_embedded: Optional[Any] = None
+
+
+def storage_backend() -> str:
+    """STORAGE_BACKEND=mongo (default) or embedded, the in-process store in services.embedded_store"""
+    return os.environ.get('STORAGE_BACKEND', 'mongo').lower()
+
+
+def get_client() -> AsyncIOMotorClient:
+    """The process-wide Motor client, created on first use rather than at import"""
+    global _client
+    if _client is None:
+        _client = AsyncIOMotorClient(os.environ['MONGO_URL'], event_listeners=[pool_monitor])
+    return _client
+
+
+def get_database() -> AsyncIOMotorDatabase:
+    global _embedded
+    if storage_backend() == 'embedded':
+        if _embedded is None:
+            from services.embedded_store import EmbeddedDatabase
+            _embedded = EmbeddedDatabase(os.environ.get('DB_NAME', 'embedded'), os.environ.get('EMBEDDED_DB_PATH') or None)
+        return _embedded
+    return get_client()[os.environ['DB_NAME']]
+
+
+def close_client() -> None:
+    global _client, _embedded
+    if _client is not None:
+        _client.close()
+        _client = None
+    if _embedded is not None:
+        _embedded.close()
+        _embedded = None
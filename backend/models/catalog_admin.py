@@ -0,0 +1,64 @@
+from pydantic import BaseModel, Field
+from typing import List, Optional, Dict, Any
+
+
+class CatalogImportCounts(BaseModel):
+    created: int = 0
+    updated: int = 0
+    unchanged: int = 0
+    deactivated: int = 0
+
+
+class CatalogImportReport(BaseModel):
+    products_read: int = 0
+    stones: CatalogImportCounts = CatalogImportCounts()
+    settings: CatalogImportCounts = CatalogImportCounts()
+    metals: CatalogImportCounts = CatalogImportCounts()
+    skipped: int = 0
+    errors: List[str] = []
+    catalog_version: Optional[int] = None
+
+
+class CatalogItemOperation(BaseModel):
+    action: str  # create, update, deactivate
+    id: Optional[str] = None
+    data: Dict[str, Any] = {}
+
+
+class StoneSizePrice(BaseModel):
+    carat: float
+    price: Optional[float] = None
+    availability: Optional[str] = None
+
+
+class StoneSizePriceUpdate(BaseModel):
+    stone_id: str
+    sizes: List[StoneSizePrice]
+
+
+class CutPriceUpdate(BaseModel):
+    cut: str
+    carat: Optional[float] = None       # None applies to every size of the cut
+    price: Optional[float] = Field(None, gt=0)       # absolute price (requires carat)
+    multiplier: Optional[float] = Field(None, gt=0)  # relative adjustment, e.g. 1.05 for +5%
+
+
+class CatalogBulkRequest(BaseModel):
+    stones: List[CatalogItemOperation] = []
+    settings: List[CatalogItemOperation] = []
+    metals: List[CatalogItemOperation] = []
+    stone_size_prices: List[StoneSizePriceUpdate] = []
+    cut_prices: List[CutPriceUpdate] = []
+
+
+class CatalogWriteCounts(BaseModel):
+    inserted: int = 0
+    matched: int = 0
+    modified: int = 0
+
+
+class CatalogBulkResponse(BaseModel):
+    catalog_version: int
+    stones: CatalogWriteCounts = CatalogWriteCounts()
+    settings: CatalogWriteCounts = CatalogWriteCounts()
+    metals: CatalogWriteCounts = CatalogWriteCounts()
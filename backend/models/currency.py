@@ -0,0 +1,17 @@
+from pydantic import BaseModel, Field
+from typing import Dict, Optional
+from datetime import datetime
+
+
+class CurrencyRule(BaseModel):
+    rate: float = Field(gt=0)  # units of this currency per unit of the base currency
+    decimals: int = Field(default=2, ge=0, le=4)
+    increment: Optional[float] = Field(default=None, gt=0)  # e.g. 0.05 for CHF cash rounding
+    rounding: str = "nearest"  # nearest, up, down
+
+
+class CurrencyRates(BaseModel):
+    base: str = "USD"
+    currencies: Dict[str, CurrencyRule] = {}
+    version: int = 0
+    updated_at: Optional[datetime] = None
@@ -0,0 +1,31 @@
+from pydantic import BaseModel, Field
+from typing import List, Optional
+from datetime import datetime
+import uuid
+
+
+class StockLevel(BaseModel):
+    stone_id: str
+    carat: float
+    on_hand: int = Field(ge=0)
+
+
+class StockUpdateRequest(BaseModel):
+    levels: List[StockLevel]
+
+
+class StockUpdateResponse(BaseModel):
+    created: int = 0
+    updated: int = 0
+
+
+class InventoryHold(BaseModel):
+    hold_id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    stone_id: str
+    carat: float
+    quantity: int = 1
+    quote_request_id: Optional[str] = None
+    configuration_id: Optional[str] = None
+    status: str = "active"  # active, committed, released, expired
+    expires_at: datetime
+    created_at: datetime = Field(default_factory=datetime.utcnow)
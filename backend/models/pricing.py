@@ -0,0 +1,55 @@
+from pydantic import BaseModel, Field
+from typing import List, Optional
+from datetime import datetime
+import uuid
+
+
+class PricingRule(BaseModel):
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    name: str
+    kind: str = "percentage"  # percentage, amount
+    value: float = Field(gt=0)  # percent off, or amount off in the base currency
+    target: str = "total"  # total, stone, setting, metal_adjustment
+    # Conditions; every condition that is set must match (several together make a bundle)
+    stone_ids: Optional[List[str]] = None
+    cuts: Optional[List[str]] = None
+    setting_ids: Optional[List[str]] = None
+    metal_ids: Optional[List[str]] = None
+    min_carat: Optional[float] = None
+    max_carat: Optional[float] = None
+    starts_at: Optional[datetime] = None
+    ends_at: Optional[datetime] = None
+    priority: int = 0  # higher runs first
+    exclusive: bool = False  # when it applies, lower-priority rules are skipped
+    is_active: bool = True
+
+
+class PricingRuleSet(BaseModel):
+    rules: List[PricingRule] = []
+    version: int = 0
+    updated_at: Optional[datetime] = None
+
+
+class PriceMatrixRequest(BaseModel):
+    stone_id: str
+    carats: Optional[List[float]] = None  # every size of the stone when omitted
+    setting_ids: List[str]
+    metal_ids: List[str]
+    currency: Optional[str] = None
+
+
+class PriceMatrixCell(BaseModel):
+    carat: float
+    setting_id: str
+    metal_id: str
+    total_price: Optional[float] = None
+    savings: Optional[float] = None
+    error: Optional[str] = None
+
+
+class PriceMatrixResponse(BaseModel):
+    stone_id: str
+    currency: str
+    catalog_version: int
+    rules_version: int
+    prices: List[PriceMatrixCell]
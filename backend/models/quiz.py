@@ -0,0 +1,33 @@
+from pydantic import BaseModel, Field
+from typing import List, Optional, Dict
+from datetime import datetime
+from models.ring_builder import PersonalityRecommendation, RecommendedCombination
+import uuid
+
+
+class QuizSession(BaseModel):
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    answers: Dict[str, str] = {}  # question id -> personality, in the order first answered
+    completed: bool = False
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+    expires_at: Optional[datetime] = None
+    version: int = 0  # incremented by every answer
+
+
+class QuizAnswer(BaseModel):
+    question_id: int
+    personality: str
+
+
+class QuizSessionResponse(BaseModel):
+    session_id: str
+    answered: int
+    total_questions: int
+    complete: bool
+    scores: Dict[str, int]
+    # Provisional until complete; lets the client prefetch the likely result
+    personality: Optional[str] = None
+    confidence: float = 0.0
+    recommendation: Optional[PersonalityRecommendation] = None
+    alternatives: List[RecommendedCombination] = []
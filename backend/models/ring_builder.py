@@ -18,6 +18,7 @@ class Stone(BaseModel):
     description: str
     shopify_product_id: Optional[str] = None
     is_active: bool = True
+    catalog_version: Optional[int] = None  # version of the last change to this item
     created_at: datetime = Field(default_factory=datetime.utcnow)
 
     class Config:
@@ -34,6 +35,7 @@ class Setting(BaseModel):
     personality_tags: List[str]
     shopify_variant_id: Optional[str] = None
     is_active: bool = True
+    catalog_version: Optional[int] = None
     created_at: datetime = Field(default_factory=datetime.utcnow)
 
     class Config:
@@ -50,6 +52,7 @@ class Metal(BaseModel):
     description: str
     shopify_option_id: Optional[str] = None
     is_active: bool = True
+    catalog_version: Optional[int] = None
     created_at: datetime = Field(default_factory=datetime.utcnow)
 
     class Config:
@@ -75,10 +78,24 @@ class PersonalityRecommendation(BaseModel):
 class QuizAnalysisRequest(BaseModel):
     answers: List[Dict[str, str]]  # [{"questionId": "1", "personality": "classic"}]
 
+class RecommendedCombination(BaseModel):
+    stone_id: str
+    carat: float
+    setting_id: str
+    metal_id: str
+    score: float  # 0..1 similarity to the reference selection
+    total_price: Optional[float] = None
+
 class QuizAnalysisResponse(BaseModel):
     personality: str
     recommendation: PersonalityRecommendation
     confidence: float
+    alternatives: List[RecommendedCombination] = []
+
+class SimilarConfigurationsResponse(BaseModel):
+    configuration_id: str
+    catalog_version: Optional[int] = None  # None while the first recommendation index is still building
+    items: List[RecommendedCombination]
 
 class PriceCalculationRequest(BaseModel):
     stone_id: str
@@ -86,16 +103,39 @@ class PriceCalculationRequest(BaseModel):
     metal_id: str
     carat: float
 
+class DiscountLine(BaseModel):
+    rule_id: str
+    name: str
+    amount: float
+
 class PriceBreakdown(BaseModel):
     stone: float
     setting: float
     metal_adjustment: float
+    discounts: List[DiscountLine] = []
 
 class PriceCalculationResponse(BaseModel):
     total_price: float
     breakdown: PriceBreakdown
     savings: Optional[float] = None
-    details: Dict
+    catalog_version: Optional[int] = None
+    currency: str = "USD"
+    details: Dict  # item references; full items only when expanded
+
+class BatchPriceRequest(BaseModel):
+    items: List[PriceCalculationRequest] = Field(max_length=500)
+    currency: Optional[str] = None
+
+class BatchPriceItem(BaseModel):
+    total_price: Optional[float] = None
+    breakdown: Optional[PriceBreakdown] = None
+    savings: Optional[float] = None
+    error: Optional[str] = None
+
+class BatchPriceResponse(BaseModel):
+    currency: str
+    catalog_version: int
+    prices: List[BatchPriceItem]
 
 class RingConfiguration(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
@@ -106,14 +146,35 @@ class RingConfiguration(BaseModel):
     personality_type: Optional[str] = None
     total_price: float
     customer_info: Optional[Dict] = None
+    catalog_version: Optional[int] = None
+    price_breakdown: Optional[PriceBreakdown] = None
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: datetime = Field(default_factory=datetime.utcnow)
+    expires_at: Optional[datetime] = None  # unset once a quote references the configuration
+    version: int = 1  # bumped by every update; configurations saved before versioning count as 1
 
     class Config:
         json_encoders = {
             datetime: lambda v: v.isoformat()
         }
 
+class ConfigurationUpdate(BaseModel):
+    version: int  # the version the client last read; the update is rejected if it has moved on
+    stone_id: Optional[str] = None
+    setting_id: Optional[str] = None
+    metal_id: Optional[str] = None
+    carat: Optional[float] = None
+    personality_type: Optional[str] = None
+
+class CatalogChanges(BaseModel):
+    since: int
+    catalog_version: int
+    full: bool = False  # items are the whole active catalog; replace the local copy instead of merging
+    stones: List[Stone] = []
+    settings: List[Setting] = []
+    metals: List[Metal] = []
+    removed: Dict[str, List[str]] = {}  # kind -> ids deactivated since `since`
+
 class CustomerDetails(BaseModel):
     name: str
     email: str
@@ -124,12 +185,27 @@ class QuoteRequest(BaseModel):
     configuration_id: str
     customer_details: CustomerDetails
 
+class ConfigurationReference(BaseModel):
+    configuration_id: str
+    configuration_version: Optional[int] = None  # the configuration version that was quoted
+    catalog_version: Optional[int] = None
+    stone_id: str
+    setting_id: str
+    metal_id: str
+    carat: float
+    personality_type: Optional[str] = None
+    total_price: float
+    breakdown: Optional[PriceBreakdown] = None
+
 class QuoteRequestResponse(BaseModel):
     quote_request_id: str
     status: str = "submitted"
     estimated_response: str = "24-48 hours"
-    configuration: RingConfiguration
+    configuration_ref: ConfigurationReference
+    configuration: Optional[RingConfiguration] = None  # only when expanded, never stored
     customer_details: CustomerDetails
+    hold_id: Optional[str] = None
+    hold_expires_at: Optional[datetime] = None
     created_at: datetime = Field(default_factory=datetime.utcnow)
 
     class Config:
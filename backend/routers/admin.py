@@ -0,0 +1,280 @@
+from fastapi import APIRouter, HTTPException, Depends, UploadFile, File, Header, Query
+from fastapi.responses import StreamingResponse, PlainTextResponse
+from typing import Optional, List, Dict, Any
+from datetime import datetime
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from models.catalog_admin import CatalogImportReport, CatalogBulkRequest, CatalogBulkResponse
+from models.inventory import StockUpdateRequest, StockUpdateResponse
+from models.currency import CurrencyRates
+from models.pricing import PricingRule, PricingRuleSet
+from services.shopify_import import import_shopify_export, detect_format
+from services.catalog_admin_service import CatalogAdminService
+from services.analytics import AnalyticsReader
+from services.retention import ConfigurationRetention
+from services.inventory import InventoryService, inventory_tracker
+from services.currency import get_rates, set_rates, currency_tables
+from services.pricing_rules import get_rule_set, set_rule_set, pricing_rules
+from services.export import QUOTE_COLUMNS, CONFIGURATION_COLUMNS, MEDIA_TYPES, create_encoder, stream_export
+from services.profiler import sampling_profiler, request_profiles, ProfilerBusyError
+from routers.ring_builder import get_db
+import hmac
+import io
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+# Create router
+router = APIRouter(prefix="/ring-builder/admin", tags=["Ring Builder Admin"])
+
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    """Reject requests without the configured ADMIN_API_TOKEN"""
+    expected = os.environ.get("ADMIN_API_TOKEN")
+    if not expected:
+        raise HTTPException(status_code=403, detail="Admin API is disabled")
+    if not x_admin_token or not hmac.compare_digest(x_admin_token, expected):
+        raise HTTPException(status_code=401, detail="Invalid admin token")
+
+@router.post("/catalog/bulk", response_model=CatalogBulkResponse, dependencies=[Depends(require_admin)])
+async def bulk_update_catalog(
+    request: CatalogBulkRequest,
+    db: AsyncIOMotorDatabase = Depends(get_db)
+):
+    """Create, update or deactivate catalog items and reprice stone sizes in one batch"""
+    try:
+        return await CatalogAdminService(db).apply_bulk(request)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error("Error applying catalog bulk update: %s", e)
+        raise HTTPException(status_code=500, detail="Error applying catalog bulk update")
+
+@router.post("/import/shopify", response_model=CatalogImportReport, dependencies=[Depends(require_admin)])
+async def import_shopify(
+    file: UploadFile = File(...),
+    format: Optional[str] = None,
+    deactivate_missing: bool = False,
+    batch_size: int = 500,
+    db: AsyncIOMotorDatabase = Depends(get_db)
+):
+    """Import stones, settings and metals from a Shopify product export (json, jsonl or csv)"""
+    export_format = format or detect_format(file.filename)
+    try:
+        stream = io.TextIOWrapper(file.file, encoding="utf-8-sig", newline="")
+        return await import_shopify_export(
+            db,
+            stream,
+            export_format,
+            batch_size=batch_size,
+            deactivate_missing=deactivate_missing
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error("Error importing Shopify export: %s", e)
+        raise HTTPException(status_code=500, detail="Error importing Shopify export")
+
+@router.get("/analytics/summary", dependencies=[Depends(require_admin)])
+async def get_analytics_summary(db: AsyncIOMotorDatabase = Depends(get_db)):
+    """All-time personality distribution, configuration and quote totals"""
+    try:
+        return await AnalyticsReader(db).summary()
+    except Exception as e:
+        logger.error("Error fetching analytics summary: %s", e)
+        raise HTTPException(status_code=500, detail="Error fetching analytics summary")
+
+@router.get("/analytics/daily", response_model=List[Dict[str, Any]], dependencies=[Depends(require_admin)])
+async def get_analytics_daily(
+    days: int = Query(30, ge=1, le=366),
+    db: AsyncIOMotorDatabase = Depends(get_db)
+):
+    """Per-day rollups for the last N days"""
+    try:
+        return await AnalyticsReader(db).daily(days)
+    except Exception as e:
+        logger.error("Error fetching daily analytics: %s", e)
+        raise HTTPException(status_code=500, detail="Error fetching daily analytics")
+
+@router.get("/analytics/top-combinations", response_model=List[Dict[str, Any]], dependencies=[Depends(require_admin)])
+async def get_top_combinations(
+    by: str = Query("saved", pattern="^(saved|quoted)$"),
+    limit: int = Query(10, ge=1, le=100),
+    db: AsyncIOMotorDatabase = Depends(get_db)
+):
+    """Most saved or most quoted stone/setting/metal combinations"""
+    try:
+        return await AnalyticsReader(db).top_combinations(by, limit)
+    except Exception as e:
+        logger.error("Error fetching top combinations: %s", e)
+        raise HTTPException(status_code=500, detail="Error fetching top combinations")
+
+@router.get("/analytics/top-components", response_model=List[Dict[str, Any]], dependencies=[Depends(require_admin)])
+async def get_top_components(
+    component: str = Query(..., pattern="^(stone|setting|metal)$"),
+    by: str = Query("saved", pattern="^(saved|quoted)$"),
+    limit: int = Query(10, ge=1, le=100),
+    db: AsyncIOMotorDatabase = Depends(get_db)
+):
+    """Most saved or most quoted stones, settings or metals"""
+    try:
+        return await AnalyticsReader(db).top_components(component, by, limit)
+    except Exception as e:
+        logger.error("Error fetching top components: %s", e)
+        raise HTTPException(status_code=500, detail="Error fetching top components")
+
+def export_response(collection, columns, name: str, export_format: str, since: Optional[datetime]) -> StreamingResponse:
+    """Stream a collection export with chunked transfer encoding"""
+    try:
+        encoder = create_encoder(export_format, columns)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return StreamingResponse(
+        stream_export(collection, columns, encoder, since=since),
+        media_type=MEDIA_TYPES[export_format],
+        headers={"Content-Disposition": f'attachment; filename="{name}.{export_format}"'}
+    )
+
+@router.get("/export/quotes", dependencies=[Depends(require_admin)])
+async def export_quotes(
+    since: Optional[datetime] = None,
+    format: str = Query("csv", pattern="^(csv|parquet|ndjson)$"),
+    db: AsyncIOMotorDatabase = Depends(get_db)
+):
+    """Export quote requests as flat rows (csv, parquet or ndjson)"""
+    return export_response(db.quote_requests, QUOTE_COLUMNS, "quote_requests", format, since)
+
+@router.get("/export/configurations", dependencies=[Depends(require_admin)])
+async def export_configurations(
+    since: Optional[datetime] = None,
+    format: str = Query("csv", pattern="^(csv|parquet|ndjson)$"),
+    db: AsyncIOMotorDatabase = Depends(get_db)
+):
+    """Export saved ring configurations as flat rows (csv, parquet or ndjson)"""
+    return export_response(db.configurations, CONFIGURATION_COLUMNS, "configurations", format, since)
+
+@router.post("/retention/archive", dependencies=[Depends(require_admin)])
+async def archive_expired_configurations(
+    archive_all: bool = False,
+    db: AsyncIOMotorDatabase = Depends(get_db)
+):
+    """Archive interesting expired configurations and delete the expired ones"""
+    try:
+        return await ConfigurationRetention(db, archive_all=archive_all).archive_expired()
+    except Exception as e:
+        logger.error("Error archiving configurations: %s", e)
+        raise HTTPException(status_code=500, detail="Error archiving configurations")
+
+@router.put("/inventory", response_model=StockUpdateResponse, dependencies=[Depends(require_admin)])
+async def set_inventory(
+    request: StockUpdateRequest,
+    db: AsyncIOMotorDatabase = Depends(get_db)
+):
+    """Set on-hand stock per stone size; sizes without stock levels stay untracked"""
+    try:
+        return await InventoryService(db).set_stock(request.levels)
+    except Exception as e:
+        logger.error("Error updating inventory: %s", e)
+        raise HTTPException(status_code=500, detail="Error updating inventory")
+
+@router.post("/inventory/holds/{hold_id}/{action}", dependencies=[Depends(require_admin)])
+async def close_inventory_hold(
+    hold_id: str,
+    action: str,
+    db: AsyncIOMotorDatabase = Depends(get_db)
+):
+    """Commit a hold as a sale or release it back to available stock"""
+    if action not in ("commit", "release"):
+        raise HTTPException(status_code=404, detail="Unknown hold action")
+    try:
+        service = InventoryService(db)
+        closed = await (service.commit(hold_id) if action == "commit" else service.release(hold_id))
+    except Exception as e:
+        logger.error("Error closing inventory hold: %s", e)
+        raise HTTPException(status_code=500, detail="Error closing inventory hold")
+    if not closed:
+        raise HTTPException(status_code=404, detail="Active hold not found")
+    return {"hold_id": hold_id, "status": "committed" if action == "commit" else "released"}
+
+@router.get("/inventory/stats", dependencies=[Depends(require_admin)])
+async def get_inventory_stats():
+    """In-memory availability view and hold sweeper statistics"""
+    return inventory_tracker.stats()
+
+@router.get("/currency/rates", response_model=CurrencyRates, dependencies=[Depends(require_admin)])
+async def get_currency_rates(db: AsyncIOMotorDatabase = Depends(get_db)):
+    """Exchange rates and rounding rules currently in effect"""
+    return await get_rates(db)
+
+@router.put("/currency/rates", response_model=CurrencyRates, dependencies=[Depends(require_admin)])
+async def update_currency_rates(
+    rates: CurrencyRates,
+    db: AsyncIOMotorDatabase = Depends(get_db)
+):
+    """Replace exchange rates and rounding rules; price tables rebuild on next use"""
+    try:
+        return await set_rates(db, rates)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error("Error updating currency rates: %s", e)
+        raise HTTPException(status_code=500, detail="Error updating currency rates")
+
+@router.get("/currency/stats", dependencies=[Depends(require_admin)])
+async def get_currency_stats():
+    """Precomputed currency table statistics"""
+    return currency_tables.stats()
+
+@router.get("/pricing/rules", response_model=PricingRuleSet, dependencies=[Depends(require_admin)])
+async def get_pricing_rules(db: AsyncIOMotorDatabase = Depends(get_db)):
+    """The current pricing rule set"""
+    return await get_rule_set(db)
+
+@router.put("/pricing/rules", response_model=PricingRuleSet, dependencies=[Depends(require_admin)])
+async def replace_pricing_rules(
+    rules: List[PricingRule],
+    db: AsyncIOMotorDatabase = Depends(get_db)
+):
+    """Replace the whole pricing rule set; workers recompile it on the new version"""
+    try:
+        return await set_rule_set(db, rules)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error("Error updating pricing rules: %s", e)
+        raise HTTPException(status_code=500, detail="Error updating pricing rules")
+
+@router.get("/pricing/stats", dependencies=[Depends(require_admin)])
+async def get_pricing_stats():
+    """Compiled pricing rules statistics"""
+    return pricing_rules.stats()
+
+@router.get("/profiler/sample", dependencies=[Depends(require_admin)])
+async def sample_profile(
+    seconds: float = Query(10.0, gt=0),
+    interval_ms: float = Query(5.0, gt=0),
+    format: str = "collapsed"
+):
+    """Sample this worker's stacks for a few seconds; collapsed-stack text for flamegraph tools, or json"""
+    try:
+        profile = await sampling_profiler.profile(seconds, interval_ms / 1000.0)
+    except ProfilerBusyError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    if format == "json":
+        return profile
+    return PlainTextResponse(
+        profile["collapsed"],
+        headers={"X-Profile-Samples": str(profile["samples"]), "X-Profile-Pid": str(profile["pid"])}
+    )
+
+@router.get("/profiler/requests", dependencies=[Depends(require_admin)])
+async def list_request_profiles():
+    """Recent per-request profiles captured with the X-Profile header"""
+    return {"profiles": request_profiles.list(), **request_profiles.stats()}
+
+@router.get("/profiler/requests/{profile_id}", dependencies=[Depends(require_admin)])
+async def get_request_profile(profile_id: str):
+    """cProfile statistics for one profiled request, sorted by cumulative time"""
+    profile = request_profiles.get(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return PlainTextResponse(profile["stats"])
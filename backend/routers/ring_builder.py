@@ -1,8 +1,28 @@
-from fastapi import APIRouter, HTTPException, Depends
-from typing import List
+from fastapi import APIRouter, HTTPException, Depends, Query, Request, Response, WebSocket
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from typing import List, Optional
 from motor.motor_asyncio import AsyncIOMotorDatabase
-from models.ring_builder import *
-from services.ring_builder_service import RingBuilderService
+from models.ring_builder import (
+    Stone, Setting, Metal, QuizQuestion, QuizAnalysisRequest, QuizAnalysisResponse,
+    PriceCalculationRequest, PriceCalculationResponse, BatchPriceRequest, BatchPriceResponse,
+    RingConfiguration, ConfigurationUpdate, QuoteRequest, QuoteRequestResponse, SimilarConfigurationsResponse,
+    CatalogChanges,
+)
+from models.pricing import PriceMatrixRequest, PriceMatrixResponse
+from models.quiz import QuizAnswer, QuizSessionResponse
+from database import get_database
+from services.ring_builder_service import RingBuilderService, ConfigurationConflictError
+from services.config_cache import configuration_cache
+from services.config_invalidation import configuration_invalidator
+from services.catalog_version import current_catalog_version, catalog_etag
+from services.fieldsets import parse_fields, catalog_response_cache
+from services.shared_catalog import shared_catalog
+from services.live_pricing import live_pricing_hub
+from services.inventory import OutOfStockError
+from services.health import health_checker
+from services.recommendations import recommendation_engine
+from services.rate_limiter import admission_controller, client_key_for, retry_after_header, LoadShedError
 import logging
 
 logger = logging.getLogger(__name__)
@@ -12,40 +32,99 @@ router = APIRouter(prefix="/ring-builder", tags=["Ring Builder"])
 
 # Dependency to get database (will be injected)
 def get_db() -> AsyncIOMotorDatabase:
-    from server import db
-    return db
+    return get_database()
 
 def get_ring_service(db: AsyncIOMotorDatabase = Depends(get_db)) -> RingBuilderService:
     return RingBuilderService(db)
 
+def admission(route: str):
+    """Dependency enforcing the per-client budget and global admission control for a route"""
+    async def dependency(request: Request):
+        client_key = client_key_for(request.headers, request.client.host if request.client else None)
+        try:
+            await admission_controller.acquire(route, client_key)
+        except LoadShedError as e:
+            raise HTTPException(
+                status_code=e.status_code,
+                detail=e.reason,
+                headers=retry_after_header(e.retry_after)
+            )
+        try:
+            yield
+        finally:
+            admission_controller.release()
+    return dependency
+
+async def catalog_not_modified(request: Request, response: Response, db: AsyncIOMotorDatabase, variant: Optional[str] = None) -> bool:
+    """Set the catalog ETag and report whether the client's cached copy is current"""
+    etag = catalog_etag(await current_catalog_version(db), variant)
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = "no-cache"
+    return request.headers.get("if-none-match") == etag
+
 @router.get("/stones", response_model=List[Stone])
-async def get_stones(service: RingBuilderService = Depends(get_ring_service)):
-    """Get all available moissanite stones"""
+async def get_stones(
+    request: Request,
+    response: Response,
+    fields: Optional[str] = None,
+    currency: Optional[str] = None,
+    db: AsyncIOMotorDatabase = Depends(get_db),
+    service: RingBuilderService = Depends(get_ring_service)
+):
+    """Get all available moissanite stones (?fields=id,name,... for a sparse fieldset, ?currency=EUR)"""
     try:
-        stones = await service.get_all_stones()
-        return stones
+        field_set = parse_fields(fields, Stone)
+        if await catalog_not_modified(request, response, db, await service.catalog_variant("stones", currency)):
+            return Response(status_code=304, headers=dict(response.headers))
+        body = await service.get_catalog_json("stones", field_set, currency)
+        return Response(content=body, media_type="application/json", headers=dict(response.headers))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
-        logger.error(f"Error fetching stones: {e}")
+        logger.error("Error fetching stones: %s", e)
         raise HTTPException(status_code=500, detail="Error fetching stones")
 
 @router.get("/settings", response_model=List[Setting])
-async def get_settings(service: RingBuilderService = Depends(get_ring_service)):
-    """Get all available ring settings"""
+async def get_settings(
+    request: Request,
+    response: Response,
+    fields: Optional[str] = None,
+    currency: Optional[str] = None,
+    db: AsyncIOMotorDatabase = Depends(get_db),
+    service: RingBuilderService = Depends(get_ring_service)
+):
+    """Get all available ring settings (?fields=id,name,... for a sparse fieldset, ?currency=EUR)"""
     try:
-        settings = await service.get_all_settings()
-        return settings
+        field_set = parse_fields(fields, Setting)
+        if await catalog_not_modified(request, response, db, await service.catalog_variant("settings", currency)):
+            return Response(status_code=304, headers=dict(response.headers))
+        body = await service.get_catalog_json("settings", field_set, currency)
+        return Response(content=body, media_type="application/json", headers=dict(response.headers))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
-        logger.error(f"Error fetching settings: {e}")
+        logger.error("Error fetching settings: %s", e)
         raise HTTPException(status_code=500, detail="Error fetching settings")
 
 @router.get("/metals", response_model=List[Metal])
-async def get_metals(service: RingBuilderService = Depends(get_ring_service)):
-    """Get all available metal options"""
+async def get_metals(
+    request: Request,
+    response: Response,
+    fields: Optional[str] = None,
+    db: AsyncIOMotorDatabase = Depends(get_db),
+    service: RingBuilderService = Depends(get_ring_service)
+):
+    """Get all available metal options (?fields=id,name,... for a sparse fieldset)"""
     try:
-        metals = await service.get_all_metals()
-        return metals
+        field_set = parse_fields(fields, Metal)
+        if await catalog_not_modified(request, response, db):
+            return Response(status_code=304, headers=dict(response.headers))
+        body = await service.get_catalog_json("metals", field_set)
+        return Response(content=body, media_type="application/json", headers=dict(response.headers))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
-        logger.error(f"Error fetching metals: {e}")
+        logger.error("Error fetching metals: %s", e)
         raise HTTPException(status_code=500, detail="Error fetching metals")
 
 @router.get("/stones/{stone_id}/price")
@@ -74,9 +153,50 @@ async def get_stone_price(
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Error fetching stone price: {e}")
+        logger.error("Error fetching stone price: %s", e)
         raise HTTPException(status_code=500, detail="Error fetching stone price")
 
+@router.get("/catalog/changes", response_model=CatalogChanges)
+async def get_catalog_changes(
+    request: Request,
+    response: Response,
+    since: int = Query(0, ge=0),
+    db: AsyncIOMotorDatabase = Depends(get_db),
+    service: RingBuilderService = Depends(get_ring_service)
+):
+    """Catalog delta since a catalog version, for clients keeping a local copy (full snapshot if `full` is true)"""
+    try:
+        availability = await service.catalog_variant("stones")
+        variant = f"since-{since}-{availability}" if availability else f"since-{since}"
+        if await catalog_not_modified(request, response, db, variant):
+            return Response(status_code=304, headers=dict(response.headers))
+        changes = await service.get_catalog_changes(since)
+        return JSONResponse(jsonable_encoder(changes), headers=dict(response.headers))
+    except Exception as e:
+        logger.error("Error fetching catalog changes: %s", e)
+        raise HTTPException(status_code=500, detail="Error fetching catalog changes")
+
+@router.get("/catalog/{kind}/{item_id}")
+async def get_catalog_item(
+    kind: str,
+    item_id: str,
+    version: Optional[int] = None,
+    service: RingBuilderService = Depends(get_ring_service)
+):
+    """Expand a catalog reference: the stone, setting or metal as it was at a catalog version"""
+    if kind not in ("stones", "settings", "metals"):
+        raise HTTPException(status_code=404, detail="Unknown catalog kind")
+    try:
+        item = await service.get_catalog_item(kind, item_id, version)
+        if not item:
+            raise HTTPException(status_code=404, detail="Catalog item not found")
+        return item
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error("Error fetching catalog item: %s", e)
+        raise HTTPException(status_code=500, detail="Error fetching catalog item")
+
 @router.get("/quiz/questions", response_model=List[QuizQuestion])
 async def get_quiz_questions(service: RingBuilderService = Depends(get_ring_service)):
     """Get personality quiz questions"""
@@ -84,7 +204,7 @@ async def get_quiz_questions(service: RingBuilderService = Depends(get_ring_serv
         questions = service.get_quiz_questions()
         return questions
     except Exception as e:
-        logger.error(f"Error fetching quiz questions: {e}")
+        logger.error("Error fetching quiz questions: %s", e)
         raise HTTPException(status_code=500, detail="Error fetching quiz questions")
 
 @router.post("/quiz/analyze", response_model=QuizAnalysisResponse)
@@ -97,25 +217,98 @@ async def analyze_quiz(
         analysis = await service.analyze_quiz(request)
         return analysis
     except Exception as e:
-        logger.error(f"Error analyzing quiz: {e}")
+        logger.error("Error analyzing quiz: %s", e)
         raise HTTPException(status_code=500, detail="Error analyzing quiz")
 
-@router.post("/calculate-price", response_model=PriceCalculationResponse)
+@router.post("/quiz/sessions", response_model=QuizSessionResponse)
+async def start_quiz_session(service: RingBuilderService = Depends(get_ring_service)):
+    """Start a quiz session; answers are then submitted one at a time"""
+    try:
+        return await service.start_quiz_session()
+    except Exception as e:
+        logger.error("Error starting quiz session: %s", e)
+        raise HTTPException(status_code=500, detail="Error starting quiz session")
+
+@router.get("/quiz/sessions/{session_id}", response_model=QuizSessionResponse)
+async def get_quiz_session(session_id: str, service: RingBuilderService = Depends(get_ring_service)):
+    """Current state and provisional result of a quiz session"""
+    try:
+        session = await service.get_quiz_session(session_id)
+        if not session:
+            raise HTTPException(status_code=404, detail="Quiz session not found")
+        return session
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error("Error fetching quiz session: %s", e)
+        raise HTTPException(status_code=500, detail="Error fetching quiz session")
+
+@router.post("/quiz/sessions/{session_id}/answers", response_model=QuizSessionResponse)
+async def answer_quiz_question(
+    session_id: str,
+    answer: QuizAnswer,
+    service: RingBuilderService = Depends(get_ring_service)
+):
+    """Answer (or change the answer to) one question; returns the provisional personality and recommendations"""
+    try:
+        session = await service.answer_quiz_question(session_id, answer)
+        if not session:
+            raise HTTPException(status_code=404, detail="Quiz session not found")
+        return session
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error("Error answering quiz question: %s", e)
+        raise HTTPException(status_code=500, detail="Error answering quiz question")
+
+@router.post("/calculate-price", response_model=PriceCalculationResponse, dependencies=[Depends(admission("calculate-price"))])
 async def calculate_price(
     request: PriceCalculationRequest,
+    expand: Optional[str] = None,
+    currency: Optional[str] = None,
     service: RingBuilderService = Depends(get_ring_service)
 ):
-    """Calculate total price for ring configuration"""
+    """Calculate total price for ring configuration (?expand=details for full catalog items, ?currency=EUR)"""
     try:
-        price_response = await service.calculate_price(request)
+        price_response = await service.calculate_price(request, expand_details=expand == "details", currency=currency)
         return price_response
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
-        logger.error(f"Error calculating price: {e}")
+        logger.error("Error calculating price: %s", e)
         raise HTTPException(status_code=500, detail="Error calculating price")
 
-@router.post("/configurations", response_model=dict)
+@router.post("/calculate-prices", response_model=BatchPriceResponse, dependencies=[Depends(admission("calculate-price"))])
+async def calculate_prices(
+    request: BatchPriceRequest,
+    service: RingBuilderService = Depends(get_ring_service)
+):
+    """Price up to 500 selections in one call; invalid selections get a per-item error"""
+    try:
+        return await service.calculate_prices(request)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error("Error calculating prices: %s", e)
+        raise HTTPException(status_code=500, detail="Error calculating prices")
+
+@router.post("/price-matrix", response_model=PriceMatrixResponse, dependencies=[Depends(admission("calculate-price"))])
+async def price_matrix(
+    request: PriceMatrixRequest,
+    service: RingBuilderService = Depends(get_ring_service)
+):
+    """Price one stone across carat sizes, settings and metals, with pricing rules applied"""
+    try:
+        return await service.price_matrix(request)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error("Error calculating price matrix: %s", e)
+        raise HTTPException(status_code=500, detail="Error calculating price matrix")
+
+@router.post("/configurations", response_model=dict, dependencies=[Depends(admission("configurations"))])
 async def save_configuration(
     stone_id: str,
     setting_id: str,
@@ -142,7 +335,9 @@ async def save_configuration(
             metal_id=metal_id,
             carat=carat,
             personality_type=personality_type,
-            total_price=price_response.total_price
+            total_price=price_response.total_price,
+            catalog_version=price_response.catalog_version,
+            price_breakdown=price_response.breakdown
         )
         
         config_id = await service.save_configuration(config)
@@ -155,42 +350,135 @@ async def save_configuration(
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
-        logger.error(f"Error saving configuration: {e}")
+        logger.error("Error saving configuration: %s", e)
         raise HTTPException(status_code=500, detail="Error saving configuration")
 
 @router.get("/configurations/{config_id}", response_model=RingConfiguration)
 async def get_configuration(
     config_id: str,
+    fields: Optional[str] = None,
     service: RingBuilderService = Depends(get_ring_service)
 ):
-    """Get ring configuration by ID"""
+    """Get ring configuration by ID (?fields=id,total_price,... for a sparse fieldset)"""
     try:
+        if fields is not None:
+            config = await service.get_configuration_fields(config_id, parse_fields(fields, RingConfiguration))
+            if not config:
+                raise HTTPException(status_code=404, detail="Configuration not found")
+            return JSONResponse(jsonable_encoder(config))
+
         config = await service.get_configuration(config_id)
         if not config:
             raise HTTPException(status_code=404, detail="Configuration not found")
         return config
     except HTTPException:
         raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
-        logger.error(f"Error fetching configuration: {e}")
+        logger.error("Error fetching configuration: %s", e)
         raise HTTPException(status_code=500, detail="Error fetching configuration")
 
-@router.post("/quote-request", response_model=QuoteRequestResponse)
+@router.patch("/configurations/{config_id}", response_model=RingConfiguration, dependencies=[Depends(admission("configurations"))])
+async def update_configuration(
+    config_id: str,
+    update: ConfigurationUpdate,
+    service: RingBuilderService = Depends(get_ring_service)
+):
+    """Change stone, setting, metal, carat or personality of a saved configuration (409 if `version` is stale)"""
+    try:
+        config = await service.update_configuration(config_id, update)
+        if not config:
+            raise HTTPException(status_code=404, detail="Configuration not found")
+        return config
+    except HTTPException:
+        raise
+    except ConfigurationConflictError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error("Error updating configuration: %s", e)
+        raise HTTPException(status_code=500, detail="Error updating configuration")
+
+@router.get("/configurations/{config_id}/similar", response_model=SimilarConfigurationsResponse)
+async def get_similar_configurations(
+    config_id: str,
+    limit: int = Query(10, ge=1, le=50),
+    service: RingBuilderService = Depends(get_ring_service)
+):
+    """Ring combinations similar to a saved configuration (closest first)"""
+    try:
+        similar = await service.similar_configurations(config_id, limit)
+        if not similar:
+            raise HTTPException(status_code=404, detail="Configuration not found")
+        return similar
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error("Error fetching similar configurations: %s", e)
+        raise HTTPException(status_code=500, detail="Error fetching similar configurations")
+
+@router.post("/quote-request", response_model=QuoteRequestResponse, dependencies=[Depends(admission("quote-request"))])
 async def submit_quote_request(
     request: QuoteRequest,
+    expand: Optional[str] = None,
     service: RingBuilderService = Depends(get_ring_service)
 ):
-    """Submit a quote request for ring configuration"""
+    """Submit a quote request for ring configuration (?expand=configuration to embed it)"""
     try:
-        quote_response = await service.submit_quote_request(request)
+        quote_response = await service.submit_quote_request(request, expand_configuration=expand == "configuration")
         return quote_response
+    except OutOfStockError as e:
+        raise HTTPException(status_code=409, detail=str(e))
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
-        logger.error(f"Error submitting quote request: {e}")
+        logger.error("Error submitting quote request: %s", e)
         raise HTTPException(status_code=500, detail="Error submitting quote request")
 
+@router.websocket("/live")
+async def live_pricing(websocket: WebSocket, db: AsyncIOMotorDatabase = Depends(get_db)):
+    """Live pricing: send selection deltas such as {"carat": 1.5}, receive prices as they change"""
+    await live_pricing_hub.serve(websocket, db)
+
+@router.get("/live/stats")
+async def get_live_pricing_stats():
+    """Live pricing session statistics"""
+    return live_pricing_hub.stats()
+
+@router.get("/cache/stats")
+async def get_cache_stats():
+    """Configuration cache statistics"""
+    return {
+        "configurations": configuration_cache.stats(),
+        "configuration_invalidations": configuration_invalidator.stats(),
+        "catalog_responses": catalog_response_cache.stats(),
+        "shared_catalog": shared_catalog.stats(),
+        "recommendations": recommendation_engine.stats()
+    }
+
+@router.get("/rate-limits/stats")
+async def get_rate_limit_stats():
+    """Admission control and rate limiting statistics"""
+    return admission_controller.stats()
+
 @router.get("/health")
 async def health_check():
-    """Health check endpoint"""
-    return {"status": "healthy", "service": "ring-builder"}
\ No newline at end of file
+    """Health check endpoint; reflects readiness, 503 when this worker should not take traffic"""
+    report = health_checker.readiness()
+    return JSONResponse(
+        status_code=200 if report["ready"] else 503,
+        content={"status": "healthy" if report["ready"] else "unhealthy", "service": "ring-builder", **report}
+    )
+
+@router.get("/health/live")
+async def liveness_check():
+    """Liveness: the worker's event loop is serving requests"""
+    return {"status": "alive", "service": "ring-builder"}
+
+@router.get("/health/ready")
+async def readiness_check():
+    """Readiness from the cached background dependency checks; never queries the database"""
+    report = health_checker.readiness()
+    return JSONResponse(status_code=200 if report["ready"] else 503, content=report)
\ No newline at end of file
@@ -0,0 +1,42 @@
+"""Archive and remove expired ring configurations.
+
+Configurations past expires_at that are not referenced by a quote are deleted;
+quiz-driven ones or ones with customer data (or all, with --archive-all) are
+first written to a compressed archive. Run this more often than the TTL grace
+period (CONFIGURATION_ARCHIVE_GRACE_HOURS) so nothing expires unarchived.
+
+Usage (from backend/):
+    python -m scripts.archive_configurations
+    python -m scripts.archive_configurations --file archive/configurations.ndjson.gz
+    python -m scripts.archive_configurations --backfill
+"""
+from scripts import open_database
+from services.retention import ConfigurationRetention, FileArchive
+import argparse
+import asyncio
+
+
+async def main(args: argparse.Namespace) -> None:
+    client, db = open_database()
+    try:
+        retention = ConfigurationRetention(
+            db,
+            archive=FileArchive(args.file) if args.file else None,
+            archive_all=args.archive_all,
+            batch_size=args.batch_size
+        )
+        if args.backfill:
+            print("Backfill:", await retention.backfill_expiry())
+        print("Archive:", await retention.archive_expired())
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--file", help="append to a gzip NDJSON file instead of the configurations_archive collection")
+    parser.add_argument("--archive-all", action="store_true", help="archive every expired configuration")
+    parser.add_argument("--backfill", action="store_true",
+                        help="first set expires_at on configurations saved before retention was enabled")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    asyncio.run(main(parser.parse_args()))
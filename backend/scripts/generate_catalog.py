@@ -0,0 +1,265 @@
+"""Generate a synthetic, production-sized ring builder dataset for scale testing.
+
+Usage (from backend/):
+    python -m scripts.generate_catalog --stones 5000 --sizes 50 --settings 500 --metals 20 \\
+        --configurations 2000000 --quotes 200000 --drop
+
+Documents follow the shapes of models.ring_builder and are loaded with unordered
+insert_many batches, several in flight at once.
+"""
+from scripts import open_database
+from services.catalog_version import reserve_catalog_version, publish_catalog_version
+from services.catalog_revisions import record_version
+from services.storage_ids import encode_doc
+from datetime import datetime, timedelta
+import argparse
+import asyncio
+import random
+import time
+import uuid
+
+CUTS = ["round", "oval", "princess", "cushion", "emerald", "pear", "marquise", "radiant", "asscher", "heart"]
+PERSONALITIES = ["classic", "glamorous", "romantic", "modern", "artistic"]
+SETTING_TAGS = PERSONALITIES + [
+    "elegant", "timeless", "bold", "attention-loving", "unique", "sentimental",
+    "meaningful", "traditional", "luxurious", "sophisticated", "innovative", "edgy",
+]
+METAL_TYPES = [("White Gold", "gold"), ("Yellow Gold", "gold"), ("Rose Gold", "gold"), ("Platinum", "platinum")]
+IMAGE = "https://images.unsplash.com/photo-1731533621924-efa45b8f48a5?crop=entropy&cs=srgb&fm=jpg&q=85"
+
+
+class DatasetGenerator:
+    def __init__(self, db, args: argparse.Namespace):
+        self.db = db
+        self.args = args
+        self.rng = random.Random(args.seed)
+        self.now = datetime.utcnow()
+        self.semaphore = asyncio.Semaphore(args.concurrency)
+        self.pending = set()
+        self.inserted = {}
+        self.version = None
+        # Compact pricing tables kept to price synthetic configurations
+        self.stones = []    # (id, [(carat, price), ...])
+        self.settings = []  # (id, base_price)
+        self.metals = []    # (id, multiplier)
+
+    def _uuid(self) -> str:
+        return str(uuid.UUID(int=self.rng.getrandbits(128), version=4))
+
+    def _timestamp(self) -> datetime:
+        return self.now - timedelta(seconds=self.rng.uniform(0, self.args.days * 86400))
+
+    async def _insert(self, collection: str, documents: list) -> None:
+        async with self.semaphore:
+            await self.db[collection].insert_many([encode_doc(doc) for doc in documents], ordered=False)
+        self.inserted[collection] = self.inserted.get(collection, 0) + len(documents)
+
+    async def _submit(self, collection: str, documents: list) -> None:
+        """Schedule a batch insert, waiting only when the in-flight limit is reached"""
+        while len(self.pending) >= self.args.concurrency:
+            done, self.pending = await asyncio.wait(self.pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                task.result()
+        self.pending.add(asyncio.ensure_future(self._insert(collection, documents)))
+
+    async def _drain(self) -> None:
+        if self.pending:
+            await asyncio.gather(*self.pending)
+            self.pending = set()
+
+    async def _load(self, collection: str, documents) -> None:
+        batch = []
+        for document in documents:
+            batch.append(document)
+            if len(batch) >= self.args.batch_size:
+                await self._submit(collection, batch)
+                batch = []
+        if batch:
+            await self._submit(collection, batch)
+
+    def generate_stones(self):
+        for index in range(self.args.stones):
+            cut = CUTS[index % len(CUTS)]
+            per_carat = self.rng.uniform(500, 1100)
+            sizes = []
+            for step in range(self.args.sizes):
+                carat = round(0.25 + 0.05 * step, 2)
+                price = round(per_carat * carat ** 1.6 + self.rng.uniform(-20, 20), 2)
+                sizes.append({"carat": carat, "price": max(price, 50.0), "availability": "in_stock"})
+            stone_id = self._uuid()
+            self.stones.append((stone_id, [(s["carat"], s["price"]) for s in sizes]))
+            yield {
+                "id": stone_id,
+                "name": f"{cut.title()} Moissanite {index + 1}",
+                "type": "moissanite",
+                "cut": cut,
+                "sizes": sizes,
+                "images": [IMAGE],
+                "description": f"Synthetic {cut} stone for scale testing",
+                "shopify_product_id": None,
+                "catalog_version": self.version,
+                "is_active": True,
+                "created_at": self._timestamp(),
+            }
+
+    def generate_settings(self):
+        for index in range(self.args.settings):
+            setting_id = self._uuid()
+            base_price = round(self.rng.uniform(150, 900), 2)
+            self.settings.append((setting_id, base_price))
+            yield {
+                "id": setting_id,
+                "name": f"Setting {index + 1}",
+                "base_price": base_price,
+                "images": [IMAGE],
+                "description": "Synthetic setting for scale testing",
+                "personality_tags": self.rng.sample(SETTING_TAGS, 3),
+                "shopify_variant_id": None,
+                "catalog_version": self.version,
+                "is_active": True,
+                "created_at": self._timestamp(),
+            }
+
+    def generate_metals(self):
+        for index in range(self.args.metals):
+            name, metal_type = METAL_TYPES[index % len(METAL_TYPES)]
+            karat = (10, 14, 18, 22)[(index // len(METAL_TYPES)) % 4]
+            metal_id = self._uuid()
+            multiplier = round(self.rng.uniform(1.0, 1.5), 2)
+            self.metals.append((metal_id, multiplier))
+            yield {
+                "id": metal_id,
+                "name": name if metal_type == "platinum" else f"{karat}K {name} {index + 1}",
+                "type": metal_type,
+                "multiplier": multiplier,
+                "images": [IMAGE],
+                "description": "Synthetic metal for scale testing",
+                "shopify_option_id": None,
+                "catalog_version": self.version,
+                "is_active": True,
+                "created_at": self._timestamp(),
+            }
+
+    def generate_configurations(self, quotes: list):
+        """Yield configurations, appending a quote for a sampled subset to `quotes`"""
+        quote_ratio = self.args.quotes / self.args.configurations if self.args.configurations else 0
+        for _ in range(self.args.configurations):
+            stone_id, sizes = self.rng.choice(self.stones)
+            carat, stone_price = self.rng.choice(sizes)
+            setting_id, setting_price = self.rng.choice(self.settings)
+            metal_id, multiplier = self.rng.choice(self.metals)
+            # Same formula as RingBuilderService.calculate_price
+            metal_adjustment = (stone_price + setting_price) * (multiplier - 1.0)
+            total = stone_price + setting_price + metal_adjustment
+            created_at = self._timestamp()
+            configuration = {
+                "id": self._uuid(),
+                "stone_id": stone_id,
+                "setting_id": setting_id,
+                "metal_id": metal_id,
+                "carat": carat,
+                "personality_type": self.rng.choice(PERSONALITIES + [None]),
+                "total_price": round(total, 2),
+                "catalog_version": self.version,
+                "customer_info": None,
+                "created_at": created_at,
+                "updated_at": created_at,
+            }
+            if self.rng.random() < quote_ratio:
+                customer = self.rng.getrandbits(32)
+                quotes.append({
+                    "quote_request_id": self._uuid(),
+                    "status": "submitted",
+                    "estimated_response": "24-48 hours",
+                    "configuration_ref": {
+                        "configuration_id": configuration["id"],
+                        "catalog_version": self.version,
+                        "stone_id": stone_id,
+                        "setting_id": setting_id,
+                        "metal_id": metal_id,
+                        "carat": carat,
+                        "personality_type": configuration["personality_type"],
+                        "total_price": configuration["total_price"],
+                        "breakdown": {
+                            "stone": stone_price,
+                            "setting": setting_price,
+                            "metal_adjustment": round(metal_adjustment, 2),
+                        },
+                    },
+                    "customer_details": {
+                        "name": f"Customer {customer}",
+                        "email": f"customer{customer}@example.com",
+                        "phone": None,
+                        "message": None,
+                    },
+                    "created_at": created_at + timedelta(minutes=self.rng.uniform(1, 600)),
+                })
+            yield configuration
+
+    async def _load_configurations(self) -> None:
+        quotes = []
+        batch = []
+        for configuration in self.generate_configurations(quotes):
+            batch.append(configuration)
+            if len(batch) >= self.args.batch_size:
+                await self._submit("configurations", batch)
+                batch = []
+            if len(quotes) >= self.args.batch_size:
+                await self._submit("quote_requests", quotes[:])
+                quotes.clear()
+        if batch:
+            await self._submit("configurations", batch)
+        if quotes:
+            await self._submit("quote_requests", quotes[:])
+
+    async def run(self) -> None:
+        if self.args.drop:
+            for collection in ("stones", "settings", "metals", "catalog_revisions", "configurations", "quote_requests"):
+                await self.db[collection].drop()
+
+        started = time.perf_counter()
+        self.version = await reserve_catalog_version(self.db)
+        await self._load("stones", self.generate_stones())
+        await self._load("settings", self.generate_settings())
+        await self._load("metals", self.generate_metals())
+        await self._drain()
+        await record_version(self.db, self.version)
+        version = await publish_catalog_version(self.db, self.version)
+        catalog_seconds = time.perf_counter() - started
+
+        if self.args.configurations:
+            await self._load_configurations()
+            await self._drain()
+
+        elapsed = time.perf_counter() - started
+        total = sum(self.inserted.values())
+        print(f"Catalog loaded in {catalog_seconds:.1f}s (catalog version {version})")
+        for collection, count in self.inserted.items():
+            print(f"  {collection}: {count}")
+        print(f"Inserted {total} documents in {elapsed:.1f}s ({total / elapsed:.0f} docs/s)")
+
+
+async def main(args: argparse.Namespace) -> None:
+    if not args.stones or not args.settings or not args.metals:
+        raise SystemExit("--stones, --settings and --metals must all be at least 1")
+    client, db = open_database()
+    try:
+        await DatasetGenerator(db, args).run()
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--stones", type=int, default=5000)
+    parser.add_argument("--sizes", type=int, default=50, help="sizes per stone")
+    parser.add_argument("--settings", type=int, default=500)
+    parser.add_argument("--metals", type=int, default=20)
+    parser.add_argument("--configurations", type=int, default=1000000)
+    parser.add_argument("--quotes", type=int, default=100000)
+    parser.add_argument("--days", type=int, default=365, help="spread created_at over this many days")
+    parser.add_argument("--batch-size", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=8, help="insert_many batches in flight")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--drop", action="store_true", help="drop existing ring builder collections first")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,37 @@
+"""Import the ring builder catalog from a Shopify product export.
+
+Usage (from backend/):
+    python -m scripts.import_shopify products.json
+    python -m scripts.import_shopify products_export.csv --deactivate-missing
+"""
+from scripts import open_database
+from services.shopify_import import import_shopify_export, detect_format
+import argparse
+import asyncio
+import json
+
+
+async def main(args: argparse.Namespace) -> None:
+    client, db = open_database()
+    try:
+        with open(args.path, encoding="utf-8-sig", newline="") as stream:
+            report = await import_shopify_export(
+                db,
+                stream,
+                args.format or detect_format(args.path),
+                batch_size=args.batch_size,
+                deactivate_missing=args.deactivate_missing
+            )
+        print(json.dumps(report.dict(), indent=2))
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("path", help="Shopify export file")
+    parser.add_argument("--format", choices=["json", "jsonl", "csv"], help="defaults to the file extension")
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--deactivate-missing", action="store_true",
+                        help="deactivate Shopify-linked items absent from the export")
+    asyncio.run(main(parser.parse_args()))
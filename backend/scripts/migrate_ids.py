@@ -0,0 +1,85 @@
+"""Convert stored ids between UUID strings and 16-byte BSON binary UUIDs.
+
+Run with --to binary before (or right after) switching the service to
+ID_STORAGE=binary; the service matches both forms while a migration is in
+progress. Document and index sizes are reported before and after.
+
+Usage (from backend/):
+    python -m scripts.migrate_ids --to binary
+    python -m scripts.migrate_ids --to string --collections configurations quote_requests
+"""
+from scripts import open_database
+from pymongo import UpdateOne
+from services.storage_ids import convert_ids, to_binary, decode_id
+import argparse
+import asyncio
+
+COLLECTIONS = ["stones", "settings", "metals", "configurations", "quote_requests", "inventory", "inventory_holds", "quiz_sessions"]
+# --to target -> conversion applied to each id field
+CONVERTERS = {"binary": to_binary, "string": decode_id}
+
+
+async def collection_sizes(db, name: str) -> dict:
+    stats = await db.command("collStats", name)
+    return {
+        "count": stats.get("count", 0),
+        "avg_doc_bytes": stats.get("avgObjSize", 0),
+        "data_bytes": stats.get("size", 0),
+        "storage_bytes": stats.get("storageSize", 0),
+        "index_bytes": stats.get("totalIndexSize", 0),
+    }
+
+
+async def migrate_collection(db, name: str, target: str, batch_size: int) -> int:
+    """Rewrite changed id fields in _id order, one bulk_write per batch"""
+    collection = db[name]
+    converted = 0
+    last_id = None
+    while True:
+        query = {"_id": {"$gt": last_id}} if last_id is not None else {}
+        docs = await collection.find(query).sort("_id", 1).limit(batch_size).to_list(batch_size)
+        if not docs:
+            return converted
+        last_id = docs[-1]["_id"]
+
+        operations = []
+        for doc in docs:
+            changes = {}
+            for key, value in doc.items():
+                if key == "_id":
+                    continue
+                new_value = convert_ids({key: value}, CONVERTERS[target])[key]
+                if new_value != value or type(new_value) is not type(value):
+                    changes[key] = new_value
+            if changes:
+                operations.append(UpdateOne({"_id": doc["_id"]}, {"$set": changes}))
+        if operations:
+            await collection.bulk_write(operations, ordered=False)
+            converted += len(operations)
+
+
+async def main(args: argparse.Namespace) -> None:
+    client, db = open_database()
+    try:
+        existing = set(await db.list_collection_names())
+        for name in args.collections:
+            if name not in existing:
+                print(f"{name}: missing, skipped")
+                continue
+            before = await collection_sizes(db, name)
+            converted = await migrate_collection(db, name, args.to, args.batch_size)
+            after = await collection_sizes(db, name)
+            print(f"{name}: converted {converted} documents")
+            for metric in ("avg_doc_bytes", "data_bytes", "storage_bytes", "index_bytes"):
+                print(f"  {metric:>14}: {before[metric]:>14,} -> {after[metric]:>14,}")
+        print("Note: storage and index sizes shrink fully only after WiredTiger reuses or compacts freed space.")
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--to", choices=["binary", "string"], required=True)
+    parser.add_argument("--collections", nargs="+", default=COLLECTIONS, choices=COLLECTIONS)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    asyncio.run(main(parser.parse_args()))
@@ -1,31 +1,37 @@
-from fastapi import FastAPI, APIRouter
 from dotenv import load_dotenv
+from pathlib import Path
+
+# Load .env before importing modules that read their settings at import time
+ROOT_DIR = Path(__file__).parent
+load_dotenv(ROOT_DIR / '.env')
+
+from fastapi import FastAPI, APIRouter
 from starlette.middleware.cors import CORSMiddleware
-from motor.motor_asyncio import AsyncIOMotorClient
-import os
+import asyncio
 import logging
-from pathlib import Path
 from pydantic import BaseModel, Field
 from typing import List
 import uuid
 from datetime import datetime
 
 # Import ring builder router
+from database import get_database, close_client
 from routers.ring_builder import router as ring_builder_router
+from routers.admin import router as admin_router
+from services.analytics import analytics_recorder
+from services.live_pricing import live_pricing_hub
+from services.inventory import inventory_tracker
+from services.shared_catalog import shared_catalog
+from services.health import health_checker
+from services.config_invalidation import configuration_invalidator
+from services.recommendations import recommendation_engine
+from services.warmup import warm_up
+from services.log_pipeline import configure_logging, RequestIdMiddleware
+from services.profiler import RequestProfilingMiddleware
 
-ROOT_DIR = Path(__file__).parent
-load_dotenv(ROOT_DIR / '.env')
-
-# MongoDB connection
-mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ['DB_NAME']]
-
-# Create the main app without a prefix
-app = FastAPI(title="Moissanite Ring Builder API", version="1.0.0")
-
-# Create a router with the /api prefix
-api_router = APIRouter(prefix="/api")
+# Configure logging
+configure_logging()
+logger = logging.getLogger(__name__)
 
 # Original endpoints (keeping for compatibility)
 class StatusCheck(BaseModel):
@@ -36,6 +42,9 @@ class StatusCheck(BaseModel):
 class StatusCheckCreate(BaseModel):
     client_name: str
 
+# Create a router with the /api prefix
+api_router = APIRouter(prefix="/api")
+
 # Add original routes to the router
 @api_router.get("/")
 async def root():
@@ -45,40 +54,66 @@ async def root():
 async def create_status_check(input: StatusCheckCreate):
     status_dict = input.dict()
     status_obj = StatusCheck(**status_dict)
-    _ = await db.status_checks.insert_one(status_obj.dict())
+    _ = await get_database().status_checks.insert_one(status_obj.dict())
     return status_obj
 
 @api_router.get("/status", response_model=List[StatusCheck])
 async def get_status_checks():
-    status_checks = await db.status_checks.find().to_list(1000)
+    status_checks = await get_database().status_checks.find().to_list(1000)
     return [StatusCheck(**status_check) for status_check in status_checks]
 
 # Include ring builder router in api router
 api_router.include_router(ring_builder_router)
-
-# Include the api router in the main app
-app.include_router(api_router)
-
-app.add_middleware(
-    CORSMiddleware,
-    allow_credentials=True,
-    allow_origins=["*"],
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
-
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
-logger = logging.getLogger(__name__)
-
-@app.on_event("startup")
-async def startup_event():
-    logger.info("Moissanite Ring Builder API starting up...")
-
-@app.on_event("shutdown")
-async def shutdown_db_client():
-    client.close()
-    logger.info("Database connection closed")
\ No newline at end of file
+api_router.include_router(admin_router)
+
+
+def create_app() -> FastAPI:
+    """Build the application; no network I/O happens until startup"""
+    app = FastAPI(title="Moissanite Ring Builder API", version="1.0.0")
+
+    # Include the api router in the main app
+    app.include_router(api_router)
+
+    app.add_middleware(
+        CORSMiddleware,
+        allow_credentials=True,
+        allow_origins=["*"],
+        allow_methods=["*"],
+        allow_headers=["*"],
+        expose_headers=["X-Request-ID"],
+    )
+    app.add_middleware(RequestProfilingMiddleware)
+    app.add_middleware(RequestIdMiddleware)
+
+    @app.on_event("startup")
+    async def startup_event():
+        logger.info("Moissanite Ring Builder API starting up...")
+        db = get_database()
+        await analytics_recorder.start(db)
+        await live_pricing_hub.start(db)
+        await inventory_tracker.start(db)
+        await shared_catalog.start(db)
+        await health_checker.start(db)
+        await configuration_invalidator.start(db)
+        # Indexes and caches warm after the socket is open instead of delaying it
+        app.state.warmup = asyncio.create_task(warm_up(db))
+
+    @app.on_event("shutdown")
+    async def shutdown_db_client():
+        warmup = getattr(app.state, "warmup", None)
+        if warmup is not None and not warmup.done():
+            warmup.cancel()
+        await recommendation_engine.stop()
+        await configuration_invalidator.stop()
+        await health_checker.stop()
+        await shared_catalog.stop()
+        await inventory_tracker.stop()
+        await live_pricing_hub.stop()
+        await analytics_recorder.stop()
+        close_client()
+        logger.info("Database connection closed")
+
+    return app
+
+
+app = create_app()
@@ -0,0 +1,209 @@
+from typing import Dict, List, Optional, Any
+from collections import Counter, defaultdict
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+from datetime import datetime, timedelta
+import asyncio
+import logging
+import os
+import re
+
+logger = logging.getLogger(__name__)
+
+TOTALS_ID = "totals"
+SAFE_KEY = re.compile(r"^[a-z][a-z0-9_-]{0,31}$")
+
+
+def _safe_key(value: Optional[str]) -> str:
+    """Client-supplied values become field names, so keep them to a safe alphabet"""
+    value = (value or "").strip().lower()
+    return value if SAFE_KEY.match(value) else "other"
+
+
+def _day_id(moment: datetime) -> str:
+    return "day:" + moment.strftime("%Y-%m-%d")
+
+
+class AnalyticsRecorder:
+    """Maintains pre-aggregated counters in the analytics_rollups collection.
+
+    Events only touch in-memory counters; a background task periodically flushes
+    them as $inc upserts, so request paths never wait on analytics writes.
+    """
+
+    def __init__(self, flush_interval: float = 5.0, max_pending_keys: int = 5000):
+        self.flush_interval = flush_interval
+        self.max_pending_keys = max_pending_keys
+        self._pending: Dict[str, Counter] = defaultdict(Counter)
+        self._meta: Dict[str, Dict[str, Any]] = {}
+        self._db: Optional[AsyncIOMotorDatabase] = None
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self.flushes = 0
+        self.flush_errors = 0
+
+    @property
+    def pending_keys(self) -> int:
+        return len(self._pending)
+
+    def _inc(self, doc_id: str, counters: Dict[str, float], meta: Optional[Dict[str, Any]] = None) -> None:
+        self._pending[doc_id].update(counters)
+        if meta and doc_id not in self._meta:
+            self._meta[doc_id] = meta
+        if len(self._pending) >= self.max_pending_keys and self._wakeup is not None:
+            self._wakeup.set()
+
+    def _inc_global(self, counters: Dict[str, float]) -> None:
+        now = datetime.utcnow()
+        self._inc(TOTALS_ID, counters, {"kind": "totals"})
+        self._inc(_day_id(now), counters, {"kind": "day", "day": now.strftime("%Y-%m-%d")})
+
+    # Events
+
+    def record_quiz(self, personality: str) -> None:
+        self._inc_global({"quizzes": 1, f"personality.{_safe_key(personality)}": 1})
+
+    def record_configuration(self, stone_id: str, setting_id: str, metal_id: str, personality_type: Optional[str]) -> None:
+        counters = {"configurations": 1}
+        if personality_type:
+            counters[f"configurations_by_personality.{_safe_key(personality_type)}"] = 1
+        self._inc_global(counters)
+        self._inc_combo(stone_id, setting_id, metal_id, {"saved": 1})
+
+    def record_quote(self, stone_id: str, setting_id: str, metal_id: str, total_price: float) -> None:
+        self._inc_global({"quotes": 1, "quote_value_sum": total_price})
+        self._inc_combo(stone_id, setting_id, metal_id, {"quoted": 1, "quote_value_sum": total_price})
+
+    def _inc_combo(self, stone_id: str, setting_id: str, metal_id: str, counters: Dict[str, float]) -> None:
+        self._inc(
+            f"combo:{stone_id}|{setting_id}|{metal_id}",
+            counters,
+            {"kind": "combo", "stone_id": stone_id, "setting_id": setting_id, "metal_id": metal_id}
+        )
+        for component, item_id in (("stone", stone_id), ("setting", setting_id), ("metal", metal_id)):
+            self._inc(
+                f"component:{component}:{item_id}",
+                counters,
+                {"kind": "component", "component": component, "item_id": item_id}
+            )
+
+    # Flushing
+
+    async def flush(self) -> int:
+        """Write pending counters as $inc upserts; returns the number of documents touched"""
+        if not self._pending or self._db is None:
+            return 0
+
+        pending, meta = self._pending, self._meta
+        self._pending, self._meta = defaultdict(Counter), {}
+        operations = []
+        for doc_id, counters in pending.items():
+            update = {"$inc": dict(counters)}
+            if doc_id in meta:
+                update["$setOnInsert"] = meta[doc_id]
+            operations.append(UpdateOne({"_id": doc_id}, update, upsert=True))
+        doc_ids = list(pending)
+        try:
+            await self._db.analytics_rollups.bulk_write(operations, ordered=False)
+            self.flushes += 1
+            return len(operations)
+        except BulkWriteError as e:
+            # An unordered bulk applies every operation it can; only the failed ones are retried, or the rest
+            # would be counted twice
+            failed = [doc_ids[error["index"]] for error in e.details.get("writeErrors", [])]
+            self.flush_errors += 1
+            logger.error("Error flushing %s of %s analytics rollups: %s", len(failed), len(operations), e)
+            self._requeue(failed, pending, meta)
+            return len(operations) - len(failed)
+        except Exception as e:
+            # Put the counters back so a transient failure doesn't lose events
+            self.flush_errors += 1
+            logger.error("Error flushing analytics rollups: %s", e)
+            self._requeue(doc_ids, pending, meta)
+            return 0
+
+    def _requeue(self, doc_ids: List[str], pending: Dict[str, Counter], meta: Dict[str, Dict[str, Any]]) -> None:
+        for doc_id in doc_ids:
+            self._pending[doc_id].update(pending[doc_id])
+            if doc_id in meta:
+                self._meta.setdefault(doc_id, meta[doc_id])
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    async def start(self, db: AsyncIOMotorDatabase) -> None:
+        self._db = db
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+
+analytics_recorder = AnalyticsRecorder(
+    flush_interval=float(os.environ.get("ANALYTICS_FLUSH_INTERVAL_SECONDS", "5")),
+    max_pending_keys=int(os.environ.get("ANALYTICS_MAX_PENDING_KEYS", "5000")),
+)
+
+
+class AnalyticsReader:
+    """Read side: every query hits a bounded number of rollup documents"""
+
+    def __init__(self, db: AsyncIOMotorDatabase):
+        self.collection = db.analytics_rollups
+
+    @staticmethod
+    def _summarize(doc: Dict[str, Any]) -> Dict[str, Any]:
+        quotes = doc.get("quotes", 0)
+        return {
+            "quizzes": doc.get("quizzes", 0),
+            "personalities": doc.get("personality", {}),
+            "configurations": doc.get("configurations", 0),
+            "configurations_by_personality": doc.get("configurations_by_personality", {}),
+            "quotes": quotes,
+            "average_quote_value": round(doc.get("quote_value_sum", 0) / quotes, 2) if quotes else None,
+        }
+
+    async def summary(self) -> Dict[str, Any]:
+        doc = await self.collection.find_one({"_id": TOTALS_ID}) or {}
+        return self._summarize(doc)
+
+    async def daily(self, days: int) -> List[Dict[str, Any]]:
+        today = datetime.utcnow()
+        ids = [_day_id(today - timedelta(days=offset)) for offset in range(days)]
+        docs = {doc["_id"]: doc async for doc in self.collection.find({"_id": {"$in": ids}})}
+        return [
+            {"day": doc_id[len("day:"):], **self._summarize(docs.get(doc_id, {}))}
+            for doc_id in reversed(ids)
+        ]
+
+    async def top_combinations(self, by: str, limit: int) -> List[Dict[str, Any]]:
+        cursor = self.collection.find({"kind": "combo"}, {"_id": 0, "kind": 0}).sort(by, -1).limit(limit)
+        return [self._with_average(doc) async for doc in cursor]
+
+    async def top_components(self, component: str, by: str, limit: int) -> List[Dict[str, Any]]:
+        cursor = self.collection.find(
+            {"kind": "component", "component": component},
+            {"_id": 0, "kind": 0}
+        ).sort(by, -1).limit(limit)
+        return [self._with_average(doc) async for doc in cursor]
+
+    @staticmethod
+    def _with_average(doc: Dict[str, Any]) -> Dict[str, Any]:
+        quoted = doc.get("quoted", 0)
+        doc["average_quote_value"] = round(doc.pop("quote_value_sum", 0) / quoted, 2) if quoted else None
+        return doc
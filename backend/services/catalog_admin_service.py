@@ -0,0 +1,158 @@
+from typing import List, Dict, Any, Type
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pydantic import BaseModel, TypeAdapter, ValidationError
+from pymongo import InsertOne, UpdateOne, UpdateMany
+from models.ring_builder import Stone, Setting, Metal
+from models.catalog_admin import (
+    CatalogItemOperation, StoneSizePriceUpdate, CutPriceUpdate, CatalogBulkRequest,
+    CatalogWriteCounts, CatalogBulkResponse,
+)
+from services.catalog_version import (
+    reserve_catalog_version, publish_catalog_version, release_catalog_version, get_catalog_version,
+)
+from services.catalog_revisions import record_version
+from services.storage_ids import encode_doc, match_id
+import logging
+
+logger = logging.getLogger(__name__)
+
+CATALOG_MODELS: Dict[str, Type[BaseModel]] = {
+    "stones": Stone,
+    "settings": Setting,
+    "metals": Metal,
+}
+
+# Fields that may never be changed through an update operation
+IMMUTABLE_FIELDS = {"id", "created_at"}
+# Catalog prices are stored in the base currency, in cents
+PRICE_DECIMALS = 2
+
+
+class CatalogAdminService:
+    def __init__(self, db: AsyncIOMotorDatabase):
+        self.db = db
+
+    def _validate_fields(self, model: Type[BaseModel], data: Dict[str, Any]) -> Dict[str, Any]:
+        """Validate a partial update against the model's field types"""
+        validated = {}
+        for name, value in data.items():
+            field = model.model_fields.get(name)
+            if field is None or name in IMMUTABLE_FIELDS:
+                raise ValueError(f"Field '{name}' cannot be updated on {model.__name__}")
+            try:
+                value = TypeAdapter(field.annotation).validate_python(value)
+            except ValidationError as e:
+                raise ValueError(f"Invalid value for {model.__name__}.{name}: {e.errors()[0]['msg']}")
+            validated[name] = TypeAdapter(field.annotation).dump_python(value)
+        return validated
+
+    def _item_operations(self, collection: str, operations: List[CatalogItemOperation], version: int) -> list:
+        """Translate create/update/deactivate operations into bulk_write requests"""
+        model = CATALOG_MODELS[collection]
+        requests = []
+        for operation in operations:
+            if operation.action == "create":
+                try:
+                    item = model(**operation.data)
+                except ValidationError as e:
+                    raise ValueError(f"Invalid {model.__name__}: {e.errors()[0]['msg']}")
+                requests.append(InsertOne(encode_doc({**item.dict(), "catalog_version": version})))
+            elif operation.action in ("update", "deactivate"):
+                if not operation.id:
+                    raise ValueError(f"{operation.action} on {collection} requires an id")
+                fields = self._validate_fields(model, operation.data) if operation.action == "update" else {}
+                if operation.action == "deactivate":
+                    fields["is_active"] = False
+                if not fields:
+                    raise ValueError(f"update on {collection} item {operation.id} has no fields")
+                requests.append(UpdateOne(
+                    {"id": match_id(operation.id)},
+                    {"$set": {**fields, "catalog_version": version}}
+                ))
+            else:
+                raise ValueError(f"Unknown catalog action '{operation.action}'")
+        return requests
+
+    def _size_price_operations(self, updates: List[StoneSizePriceUpdate], version: int) -> list:
+        """Per-size price/availability changes inside Stone.sizes via array filters"""
+        requests = []
+        for update in updates:
+            fields = {"catalog_version": version}
+            array_filters = []
+            for index, size in enumerate(update.sizes):
+                if size.price is not None:
+                    fields[f"sizes.$[s{index}].price"] = size.price
+                if size.availability is not None:
+                    fields[f"sizes.$[s{index}].availability"] = size.availability
+                array_filters.append({f"s{index}.carat": size.carat})
+            requests.append(UpdateOne({"id": match_id(update.stone_id)}, {"$set": fields}, array_filters=array_filters))
+        return requests
+
+    def _cut_price_operations(self, updates: List[CutPriceUpdate], version: int) -> list:
+        """Price changes across every stone of a cut, one UpdateMany per rule"""
+        requests = []
+        for update in updates:
+            if (update.price is None) == (update.multiplier is None):
+                raise ValueError(f"Cut price update for '{update.cut}' needs exactly one of price or multiplier")
+            if update.price is not None and update.carat is None:
+                raise ValueError(f"Absolute price update for '{update.cut}' requires a carat")
+
+            if update.price is not None:
+                change = {"$set": {"sizes.$[size].price": update.price, "catalog_version": version}}
+                requests.append(UpdateMany({"cut": update.cut}, change, array_filters=[{"size.carat": update.carat}]))
+                continue
+
+            # A pipeline so scaled prices are rounded to cents in the same write; $mul would store 495.00000000000006
+            price = {"$round": [{"$multiply": ["$$size.price", update.multiplier]}, PRICE_DECIMALS]}
+            if update.carat is not None:
+                price = {"$cond": [{"$eq": ["$$size.carat", update.carat]}, price, "$$size.price"]}
+            requests.append(UpdateMany({"cut": update.cut}, [{"$set": {
+                "sizes": {"$map": {"input": "$sizes", "as": "size", "in": {"$mergeObjects": ["$$size", {"price": price}]}}},
+                "catalog_version": version,
+            }}]))
+        return requests
+
+    async def apply_bulk(self, request: CatalogBulkRequest) -> CatalogBulkResponse:
+        """Apply a batch of catalog changes with one bulk_write per collection and one version bump"""
+        if not (request.stones or request.settings or request.metals or request.stone_size_prices or request.cut_prices):
+            return CatalogBulkResponse(catalog_version=await get_catalog_version(self.db))
+        version = await reserve_catalog_version(self.db)
+        try:
+            return await self._write_bulk(request, version)
+        except BaseException:
+            await release_catalog_version(self.db, version)
+            raise
+
+    async def _write_bulk(self, request: CatalogBulkRequest, version: int) -> CatalogBulkResponse:
+        # Build every request up front so validation errors abort before any write
+        batches = {
+            "stones": self._item_operations("stones", request.stones, version)
+                + self._size_price_operations(request.stone_size_prices, version)
+                + self._cut_price_operations(request.cut_prices, version),
+            "settings": self._item_operations("settings", request.settings, version),
+            "metals": self._item_operations("metals", request.metals, version),
+        }
+
+        counts = {}
+        written = 0
+        for collection, requests in batches.items():
+            if not requests:
+                counts[collection] = CatalogWriteCounts()
+                continue
+            result = await self.db[collection].bulk_write(requests, ordered=True)
+            counts[collection] = CatalogWriteCounts(
+                inserted=result.inserted_count,
+                matched=result.matched_count,
+                modified=result.modified_count
+            )
+            written += result.inserted_count + result.matched_count + result.upserted_count
+
+        if not written:
+            # Nothing matched: publishing would invalidate every catalog cache and ETag for no change
+            await release_catalog_version(self.db, version)
+            return CatalogBulkResponse(catalog_version=await get_catalog_version(self.db), **counts)
+
+        await record_version(self.db, version)
+        published = await publish_catalog_version(self.db, version)
+        logger.info("Applied catalog bulk update as version %s", version)
+        return CatalogBulkResponse(catalog_version=published, **counts)
@@ -0,0 +1,63 @@
+"""Immutable per-item catalog revisions.
+
+Every catalog write stamps the touched items with the catalog version it was
+published under and stores a copy of each changed item in catalog_revisions,
+once per (kind, item_id, catalog_version). Prices, configurations and quotes
+only reference (catalog_version, item_id, size); the item a customer saw can
+always be reconstructed from the latest revision at or below that version.
+"""
+from typing import Dict, List, Optional, Any
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import UpdateOne
+from services.storage_ids import encode_id, decode_doc, match_id
+import logging
+
+logger = logging.getLogger(__name__)
+
+CATALOG_KINDS = ("stones", "settings", "metals")
+
+
+async def record_revisions(db: AsyncIOMotorDatabase, kind: str, items: List[Dict[str, Any]], version: int) -> int:
+    """Store the given item documents as revisions at `version` (idempotent)"""
+    operations = []
+    for item in items:
+        item = decode_doc({key: value for key, value in item.items() if key != "_id"})
+        operations.append(UpdateOne(
+            {"kind": kind, "item_id": encode_id(item["id"]), "catalog_version": version},
+            {"$setOnInsert": {"item": item}},
+            upsert=True
+        ))
+    if not operations:
+        return 0
+    await db.catalog_revisions.bulk_write(operations, ordered=False)
+    return len(operations)
+
+
+async def record_version(db: AsyncIOMotorDatabase, version: int, batch_size: int = 1000) -> int:
+    """Record revisions for every item stamped with `version`, across all catalog collections"""
+    recorded = 0
+    for kind in CATALOG_KINDS:
+        cursor = db[kind].find({"catalog_version": version}, batch_size=batch_size)
+        batch = []
+        async for item in cursor:
+            batch.append(item)
+            if len(batch) >= batch_size:
+                recorded += await record_revisions(db, kind, batch, version)
+                batch = []
+        recorded += await record_revisions(db, kind, batch, version)
+    return recorded
+
+
+async def get_item_at(db: AsyncIOMotorDatabase, kind: str, item_id: str, version: Optional[int]) -> Optional[Dict[str, Any]]:
+    """The item as it was at catalog `version`, or its current state if it predates versioning"""
+    if version is not None:
+        revision = await db.catalog_revisions.find_one(
+            {"kind": kind, "item_id": match_id(item_id), "catalog_version": {"$lte": version}},
+            sort=[("catalog_version", -1)]
+        )
+        if revision:
+            return revision["item"]
+
+    item = await db[kind].find_one({"id": match_id(item_id)}, {"_id": 0})
+    return decode_doc(item) if item else None
+
@@ -0,0 +1,175 @@
+"""In-memory pricing view of the catalog.
+
+Holds just what pricing needs (stone size prices and cuts, setting base prices,
+metal multipliers) keyed by id, reloaded whenever the published catalog version
+moves. `price_selection` is the single pricing formula shared by everything
+that prices from the snapshot.
+"""
+from typing import Dict, Iterable, Optional, Any, TYPE_CHECKING
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from services.catalog_version import current_catalog_version
+from services.storage_ids import decode_id
+import asyncio
+import logging
+
+if TYPE_CHECKING:
+    from services.pricing_rules import CompiledRules
+
+logger = logging.getLogger(__name__)
+
+
+class CatalogSnapshot:
+    __slots__ = ("version", "published", "stones", "cuts", "settings", "metals", "currency", "rate", "decimals")
+
+    def __init__(self, version: int, published: int, stones: Dict[str, Dict[float, float]], cuts: Dict[str, str],
+                 settings: Dict[str, float], metals: Dict[str, float], currency: str = "USD", rate: float = 1.0,
+                 decimals: int = 2):
+        self.version = version
+        self.published = published  # published version the snapshot was loaded at
+        self.stones = stones      # stone id -> {carat: price}
+        self.cuts = cuts          # stone id -> cut
+        self.settings = settings  # setting id -> base price
+        self.metals = metals      # metal id -> multiplier
+        self.currency = currency
+        self.rate = rate          # conversion rate from the base currency
+        self.decimals = decimals
+
+
+def price_selection(snapshot: CatalogSnapshot, stone_id: str, setting_id: str, metal_id: str, carat: float,
+                    rules: Optional["CompiledRules"] = None, now: Optional[float] = None) -> Dict[str, Any]:
+    """Price a selection from the snapshot, applying pricing rule discounts when given"""
+    sizes = snapshot.stones.get(stone_id)
+    setting_price = snapshot.settings.get(setting_id)
+    multiplier = snapshot.metals.get(metal_id)
+    if sizes is None or setting_price is None or multiplier is None:
+        raise ValueError("Invalid stone, setting, or metal ID")
+
+    stone_price = sizes.get(carat)
+    if stone_price is None:
+        raise ValueError(f"Stone size {carat} carat not available")
+    return _price(snapshot, stone_id, setting_id, metal_id, carat, stone_price, setting_price, multiplier, rules, now)
+
+
+def reprice_selection(snapshot: CatalogSnapshot, selection: Dict[str, Any], changed: Iterable[str],
+                      breakdown: Optional[Dict[str, Any]], priced_version: Optional[int],
+                      rules: Optional["CompiledRules"] = None, now: Optional[float] = None) -> Dict[str, Any]:
+    """Price a selection after some of its components changed, reusing the unchanged parts of `breakdown`.
+
+    Stone and setting prices are carried over when the breakdown was priced at the snapshot's catalog version; the
+    metal adjustment and discounts depend on the whole selection and are always recomputed.
+    """
+    changed = set(changed)
+    reusable = breakdown is not None and priced_version == snapshot.version
+    stone_id, setting_id, metal_id, carat = (
+        selection["stone_id"], selection["setting_id"], selection["metal_id"], selection["carat"]
+    )
+    if not reusable or changed & {"stone_id", "carat"}:
+        stone_price = snapshot.stones.get(stone_id, {}).get(carat)
+        if stone_price is None:
+            if stone_id not in snapshot.stones:
+                raise ValueError("Invalid stone, setting, or metal ID")
+            raise ValueError(f"Stone size {carat} carat not available")
+    else:
+        stone_price = breakdown["stone"]
+    if not reusable or "setting_id" in changed:
+        setting_price = snapshot.settings.get(setting_id)
+    else:
+        setting_price = breakdown["setting"]
+    multiplier = snapshot.metals.get(metal_id)
+    if setting_price is None or multiplier is None:
+        raise ValueError("Invalid stone, setting, or metal ID")
+    return _price(snapshot, stone_id, setting_id, metal_id, carat, stone_price, setting_price, multiplier, rules, now)
+
+
+def _price(snapshot: CatalogSnapshot, stone_id: str, setting_id: str, metal_id: str, carat: float,
+           stone_price: float, setting_price: float, multiplier: float,
+           rules: Optional["CompiledRules"], now: Optional[float]) -> Dict[str, Any]:
+    metal_adjustment = (stone_price + setting_price) * (multiplier - 1.0)
+    total = stone_price + setting_price + metal_adjustment
+    discounts = []
+    if rules is not None:
+        discounts = rules.evaluate(
+            stone_id, snapshot.cuts.get(stone_id), setting_id, metal_id, carat,
+            {"stone": stone_price, "setting": setting_price, "metal_adjustment": metal_adjustment, "total": total},
+            rate=snapshot.rate, decimals=snapshot.decimals, now=now
+        )
+    savings = round(sum(line["amount"] for line in discounts), snapshot.decimals)
+    return {
+        "total_price": round(total - savings, snapshot.decimals),
+        "breakdown": {
+            "stone": stone_price,
+            "setting": setting_price,
+            "metal_adjustment": metal_adjustment,
+            "discounts": discounts,
+        },
+        "savings": savings,
+        "catalog_version": snapshot.version,
+        "currency": snapshot.currency,
+    }
+
+
+class CatalogState:
+    """Process-wide pricing snapshot, reloaded when the published catalog version changes"""
+
+    def __init__(self):
+        self.snapshot: Optional[CatalogSnapshot] = None
+        self.reloads = 0
+        self._lock = asyncio.Lock()
+
+    async def get(self, db: AsyncIOMotorDatabase) -> CatalogSnapshot:
+        """Current snapshot; costs one memoized version check when nothing changed"""
+        from services.shared_catalog import shared_catalog
+
+        version = await current_catalog_version(db)
+        # A host-wide snapshot file is used while it is current; if its refresher is stuck or failing, each worker
+        # loads the catalog itself rather than pricing from an old version
+        shared = shared_catalog.snapshot()
+        if shared is not None and shared.published >= version:
+            self.snapshot = shared
+            return shared
+
+        snapshot = self.snapshot
+        if snapshot is not None and snapshot.published >= version:
+            return snapshot
+        async with self._lock:
+            if self.snapshot is None or self.snapshot.published < version:
+                self.snapshot = await self.load(db, version)
+                self.reloads += 1
+            return self.snapshot
+
+    async def load(self, db: AsyncIOMotorDatabase, version: int) -> CatalogSnapshot:
+        """Read the pricing fields of every active catalog item; deactivated items can no longer be priced"""
+        newest = version
+        stones = {}
+        cuts = {}
+        async for doc in db.stones.find({"is_active": True}, {"_id": 0, "id": 1, "cut": 1, "sizes.carat": 1, "sizes.price": 1, "catalog_version": 1}):
+            stone_id = decode_id(doc["id"])
+            stones[stone_id] = {size["carat"]: size["price"] for size in doc.get("sizes", [])}
+            cuts[stone_id] = doc.get("cut")
+            newest = max(newest, doc.get("catalog_version") or 0)
+        settings = {}
+        async for doc in db.settings.find({"is_active": True}, {"_id": 0, "id": 1, "base_price": 1, "catalog_version": 1}):
+            settings[decode_id(doc["id"])] = doc["base_price"]
+            newest = max(newest, doc.get("catalog_version") or 0)
+        metals = {}
+        async for doc in db.metals.find({"is_active": True}, {"_id": 0, "id": 1, "multiplier": 1, "catalog_version": 1}):
+            metals[decode_id(doc["id"])] = doc["multiplier"]
+            newest = max(newest, doc.get("catalog_version") or 0)
+
+        # Items stamped above the published version were read mid-publish; label
+        # the snapshot with the newest stamp so it reproduces what was priced
+        logger.info("Loaded catalog snapshot at version %s: %s stones, %s settings, %s metals", newest, len(stones), len(settings), len(metals))
+        return CatalogSnapshot(newest, version, stones, cuts, settings, metals)
+
+    def stats(self) -> Dict[str, Any]:
+        snapshot = self.snapshot
+        return {
+            "catalog_version": snapshot.version if snapshot else None,
+            "stones": len(snapshot.stones) if snapshot else 0,
+            "settings": len(snapshot.settings) if snapshot else 0,
+            "metals": len(snapshot.metals) if snapshot else 0,
+            "reloads": self.reloads,
+        }
+
+
+catalog_state = CatalogState()
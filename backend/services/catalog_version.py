@@ -0,0 +1,125 @@
+from typing import Optional
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import ReturnDocument
+from datetime import datetime, timedelta
+import os
+import time
+
+CATALOG_VERSION_ID = "catalog"
+
+# How long a worker may serve a memoized catalog version before re-reading it
+VERSION_TTL_SECONDS = float(os.environ.get("CATALOG_VERSION_TTL_SECONDS", "1.0"))
+# A reservation neither published nor released after this long is treated as abandoned by a writer that died
+RESERVATION_TIMEOUT_SECONDS = float(os.environ.get("CATALOG_RESERVATION_TIMEOUT_SECONDS", "3600"))
+
+_memo = {"version": None, "expires_at": 0.0}
+
+
+async def get_catalog_version(db: AsyncIOMotorDatabase) -> int:
+    """Current published catalog version (0 if the catalog has never been versioned)"""
+    doc = await db.catalog_meta.find_one({"_id": CATALOG_VERSION_ID})
+    return doc.get("version", 0) if doc else 0
+
+
+async def current_catalog_version(db: AsyncIOMotorDatabase) -> int:
+    """Published catalog version, memoized briefly so hot paths don't read it per request"""
+    if _memo["version"] is None or _memo["expires_at"] <= time.monotonic():
+        _remember(await get_catalog_version(db))
+    return _memo["version"]
+
+
+def _remember(version: int) -> None:
+    if _memo["version"] is None or version >= _memo["version"]:
+        _memo["version"] = version
+    _memo["expires_at"] = time.monotonic() + VERSION_TTL_SECONDS
+
+
+async def reserve_catalog_version(db: AsyncIOMotorDatabase) -> int:
+    """Allocate the next catalog version without publishing it.
+
+    Writers stamp their changes with the reserved version and publish it once
+    the writes are durable, so caches never key fresh versions to stale data.
+    """
+    doc = await db.catalog_meta.find_one_and_update(
+        {"_id": CATALOG_VERSION_ID},
+        [{"$set": {
+            "allocated": {"$add": [
+                {"$max": [{"$ifNull": ["$allocated", 0]}, {"$ifNull": ["$version", 0]}]},
+                1
+            ]},
+            # Versions up to the published one were all written before reservations were tracked
+            "synced": {"$ifNull": ["$synced", {"$ifNull": ["$version", 0]}]},
+        }}],
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
+    version = doc["allocated"]
+    await db.catalog_reservations.update_one(
+        {"_id": version}, {"$setOnInsert": {"reserved_at": datetime.utcnow(), "done": False}}, upsert=True
+    )
+    return version
+
+
+async def publish_catalog_version(db: AsyncIOMotorDatabase, version: int) -> int:
+    """Publish a reserved version; the published version only ever moves forward"""
+    doc = await db.catalog_meta.find_one_and_update(
+        {"_id": CATALOG_VERSION_ID},
+        {"$max": {"version": version}, "$set": {"updated_at": datetime.utcnow()}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
+    _remember(doc["version"])
+    await release_catalog_version(db, version)
+    return doc["version"]
+
+
+async def release_catalog_version(db: AsyncIOMotorDatabase, version: int) -> None:
+    """Mark a reserved version finished; writers that end without publishing (no-ops, failures) must release it"""
+    await db.catalog_reservations.update_one({"_id": version}, {"$set": {"done": True}})
+
+
+async def synced_catalog_version(db: AsyncIOMotorDatabase) -> int:
+    """Highest published version whose changes, and those of every version below it, are all written.
+
+    Versions are reserved before a write and published after it, so a writer holding version N can still be
+    writing when a later writer publishes N + 1. Catalog deltas stop at this version instead, so items stamped
+    with N are not skipped by clients that already synced past it.
+    """
+    meta = await db.catalog_meta.find_one({"_id": CATALOG_VERSION_ID})
+    if not meta:
+        return 0
+    published = meta.get("version", 0)
+    synced = meta.get("synced", published)
+    if synced >= published:
+        return published
+
+    reservations = {
+        doc["_id"]: doc
+        async for doc in db.catalog_reservations.find({"_id": {"$gt": synced, "$lte": published}})
+    }
+    cutoff = datetime.utcnow() - timedelta(seconds=RESERVATION_TIMEOUT_SECONDS)
+    # A version with no reservation yet is between allocation and recording it, unless a later one has timed out
+    abandoned_below = max((v for v, doc in reservations.items() if doc["reserved_at"] < cutoff), default=0)
+    version = synced
+    while version < published:
+        doc = reservations.get(version + 1)
+        if doc is None:
+            if version + 1 >= abandoned_below:
+                break
+        elif not doc["done"] and doc["reserved_at"] >= cutoff:
+            break
+        version += 1
+
+    if version > synced:
+        await db.catalog_meta.update_one({"_id": CATALOG_VERSION_ID}, {"$max": {"synced": version}})
+        await db.catalog_reservations.delete_many({"_id": {"$lte": version}})
+    return version
+
+
+async def bump_catalog_version(db: AsyncIOMotorDatabase) -> int:
+    """Reserve and immediately publish a new catalog version"""
+    return await publish_catalog_version(db, await reserve_catalog_version(db))
+
+
+def catalog_etag(version: int, variant: Optional[str] = None) -> str:
+    return f'W/"catalog-{version}-{variant}"' if variant else f'W/"catalog-{version}"'
@@ -0,0 +1,109 @@
+from typing import Optional, Dict, Any
+from collections import OrderedDict
+from models.ring_builder import RingConfiguration
+import os
+import threading
+import time
+
+
+class ConfigurationCache:
+    """Size- and memory-bounded LRU cache of ring configurations with TTL expiry"""
+
+    def __init__(self, max_entries: int = 10000, max_bytes: int = 16 * 1024 * 1024, ttl_seconds: float = 3600):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        # config_id -> (configuration, approximate size in bytes, expiry timestamp)
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def _estimate_size(config: RingConfiguration) -> int:
+        """Approximate memory footprint of a configuration from its JSON size"""
+        return len(config.json()) + 200
+
+    def get(self, config_id: str) -> Optional[RingConfiguration]:
+        """Return a copy of the cached configuration, or None on miss/expiry"""
+        with self._lock:
+            entry = self._entries.get(config_id)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            config, size, expires_at = entry
+            if expires_at <= time.monotonic():
+                self._remove(config_id)
+                self.expirations += 1
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(config_id)
+            self.hits += 1
+        # Hand out copies so callers can't mutate the cached object
+        return config.copy(deep=True)
+
+    def put(self, config: RingConfiguration) -> None:
+        """Insert or replace a configuration, evicting least recently used entries"""
+        size = self._estimate_size(config)
+        if size > self.max_bytes or self.max_entries <= 0:
+            return
+
+        with self._lock:
+            if config.id in self._entries:
+                self._remove(config.id)
+
+            self._entries[config.id] = (config.copy(deep=True), size, time.monotonic() + self.ttl_seconds)
+            self._bytes += size
+
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                oldest_id = next(iter(self._entries))
+                self._remove(oldest_id)
+                self.evictions += 1
+
+    def invalidate(self, config_id: str) -> None:
+        """Drop a configuration; must be called by every path that updates or deletes one"""
+        with self._lock:
+            if config_id in self._entries:
+                self._remove(config_id)
+                self.invalidations += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def _remove(self, config_id: str) -> None:
+        _, size, _ = self._entries.pop(config_id)
+        self._bytes -= size
+
+    def stats(self) -> Dict[str, Any]:
+        """Cache statistics for monitoring"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+            }
+
+
+# Process-wide cache shared by all RingBuilderService instances
+configuration_cache = ConfigurationCache(
+    max_entries=int(os.environ.get("CONFIG_CACHE_MAX_ENTRIES", "10000")),
+    max_bytes=int(os.environ.get("CONFIG_CACHE_MAX_BYTES", str(16 * 1024 * 1024))),
+    ttl_seconds=float(os.environ.get("CONFIG_CACHE_TTL_SECONDS", "3600")),
+)
@@ -0,0 +1,96 @@
+"""Cross-worker invalidation for the per-worker configuration cache.
+
+An update records {config_id, origin, at} in configuration_invalidations; every
+worker polls for records newer than its last poll and drops those ids from its
+own cache, so a PATCH served by one worker is visible everywhere within one
+poll interval without adding a read to cache hits. Polls overlap by a few
+seconds to tolerate clock skew between writers; dropping an id twice is harmless.
+"""
+from typing import Dict, Any, Optional
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from services.config_cache import configuration_cache
+from services.storage_ids import decode_id, encode_id
+from datetime import datetime, timedelta
+import asyncio
+import logging
+import os
+import uuid
+
+logger = logging.getLogger(__name__)
+
+# Invalidation records are only needed for a few poll intervals; a TTL index removes them after this long
+RECORD_TTL_SECONDS = 3600
+
+
+class ConfigurationInvalidator:
+    def __init__(self, interval: float = 2.0, overlap: float = 5.0):
+        self.interval = interval
+        self.overlap = overlap
+        self.origin = uuid.uuid4().hex  # identifies this worker's own records, which it already applied
+        self.published = 0
+        self.applied = 0
+        self.poll_errors = 0
+        self._since: Optional[datetime] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def publish(self, db: AsyncIOMotorDatabase, config_id: str) -> None:
+        """Tell the other workers to drop their cached copy of a configuration"""
+        await db.configuration_invalidations.insert_one(
+            {"config_id": encode_id(config_id), "origin": self.origin, "at": datetime.utcnow()}
+        )
+        self.published += 1
+
+    async def poll(self, db: AsyncIOMotorDatabase) -> int:
+        """Drop every configuration another worker changed since the last poll"""
+        since, polled_at = self._since, datetime.utcnow()
+        if since is None:
+            self._since = polled_at
+            return 0
+        dropped = 0
+        async for record in db.configuration_invalidations.find(
+            {"at": {"$gt": since - timedelta(seconds=self.overlap)}, "origin": {"$ne": self.origin}},
+            {"_id": 0, "config_id": 1}
+        ):
+            configuration_cache.invalidate(decode_id(record["config_id"]))
+            dropped += 1
+        self._since = polled_at
+        self.applied += dropped
+        return dropped
+
+    async def _run(self, db: AsyncIOMotorDatabase) -> None:
+        while True:
+            try:
+                await self.poll(db)
+            except Exception as e:
+                self.poll_errors += 1
+                # Entries cached now could miss an update made during the outage; start over from an empty cache
+                configuration_cache.clear()
+                logger.error("Configuration invalidation poll failed: %s", e)
+            await asyncio.sleep(self.interval)
+
+    async def start(self, db: AsyncIOMotorDatabase) -> None:
+        if self._task is None:
+            self._since = datetime.utcnow()
+            self._task = asyncio.create_task(self._run(db))
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "interval_seconds": self.interval,
+            "published": self.published,
+            "applied": self.applied,
+            "poll_errors": self.poll_errors,
+        }
+
+
+configuration_invalidator = ConfigurationInvalidator(
+    interval=float(os.environ.get("CONFIG_INVALIDATION_INTERVAL_SECONDS", "2")),
+)
@@ -0,0 +1,188 @@
+"""Multi-currency pricing from precomputed conversion tables.
+
+Catalog prices are stored in the base currency (USD). Exchange rates and
+rounding rules come from the currency_meta document, managed through the admin
+API, or from the JSON file named by CURRENCY_RATES_FILE when no document exists:
+
+    {"base": "USD", "currencies": {"EUR": {"rate": 0.92}, "JPY": {"rate": 151.3, "decimals": 0}}}
+
+Whenever the rates or the catalog snapshot change, every stone size and setting
+price is converted for all currencies at once with numpy, producing one
+converted CatalogSnapshot per currency. Requests then price in any currency with
+the same dictionary lookups as in the base currency.
+"""
+from typing import Dict, Optional, Any, List, Tuple, TYPE_CHECKING
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import ReturnDocument
+from starlette.concurrency import run_in_threadpool
+from models.currency import CurrencyRates, CurrencyRule
+from services.catalog_state import CatalogSnapshot, catalog_state
+from datetime import datetime
+import asyncio
+import json
+import logging
+import os
+import time
+
+if TYPE_CHECKING:
+    import numpy as np
+
+logger = logging.getLogger(__name__)
+
+BASE_CURRENCY = "USD"
+RATES_ID = "rates"
+RATES_FILE = os.environ.get("CURRENCY_RATES_FILE")
+RATES_TTL_SECONDS = float(os.environ.get("CURRENCY_RATES_TTL_SECONDS", "5.0"))
+
+
+def round_prices(values: "np.ndarray", rule: CurrencyRule) -> "np.ndarray":
+    """Apply a currency's rounding rule to an array of converted prices"""
+    import numpy as np
+    step = rule.increment or 10.0 ** -rule.decimals
+    scaled = values / step
+    if rule.rounding == "up":
+        scaled = np.ceil(scaled - 1e-9)
+    elif rule.rounding == "down":
+        scaled = np.floor(scaled + 1e-9)
+    else:
+        scaled = np.round(scaled)
+    return np.round(scaled * step, rule.decimals)
+
+
+def load_rates_file(path: Optional[str]) -> Optional[CurrencyRates]:
+    if not path:
+        return None
+    try:
+        with open(path) as f:
+            return CurrencyRates(**json.load(f))
+    except Exception as e:
+        logger.error("Error loading currency rates from %s: %s", path, e)
+        return None
+
+
+async def get_rates(db: AsyncIOMotorDatabase) -> CurrencyRates:
+    """Rates document from the database, falling back to the rates file"""
+    doc = await db.currency_meta.find_one({"_id": RATES_ID}, {"_id": 0})
+    rates = CurrencyRates(**doc) if doc else load_rates_file(RATES_FILE) or CurrencyRates()
+    rates.currencies = {code.upper(): rule for code, rule in rates.currencies.items()}
+    return rates
+
+
+async def set_rates(db: AsyncIOMotorDatabase, rates: CurrencyRates) -> CurrencyRates:
+    """Replace the rates and rounding rules, bumping the rates version"""
+    if rates.base != BASE_CURRENCY:
+        raise ValueError(f"Rates must be quoted against {BASE_CURRENCY}")
+    doc = await db.currency_meta.find_one_and_update(
+        {"_id": RATES_ID},
+        {
+            "$set": {
+                "base": rates.base,
+                "currencies": {code.upper(): rule.dict() for code, rule in rates.currencies.items()},
+                "updated_at": datetime.utcnow(),
+            },
+            "$inc": {"version": 1},
+        },
+        projection={"_id": 0},
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
+    currency_tables.forget_rates()
+    return CurrencyRates(**doc)
+
+
+class CurrencyTables:
+    """Per-currency converted catalog snapshots, rebuilt when rates or the catalog change"""
+
+    def __init__(self):
+        self.rates: Optional[CurrencyRates] = None
+        self._rates_expires_at = 0.0
+        self._tables: Dict[str, CatalogSnapshot] = {}
+        self._built_for: Optional[Tuple[int, int, int]] = None
+        self._lock = asyncio.Lock()
+        self.rebuilds = 0
+
+    def forget_rates(self) -> None:
+        self._rates_expires_at = 0.0
+
+    async def current_rates(self, db: AsyncIOMotorDatabase) -> CurrencyRates:
+        if self.rates is None or self._rates_expires_at <= time.monotonic():
+            self.rates = await get_rates(db)
+            self._rates_expires_at = time.monotonic() + RATES_TTL_SECONDS
+        return self.rates
+
+    async def get(self, db: AsyncIOMotorDatabase, currency: Optional[str]) -> CatalogSnapshot:
+        """Catalog snapshot priced in `currency` (the base snapshot for the base currency)"""
+        snapshot = await catalog_state.get(db)
+        currency = (currency or BASE_CURRENCY).upper()
+        if currency == BASE_CURRENCY:
+            return snapshot
+
+        rates = await self.current_rates(db)
+        if currency not in rates.currencies:
+            raise ValueError(f"Unsupported currency '{currency}'")
+
+        key = (snapshot.published, snapshot.version, rates.version)
+        if self._built_for != key:
+            async with self._lock:
+                if self._built_for != key:
+                    self._tables = await run_in_threadpool(self._build, snapshot, rates)
+                    self._built_for = key
+                    self.rebuilds += 1
+        return self._tables[currency]
+
+    @staticmethod
+    def _build(snapshot: CatalogSnapshot, rates: CurrencyRates) -> Dict[str, CatalogSnapshot]:
+        """Convert every stone size and setting price for every currency in one vectorized pass each"""
+        import numpy as np
+        stone_keys: List[Tuple[str, float]] = [
+            (stone_id, carat) for stone_id, sizes in snapshot.stones.items() for carat in sizes
+        ]
+        stone_prices = np.fromiter((snapshot.stones[s][c] for s, c in stone_keys), dtype=np.float64, count=len(stone_keys))
+        setting_ids = list(snapshot.settings)
+        setting_prices = np.fromiter(snapshot.settings.values(), dtype=np.float64, count=len(setting_ids))
+
+        tables = {}
+        for code, rule in rates.currencies.items():
+            converted_stones = round_prices(stone_prices * rule.rate, rule).tolist()
+            converted_settings = round_prices(setting_prices * rule.rate, rule).tolist()
+            stones: Dict[str, Dict[float, float]] = {stone_id: {} for stone_id in snapshot.stones}
+            for (stone_id, carat), price in zip(stone_keys, converted_stones):
+                stones[stone_id][carat] = price
+            tables[code] = CatalogSnapshot(
+                snapshot.version,
+                snapshot.published,
+                stones,
+                snapshot.cuts,
+                dict(zip(setting_ids, converted_settings)),
+                snapshot.metals,
+                currency=code,
+                rate=rule.rate,
+                decimals=rule.decimals
+            )
+        logger.info("Built currency tables for %s currencies at catalog version %s", len(tables), snapshot.version)
+        return tables
+
+    def convert_stone(self, stone: Dict[str, Any], snapshot: CatalogSnapshot) -> Dict[str, Any]:
+        """Replace a stone dict's size prices with converted ones (in place)"""
+        sizes = snapshot.stones.get(stone["id"], {})
+        for size in stone.get("sizes") or []:
+            if size.get("carat") in sizes:
+                size["price"] = sizes[size["carat"]]
+        return stone
+
+    def convert_setting(self, setting: Dict[str, Any], snapshot: CatalogSnapshot) -> Dict[str, Any]:
+        """Replace a setting dict's base price with the converted one (in place)"""
+        if "base_price" in setting and setting["id"] in snapshot.settings:
+            setting["base_price"] = snapshot.settings[setting["id"]]
+        return setting
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "base": BASE_CURRENCY,
+            "currencies": sorted(self._tables),
+            "rates_version": self.rates.version if self.rates else None,
+            "rebuilds": self.rebuilds,
+        }
+
+
+currency_tables = CurrencyTables()
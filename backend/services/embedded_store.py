@@ -0,0 +1,939 @@
+"""In-process document store speaking the subset of Motor's API this service uses.
+
+With STORAGE_BACKEND=embedded, get_database() returns an EmbeddedDatabase
+instead of a Motor database, so every service (catalog, configurations, quotes,
+inventory, pricing rules, analytics, ...) runs unchanged without a MongoDB
+server: hermetic benchmarks, tests and single-node showroom installs.
+
+Supported, with MongoDB semantics:
+
+- filters: equality (dotted paths, array element matching, None matching
+  missing fields), $eq $ne $gt $gte $lt $lte $in $nin $exists, $and $or $nor
+- projections: inclusion or exclusion of (dotted) fields, _id on by default
+- updates: $set $setOnInsert $unset $inc $mul $min $max, positional $[] and
+  $[ident] with array_filters, and pipeline updates ($set/$addFields/$unset
+  stages with field paths, $add $subtract $multiply $max $min $ifNull $literal)
+- cursors: sort, skip, limit, to_list and async iteration
+- indexes: unique indexes raise DuplicateKeyError; equality and $in filters on
+  an index's first field read candidates from it instead of scanning; TTL
+  indexes (expireAfterSeconds) are swept once a minute like mongod's monitor
+- change streams raise OperationFailure, so watchers fall back to polling
+
+Each operation runs to completion without yielding to the event loop, which
+gives the same single-document atomicity MongoDB guarantees. With
+EMBEDDED_DB_PATH set, every write is also written through to SQLite (one table
+per collection, documents as extended JSON) and the data is loaded back on start.
+"""
+from typing import Dict, List, Optional, Any, Iterable, Tuple
+from bson import ObjectId, json_util
+from pymongo import InsertOne, UpdateOne, UpdateMany, ReplaceOne, DeleteOne, DeleteMany, ReturnDocument
+from pymongo.errors import DuplicateKeyError, OperationFailure
+from datetime import datetime, timedelta
+import re
+import sqlite3
+import threading
+import time
+
+TTL_SWEEP_SECONDS = 60.0
+_MISSING = object()
+_POSITIONAL = re.compile(r"^\$\[(\w*)\]$")
+
+
+def _copy(value: Any) -> Any:
+    if isinstance(value, dict):
+        return {key: _copy(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_copy(item) for item in value]
+    return value
+
+
+# Query matching
+
+def _resolve(value: Any, parts: List[str]) -> Iterable[Any]:
+    """Every value a dotted path reaches, descending into arrays like MongoDB does"""
+    if not parts:
+        yield value
+        return
+    head, rest = parts[0], parts[1:]
+    if isinstance(value, dict):
+        if head in value:
+            yield from _resolve(value[head], rest)
+        else:
+            yield _MISSING
+    elif isinstance(value, list):
+        if head.isdigit() and int(head) < len(value):
+            yield from _resolve(value[int(head)], rest)
+        found = False
+        for item in value:
+            if isinstance(item, dict):
+                found = True
+                yield from _resolve(item, parts)
+        if not found:
+            yield _MISSING
+    else:
+        yield _MISSING
+
+
+def _get(doc: Dict[str, Any], path: str) -> Any:
+    """Single value at a dotted path without array traversal (for sorting and expressions)"""
+    value: Any = doc
+    for part in path.split("."):
+        if isinstance(value, dict) and part in value:
+            value = value[part]
+        elif isinstance(value, list) and part.isdigit() and int(part) < len(value):
+            value = value[int(part)]
+        else:
+            return None
+    return value
+
+
+def _type_rank(value: Any) -> int:
+    # BSON comparison order: null, numbers, strings, objects, arrays, binary, ObjectId, bool, dates
+    if value is None or value is _MISSING:
+        return 0
+    if isinstance(value, bool):
+        return 7
+    if isinstance(value, (int, float)):
+        return 1
+    if isinstance(value, str):
+        return 2
+    if isinstance(value, dict):
+        return 3
+    if isinstance(value, list):
+        return 4
+    if isinstance(value, bytes):
+        return 5
+    if isinstance(value, ObjectId):
+        return 6
+    if isinstance(value, datetime):
+        return 8
+    return 9
+
+
+def _equal(value: Any, target: Any) -> bool:
+    if target is None:
+        return value is None or value is _MISSING
+    if value is _MISSING or _type_rank(value) != _type_rank(target):
+        return False
+    return value == target
+
+
+def _compare(value: Any, target: Any, op: str) -> bool:
+    if value is _MISSING or value is None or _type_rank(value) != _type_rank(target):
+        return False
+    if op == "$gt":
+        return value > target
+    if op == "$gte":
+        return value >= target
+    if op == "$lt":
+        return value < target
+    return value <= target
+
+
+def _candidates(values: Iterable[Any]) -> Iterable[Any]:
+    """Values plus the elements of array values, which queries also match against"""
+    for value in values:
+        yield value
+        if isinstance(value, list):
+            yield from value
+
+
+def _match_condition(values: List[Any], condition: Any) -> bool:
+    if isinstance(condition, dict) and condition and all(key.startswith("$") for key in condition):
+        for op, target in condition.items():
+            if op == "$eq":
+                ok = any(_equal(value, target) for value in _candidates(values))
+            elif op == "$ne":
+                ok = not any(_equal(value, target) for value in _candidates(values))
+            elif op in ("$gt", "$gte", "$lt", "$lte"):
+                ok = any(_compare(value, target, op) for value in _candidates(values))
+            elif op == "$in":
+                ok = any(_equal(value, item) for value in _candidates(values) for item in target)
+            elif op == "$nin":
+                ok = not any(_equal(value, item) for value in _candidates(values) for item in target)
+            elif op == "$exists":
+                ok = any(value is not _MISSING for value in values) == bool(target)
+            else:
+                raise OperationFailure(f"Unsupported query operator {op} in embedded store")
+            if not ok:
+                return False
+        return True
+    return any(_equal(value, condition) for value in _candidates(values))
+
+
+def matches(doc: Dict[str, Any], query: Optional[Dict[str, Any]]) -> bool:
+    """Whether a document satisfies a MongoDB filter"""
+    if not query:
+        return True
+    for key, condition in query.items():
+        if key == "$and":
+            if not all(matches(doc, clause) for clause in condition):
+                return False
+        elif key == "$or":
+            if not any(matches(doc, clause) for clause in condition):
+                return False
+        elif key == "$nor":
+            if any(matches(doc, clause) for clause in condition):
+                return False
+        elif not _match_condition(list(_resolve(doc, key.split("."))), condition):
+            return False
+    return True
+
+
+# Projection
+
+def _path_tree(paths: Iterable[str]) -> Dict[str, Any]:
+    tree: Dict[str, Any] = {}
+    for path in paths:
+        node = tree
+        parts = path.split(".")
+        for part in parts[:-1]:
+            node = node.setdefault(part, {})
+            if node is True:
+                break
+        else:
+            node[parts[-1]] = True
+    return tree
+
+
+def _include(value: Any, tree: Dict[str, Any]) -> Any:
+    if isinstance(value, list):
+        return [_include(item, tree) for item in value if isinstance(item, (dict, list))]
+    result = {}
+    for key, sub in tree.items():
+        if key not in value:
+            continue
+        if sub is True:
+            result[key] = _copy(value[key])
+        elif isinstance(value[key], (dict, list)):
+            result[key] = _include(value[key], sub)
+    return result
+
+
+def _exclude(value: Any, tree: Dict[str, Any]) -> Any:
+    if isinstance(value, list):
+        return [_exclude(item, tree) if isinstance(item, (dict, list)) else _copy(item) for item in value]
+    result = {}
+    for key, item in value.items():
+        sub = tree.get(key)
+        if sub is True:
+            continue
+        result[key] = _exclude(item, sub) if sub and isinstance(item, (dict, list)) else _copy(item)
+    return result
+
+
+def project(doc: Dict[str, Any], projection: Optional[Any]) -> Dict[str, Any]:
+    if not projection:
+        return _copy(doc)
+    if isinstance(projection, (list, tuple)):
+        projection = {field: 1 for field in projection}
+    include_id = bool(projection.get("_id", 1))
+    fields = {key: value for key, value in projection.items() if key != "_id"}
+    if fields and any(fields.values()):
+        result = _include(doc, _path_tree(key for key, value in fields.items() if value))
+        if include_id and "_id" in doc:
+            result = {"_id": doc["_id"], **result}
+        return result
+    excluded = [key for key, value in fields.items() if not value]
+    if not include_id:
+        excluded.append("_id")
+    return _exclude(doc, _path_tree(excluded))
+
+
+# Updates
+
+def _evaluate(expression: Any, doc: Dict[str, Any], variables: Optional[Dict[str, Any]] = None) -> Any:
+    """Aggregation expression subset used by pipeline updates"""
+    if isinstance(expression, str) and expression.startswith("$$"):
+        name, _, path = expression[2:].partition(".")
+        value = (variables or {}).get(name)
+        return _get(value, path) if path else value
+    if isinstance(expression, str) and expression.startswith("$"):
+        return _get(doc, expression[1:])
+    if isinstance(expression, list):
+        return [_evaluate(item, doc, variables) for item in expression]
+    if isinstance(expression, dict):
+        if len(expression) == 1:
+            op, args = next(iter(expression.items()))
+            if op == "$literal":
+                return args
+            if op == "$map":
+                items = _evaluate(args["input"], doc, variables)
+                if items is None:
+                    return None
+                name = args.get("as", "this")
+                return [_evaluate(args["in"], doc, {**(variables or {}), name: item}) for item in items]
+            if op == "$cond":
+                if isinstance(args, dict):
+                    args = [args["if"], args["then"], args["else"]]
+                branch = args[1] if _evaluate(args[0], doc, variables) else args[2]
+                return _evaluate(branch, doc, variables)
+            if op.startswith("$"):
+                values = _evaluate(args if isinstance(args, list) else [args], doc, variables)
+                if op == "$ifNull":
+                    return next((value for value in values if value is not None), None)
+                if op == "$eq":
+                    return values[0] == values[1]
+                if op == "$mergeObjects":
+                    merged: Dict[str, Any] = {}
+                    for value in values:
+                        merged.update(value or {})
+                    return merged
+                if any(value is None for value in values):
+                    return None
+                if op == "$add":
+                    return sum(values)
+                if op == "$subtract":
+                    return values[0] - values[1]
+                if op == "$multiply":
+                    product = 1
+                    for value in values:
+                        product *= value
+                    return product
+                if op == "$round":
+                    # Python's round is half-to-even like MongoDB's
+                    return round(values[0], values[1] if len(values) > 1 else 0)
+                if op == "$max":
+                    return max(values)
+                if op == "$min":
+                    return min(values)
+                raise OperationFailure(f"Unsupported expression {op} in embedded store")
+        return {key: _evaluate(value, doc, variables) for key, value in expression.items()}
+    return expression
+
+
+def _apply_to_path(container: Any, parts: List[str], apply, array_filters: Dict[str, List[Dict[str, Any]]]) -> None:
+    """Call apply(parent, key) for every location a (possibly positional) update path names"""
+    head, rest = parts[0], parts[1:]
+    positional = _POSITIONAL.match(head)
+    if positional is not None:
+        if not isinstance(container, list):
+            raise OperationFailure(f"Positional operator {head} applied to a non-array")
+        identifier = positional.group(1)
+        for index, item in enumerate(container):
+            if identifier and not all(matches({identifier: item}, condition) for condition in array_filters.get(identifier, [])):
+                continue
+            if rest:
+                _apply_to_path(item, rest, apply, array_filters)
+            else:
+                apply(container, index)
+        return
+    if isinstance(container, list):
+        if not head.isdigit():
+            raise OperationFailure(f"Cannot create field '{head}' in an array")
+        key: Any = int(head)
+        while len(container) <= key:
+            container.append(None)
+    else:
+        key = head
+    if not rest:
+        apply(container, key)
+        return
+    child = container[key] if isinstance(container, list) or key in container else None
+    if child is None or not isinstance(child, (dict, list)):
+        child = {}
+        container[key] = child
+    _apply_to_path(child, rest, apply, array_filters)
+
+
+def _parse_array_filters(array_filters: Optional[List[Dict[str, Any]]]) -> Dict[str, List[Dict[str, Any]]]:
+    parsed: Dict[str, List[Dict[str, Any]]] = {}
+    for condition in array_filters or []:
+        for key, value in condition.items():
+            parsed.setdefault(key.split(".", 1)[0], []).append({key: value})
+    return parsed
+
+
+def apply_update(doc: Dict[str, Any], update: Any, inserting: bool = False,
+                 array_filters: Optional[List[Dict[str, Any]]] = None) -> None:
+    """Apply an update document or pipeline to doc in place"""
+    if isinstance(update, list):
+        for stage in update:
+            for op, spec in stage.items():
+                if op in ("$set", "$addFields"):
+                    values = {path: _evaluate(expression, doc) for path, expression in spec.items()}
+                    for path, value in values.items():
+                        _apply_to_path(doc, path.split("."), lambda parent, key, value=value: parent.__setitem__(key, value), {})
+                elif op == "$unset":
+                    for path in [spec] if isinstance(spec, str) else spec:
+                        _apply_to_path(doc, path.split("."), lambda parent, key: parent.pop(key, None) if isinstance(parent, dict) else None, {})
+                else:
+                    raise OperationFailure(f"Unsupported pipeline stage {op} in embedded store")
+        return
+
+    filters = _parse_array_filters(array_filters)
+    for op, spec in update.items():
+        if op == "$setOnInsert" and not inserting:
+            continue
+        for path, argument in spec.items():
+            if op in ("$set", "$setOnInsert"):
+                def apply(parent, key, argument=argument):
+                    parent[key] = _copy(argument)
+            elif op == "$unset":
+                def apply(parent, key):
+                    if isinstance(parent, dict):
+                        parent.pop(key, None)
+                    else:
+                        parent[key] = None
+            elif op in ("$inc", "$mul"):
+                def apply(parent, key, op=op, argument=argument):
+                    current = parent[key] if (isinstance(parent, list) or key in parent) else None
+                    if current is None:
+                        parent[key] = argument if op == "$inc" else 0 * argument
+                    else:
+                        parent[key] = current + argument if op == "$inc" else current * argument
+            elif op in ("$max", "$min"):
+                def apply(parent, key, op=op, argument=argument):
+                    current = parent[key] if (isinstance(parent, list) or key in parent) else None
+                    if current is None or (argument > current if op == "$max" else argument < current):
+                        parent[key] = argument
+            else:
+                raise OperationFailure(f"Unsupported update operator {op} in embedded store")
+            _apply_to_path(doc, path.split("."), apply, filters)
+
+
+def _seed_from_filter(query: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Fields an upsert inherits from the equality conditions of its filter"""
+    doc: Dict[str, Any] = {}
+    for key, condition in (query or {}).items():
+        if key.startswith("$"):
+            continue
+        if isinstance(condition, dict) and condition and all(op.startswith("$") for op in condition):
+            if "$eq" not in condition:
+                continue
+            condition = condition["$eq"]
+        _apply_to_path(doc, key.split("."), lambda parent, name, value=condition: parent.__setitem__(name, _copy(value)), {})
+    return doc
+
+
+# Results
+
+class InsertOneResult:
+    def __init__(self, inserted_id: Any):
+        self.inserted_id = inserted_id
+        self.acknowledged = True
+
+
+class InsertManyResult:
+    def __init__(self, inserted_ids: List[Any]):
+        self.inserted_ids = inserted_ids
+        self.acknowledged = True
+
+
+class UpdateResult:
+    def __init__(self, matched_count: int = 0, modified_count: int = 0, upserted_id: Any = None):
+        self.matched_count = matched_count
+        self.modified_count = modified_count
+        self.upserted_id = upserted_id
+        self.acknowledged = True
+
+
+class DeleteResult:
+    def __init__(self, deleted_count: int = 0):
+        self.deleted_count = deleted_count
+        self.acknowledged = True
+
+
+class BulkWriteResult:
+    def __init__(self):
+        self.inserted_count = 0
+        self.matched_count = 0
+        self.modified_count = 0
+        self.deleted_count = 0
+        self.upserted_count = 0
+        self.upserted_ids: Dict[int, Any] = {}
+        self.acknowledged = True
+
+
+# Indexes
+
+def _index_key(value: Any) -> Any:
+    """Hashable index key for a scalar, or _MISSING when the value must be scanned (arrays, documents)"""
+    if value is _MISSING:
+        return None
+    if isinstance(value, (dict, list)):
+        return _MISSING
+    return value
+
+
+class _Index:
+    def __init__(self, name: str, keys: List[Tuple[str, int]], unique: bool, expire_after: Optional[float]):
+        self.name = name
+        self.fields = [field for field, _ in keys]
+        self.unique = unique
+        self.expire_after = expire_after
+        self.entries: Dict[Any, set] = {}  # first-field value -> document keys
+        self.unindexed: set = set()  # documents whose first field is an array or document
+        self.unique_keys: Dict[Tuple, Any] = {}
+
+    def _first(self, doc: Dict[str, Any]) -> Any:
+        values = list(_resolve(doc, self.fields[0].split(".")))
+        return _index_key(values[0]) if len(values) == 1 else _MISSING
+
+    def _unique_key(self, doc: Dict[str, Any]) -> Optional[Tuple]:
+        key = []
+        for field in self.fields:
+            values = list(_resolve(doc, field.split(".")))
+            if len(values) != 1 or isinstance(values[0], (dict, list)):
+                return None
+            key.append(None if values[0] is _MISSING else values[0])
+        return tuple(key)
+
+    def check(self, doc_key: Any, doc: Dict[str, Any]) -> None:
+        if not self.unique:
+            return
+        key = self._unique_key(doc)
+        owner = self.unique_keys.get(key) if key is not None else None
+        if owner is not None and owner != doc_key:
+            raise DuplicateKeyError(f"E11000 duplicate key error index: {self.name} dup key: {key}")
+
+    def add(self, doc_key: Any, doc: Dict[str, Any]) -> None:
+        first = self._first(doc)
+        if first is _MISSING:
+            self.unindexed.add(doc_key)
+        else:
+            self.entries.setdefault(first, set()).add(doc_key)
+        if self.unique:
+            key = self._unique_key(doc)
+            if key is not None:
+                self.unique_keys[key] = doc_key
+
+    def remove(self, doc_key: Any, doc: Dict[str, Any]) -> None:
+        first = self._first(doc)
+        if first is _MISSING:
+            self.unindexed.discard(doc_key)
+        else:
+            bucket = self.entries.get(first)
+            if bucket is not None:
+                bucket.discard(doc_key)
+                if not bucket:
+                    del self.entries[first]
+        if self.unique:
+            key = self._unique_key(doc)
+            if key is not None and self.unique_keys.get(key) == doc_key:
+                del self.unique_keys[key]
+
+    def lookup(self, condition: Any) -> Optional[set]:
+        """Candidate document keys for a condition on the first field, or None if it can't narrow"""
+        if isinstance(condition, dict) and condition and all(op.startswith("$") for op in condition):
+            if set(condition) == {"$eq"}:
+                targets = [condition["$eq"]]
+            elif set(condition) == {"$in"}:
+                targets = list(condition["$in"])
+            else:
+                return None
+        else:
+            targets = [condition]
+        found = set(self.unindexed)
+        for target in targets:
+            if isinstance(target, (dict, list)):
+                return None
+            found |= self.entries.get(target, set())
+        return found
+
+
+# Collections and cursors
+
+class EmbeddedCursor:
+    def __init__(self, collection: "EmbeddedCollection", query: Optional[Dict[str, Any]], projection: Any):
+        self._collection = collection
+        self._query = query
+        self._projection = projection
+        self._sort: List[Tuple[str, int]] = []
+        self._skip = 0
+        self._limit = 0
+        self._results: Optional[List[Dict[str, Any]]] = None
+
+    def sort(self, key_or_list: Any, direction: int = 1) -> "EmbeddedCursor":
+        self._sort = [(key_or_list, direction)] if isinstance(key_or_list, str) else list(key_or_list)
+        return self
+
+    def skip(self, count: int) -> "EmbeddedCursor":
+        self._skip = count
+        return self
+
+    def limit(self, count: int) -> "EmbeddedCursor":
+        self._limit = count
+        return self
+
+    def batch_size(self, size: int) -> "EmbeddedCursor":
+        return self
+
+    def _evaluate(self) -> List[Dict[str, Any]]:
+        if self._results is None:
+            docs = self._collection._matching(self._query)
+            for field, direction in reversed(self._sort):
+                docs.sort(key=lambda doc: (_type_rank(_get(doc, field)), _get(doc, field)) if _get(doc, field) is not None
+                          else (0, 0), reverse=direction < 0)
+            docs = docs[self._skip:]
+            if self._limit:
+                docs = docs[:self._limit]
+            self._results = [project(doc, self._projection) for doc in docs]
+        return self._results
+
+    async def to_list(self, length: Optional[int] = None) -> List[Dict[str, Any]]:
+        results = self._evaluate()
+        return results[:length] if length else list(results)
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for doc in self._evaluate():
+            yield doc
+
+
+class EmbeddedCollection:
+    def __init__(self, database: "EmbeddedDatabase", name: str):
+        self.database = database
+        self.name = name
+        self._docs: Dict[Any, Dict[str, Any]] = {}
+        self._indexes: Dict[str, _Index] = {}
+        self._next_sweep = 0.0
+
+    # Storage helpers
+
+    def _key(self, doc: Dict[str, Any]) -> Any:
+        return doc["_id"]
+
+    def _store(self, doc: Dict[str, Any], previous: Optional[Dict[str, Any]] = None) -> None:
+        key = self._key(doc)
+        for index in self._indexes.values():
+            index.check(key, doc)
+        for index in self._indexes.values():
+            if previous is not None:
+                index.remove(key, previous)
+            index.add(key, doc)
+        self._docs[key] = doc
+        self.database._persist(self.name, key, doc)
+
+    def _drop(self, key: Any) -> None:
+        doc = self._docs.pop(key)
+        for index in self._indexes.values():
+            index.remove(key, doc)
+        self.database._persist(self.name, key, None)
+
+    def _sweep_expired(self) -> None:
+        now = time.monotonic()
+        if now < self._next_sweep:
+            return
+        self._next_sweep = now + TTL_SWEEP_SECONDS
+        for index in self._indexes.values():
+            if index.expire_after is None:
+                continue
+            cutoff = datetime.utcnow() - timedelta(seconds=index.expire_after)
+            field = index.fields[0]
+            expired = [key for key, doc in self._docs.items()
+                       if isinstance(_get(doc, field), datetime) and _get(doc, field).replace(tzinfo=None) <= cutoff]
+            for key in expired:
+                self._drop(key)
+
+    def _matching(self, query: Optional[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        self._sweep_expired()
+        candidates = None
+        for field, condition in (query or {}).items():
+            for index in self._indexes.values():
+                if index.fields[0] == field:
+                    found = index.lookup(condition)
+                    if found is not None and (candidates is None or len(found) < len(candidates)):
+                        candidates = found
+        if candidates is None:
+            docs: Iterable[Dict[str, Any]] = self._docs.values()
+        else:
+            # Keep natural (insertion) order like a collection scan would
+            docs = sorted((self._docs[key] for key in candidates if key in self._docs),
+                          key=lambda doc: self._order(doc))
+        return [doc for doc in docs if matches(doc, query)]
+
+    def _order(self, doc: Dict[str, Any]) -> int:
+        return self.database._order.get((self.name, self._key(doc)), 0)
+
+    def _insert(self, doc: Dict[str, Any]) -> Any:
+        if "_id" not in doc:
+            doc["_id"] = ObjectId()
+        if doc["_id"] in self._docs:
+            raise DuplicateKeyError(f"E11000 duplicate key error index: _id_ dup key: {doc['_id']}")
+        stored = _copy(doc)
+        self.database._order[(self.name, doc["_id"])] = next(self.database._counter)
+        self._store(stored)
+        return doc["_id"]
+
+    def _update(self, query: Optional[Dict[str, Any]], update: Any, upsert: bool, multi: bool,
+                array_filters: Optional[List[Dict[str, Any]]] = None) -> Tuple[UpdateResult, List[Any]]:
+        docs = self._matching(query)
+        if not multi:
+            docs = docs[:1]
+        result = UpdateResult(matched_count=len(docs))
+        touched = []
+        for doc in docs:
+            updated = _copy(doc)
+            apply_update(updated, update, array_filters=array_filters)
+            touched.append(self._key(doc))
+            if updated != doc:
+                if updated.get("_id") != doc["_id"]:
+                    raise OperationFailure("Performing an update on the path '_id' would modify the immutable field '_id'")
+                self._store(updated, previous=doc)
+                result.modified_count += 1
+        if not docs and upsert:
+            seed = _seed_from_filter(query)
+            apply_update(seed, update, inserting=True, array_filters=array_filters)
+            result.upserted_id = self._insert(seed)
+            touched.append(result.upserted_id)
+        return result, touched
+
+    # Motor-compatible API
+
+    def find(self, filter: Optional[Dict[str, Any]] = None, projection: Any = None, **kwargs) -> EmbeddedCursor:
+        cursor = EmbeddedCursor(self, filter, projection)
+        if kwargs.get("sort"):
+            cursor.sort(kwargs["sort"])
+        if kwargs.get("limit"):
+            cursor.limit(kwargs["limit"])
+        return cursor
+
+    async def find_one(self, filter: Optional[Dict[str, Any]] = None, projection: Any = None, **kwargs) -> Optional[Dict[str, Any]]:
+        with self.database._lock:
+            results = await self.find(filter, projection, **kwargs).limit(1).to_list(1)
+        return results[0] if results else None
+
+    async def count_documents(self, filter: Dict[str, Any], limit: int = 0, **kwargs) -> int:
+        with self.database._lock:
+            count = len(self._matching(filter))
+        return min(count, limit) if limit else count
+
+    async def insert_one(self, document: Dict[str, Any], **kwargs) -> InsertOneResult:
+        with self.database._lock, self.database._transaction():
+            return InsertOneResult(self._insert(document))
+
+    async def insert_many(self, documents: List[Dict[str, Any]], ordered: bool = True, **kwargs) -> InsertManyResult:
+        inserted = []
+        with self.database._lock, self.database._transaction():
+            for document in documents:
+                inserted.append(self._insert(document))
+        return InsertManyResult(inserted)
+
+    async def update_one(self, filter: Dict[str, Any], update: Any, upsert: bool = False,
+                         array_filters: Optional[List[Dict[str, Any]]] = None, **kwargs) -> UpdateResult:
+        with self.database._lock, self.database._transaction():
+            return self._update(filter, update, upsert, multi=False, array_filters=array_filters)[0]
+
+    async def update_many(self, filter: Dict[str, Any], update: Any, upsert: bool = False,
+                          array_filters: Optional[List[Dict[str, Any]]] = None, **kwargs) -> UpdateResult:
+        with self.database._lock, self.database._transaction():
+            return self._update(filter, update, upsert, multi=True, array_filters=array_filters)[0]
+
+    async def replace_one(self, filter: Dict[str, Any], replacement: Dict[str, Any], upsert: bool = False, **kwargs) -> UpdateResult:
+        with self.database._lock, self.database._transaction():
+            return self._replace(filter, replacement, upsert)
+
+    def _replace(self, filter: Dict[str, Any], replacement: Dict[str, Any], upsert: bool) -> UpdateResult:
+        docs = self._matching(filter)[:1]
+        if docs:
+            updated = {"_id": docs[0]["_id"], **_copy(replacement)}
+            modified = updated != docs[0]
+            if modified:
+                self._store(updated, previous=docs[0])
+            return UpdateResult(matched_count=1, modified_count=int(modified))
+        if upsert:
+            seed = _seed_from_filter(filter)
+            seed.update(_copy(replacement))
+            return UpdateResult(upserted_id=self._insert(seed))
+        return UpdateResult()
+
+    async def find_one_and_update(self, filter: Dict[str, Any], update: Any, projection: Any = None,
+                                  sort: Any = None, upsert: bool = False,
+                                  return_document: bool = ReturnDocument.BEFORE,
+                                  array_filters: Optional[List[Dict[str, Any]]] = None, **kwargs) -> Optional[Dict[str, Any]]:
+        with self.database._lock, self.database._transaction():
+            docs = self._matching(filter)
+            if sort:
+                docs = EmbeddedCursor(self, filter, None).sort(sort)._evaluate()
+            before = _copy(docs[0]) if docs else None
+            target = {"_id": docs[0]["_id"]} if docs else filter
+            _, touched = self._update(target, update, upsert and not docs, multi=False, array_filters=array_filters)
+            if return_document == ReturnDocument.AFTER:
+                after = self._docs.get(touched[0]) if touched else None
+                return project(after, projection) if after is not None else None
+            return project(before, projection) if before is not None else None
+
+    async def delete_one(self, filter: Dict[str, Any], **kwargs) -> DeleteResult:
+        with self.database._lock, self.database._transaction():
+            docs = self._matching(filter)[:1]
+            for doc in docs:
+                self._drop(self._key(doc))
+            return DeleteResult(len(docs))
+
+    async def delete_many(self, filter: Dict[str, Any], **kwargs) -> DeleteResult:
+        with self.database._lock, self.database._transaction():
+            docs = self._matching(filter)
+            for doc in docs:
+                self._drop(self._key(doc))
+            return DeleteResult(len(docs))
+
+    async def bulk_write(self, requests: List[Any], ordered: bool = True, **kwargs) -> BulkWriteResult:
+        result = BulkWriteResult()
+        errors = []
+        with self.database._lock, self.database._transaction():
+            for position, request in enumerate(requests):
+                try:
+                    if isinstance(request, InsertOne):
+                        self._insert(request._doc)
+                        result.inserted_count += 1
+                    elif isinstance(request, (UpdateOne, UpdateMany)):
+                        outcome, _ = self._update(request._filter, request._doc, request._upsert,
+                                                  multi=isinstance(request, UpdateMany), array_filters=request._array_filters)
+                        result.matched_count += outcome.matched_count
+                        result.modified_count += outcome.modified_count
+                        if outcome.upserted_id is not None:
+                            result.upserted_count += 1
+                            result.upserted_ids[position] = outcome.upserted_id
+                    elif isinstance(request, ReplaceOne):
+                        outcome = self._replace(request._filter, request._doc, request._upsert)
+                        result.matched_count += outcome.matched_count
+                        result.modified_count += outcome.modified_count
+                        if outcome.upserted_id is not None:
+                            result.upserted_count += 1
+                            result.upserted_ids[position] = outcome.upserted_id
+                    elif isinstance(request, (DeleteOne, DeleteMany)):
+                        docs = self._matching(request._filter)
+                        if isinstance(request, DeleteOne):
+                            docs = docs[:1]
+                        for doc in docs:
+                            self._drop(self._key(doc))
+                        result.deleted_count += len(docs)
+                    else:
+                        raise OperationFailure(f"Unsupported bulk operation {type(request).__name__}")
+                except DuplicateKeyError as e:
+                    if ordered:
+                        raise
+                    errors.append(e)
+        if errors:
+            raise errors[0]
+        return result
+
+    async def create_index(self, keys: Any, unique: bool = False, expireAfterSeconds: Optional[float] = None,
+                           name: Optional[str] = None, **kwargs) -> str:
+        keys = [(keys, 1)] if isinstance(keys, str) else list(keys)
+        name = name or "_".join(f"{field}_{direction}" for field, direction in keys)
+        with self.database._lock:
+            if name in self._indexes:
+                return name
+            index = _Index(name, keys, unique, expireAfterSeconds)
+            for key, doc in self._docs.items():
+                index.check(key, doc)
+                index.add(key, doc)
+            self._indexes[name] = index
+        return name
+
+    async def drop(self) -> None:
+        with self.database._lock, self.database._transaction():
+            for key in list(self._docs):
+                self._drop(key)
+
+    def watch(self, *args, **kwargs):
+        # Code 40573: change streams need a replica set; watchers fall back to polling
+        raise OperationFailure("Change streams are not supported by the embedded store", code=40573)
+
+
+class EmbeddedDatabase:
+    def __init__(self, name: str = "embedded", path: Optional[str] = None):
+        self.name = name
+        self.path = path
+        self._collections: Dict[str, EmbeddedCollection] = {}
+        self._lock = threading.RLock()
+        self._order: Dict[Tuple[str, Any], int] = {}
+        self._counter = iter(range(1, 1 << 62))
+        self._sqlite: Optional[sqlite3.Connection] = None
+        self._depth = 0
+        if path:
+            self._sqlite = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+            self._sqlite.execute("PRAGMA journal_mode=WAL")
+            self._sqlite.execute("PRAGMA synchronous=NORMAL")
+            self._load()
+
+    def __getitem__(self, name: str) -> EmbeddedCollection:
+        collection = self._collections.get(name)
+        if collection is None:
+            with self._lock:
+                collection = self._collections.setdefault(name, EmbeddedCollection(self, name))
+        return collection
+
+    def __getattr__(self, name: str) -> EmbeddedCollection:
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return self[name]
+
+    def get_collection(self, name: str) -> EmbeddedCollection:
+        return self[name]
+
+    async def list_collection_names(self) -> List[str]:
+        return [name for name, collection in self._collections.items() if collection._docs]
+
+    async def command(self, command: Any, value: Any = None, **kwargs) -> Dict[str, Any]:
+        if command == "ping":
+            return {"ok": 1.0}
+        if command == "collStats":
+            docs = self[value]._docs
+            size = sum(len(json_util.dumps(doc)) for doc in docs.values())
+            return {"ok": 1.0, "count": len(docs), "size": size, "avgObjSize": size // len(docs) if docs else 0}
+        raise OperationFailure(f"Unsupported command {command} in embedded store")
+
+    # SQLite persistence
+
+    @staticmethod
+    def _table(name: str) -> str:
+        return '"c_' + name.replace('"', '""') + '"'
+
+    def _load(self) -> None:
+        tables = [row[0] for row in self._sqlite.execute(
+            "SELECT name FROM sqlite_master WHERE type='table' AND name LIKE 'c\\_%' ESCAPE '\\'")]
+        for table in tables:
+            collection = self[table[2:]]
+            for _, doc in self._sqlite.execute(f'SELECT key, doc FROM "{table}" ORDER BY rowid'):
+                doc = json_util.loads(doc)
+                self._order[(collection.name, doc["_id"])] = next(self._counter)
+                collection._docs[doc["_id"]] = doc
+
+    def _persist(self, collection: str, key: Any, doc: Optional[Dict[str, Any]]) -> None:
+        if self._sqlite is None:
+            return
+        table = self._table(collection)
+        self._sqlite.execute(f"CREATE TABLE IF NOT EXISTS {table} (key TEXT PRIMARY KEY, doc TEXT NOT NULL)")
+        encoded_key = json_util.dumps(key)
+        if doc is None:
+            self._sqlite.execute(f"DELETE FROM {table} WHERE key = ?", (encoded_key,))
+        else:
+            # An upsert rather than INSERT OR REPLACE keeps the rowid, so reloads preserve insertion order
+            self._sqlite.execute(f"INSERT INTO {table} (key, doc) VALUES (?, ?) "
+                                 "ON CONFLICT(key) DO UPDATE SET doc = excluded.doc",
+                                 (encoded_key, json_util.dumps(doc)))
+
+    def _transaction(self):
+        return _Transaction(self)
+
+    def close(self) -> None:
+        if self._sqlite is not None:
+            self._sqlite.close()
+            self._sqlite = None
+
+
+class _Transaction:
+    """Groups one operation's SQLite writes into a single commit"""
+
+    def __init__(self, database: EmbeddedDatabase):
+        self.database = database
+
+    def __enter__(self):
+        database = self.database
+        if database._sqlite is not None and database._depth == 0:
+            database._sqlite.execute("BEGIN")
+        database._depth += 1
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        database = self.database
+        database._depth -= 1
+        if database._sqlite is not None and database._depth == 0:
+            # Memory is already updated, so keep the file in step even when the operation failed part way
+            database._sqlite.execute("COMMIT")
+        return False
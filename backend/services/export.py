@@ -0,0 +1,194 @@
+from typing import AsyncIterator, Dict, List, Optional, Any, Tuple
+from motor.motor_asyncio import AsyncIOMotorCollection
+from starlette.concurrency import run_in_threadpool
+from datetime import datetime
+from services.storage_ids import decode_id
+import csv
+import io
+import json
+
+# (column name, dotted document path(s), parquet type); the first path present wins
+QUOTE_COLUMNS: List[Tuple[str, Any, str]] = [
+    ("quote_request_id", "quote_request_id", "string"),
+    ("status", "status", "string"),
+    ("created_at", "created_at", "timestamp"),
+    ("customer_name", "customer_details.name", "string"),
+    ("customer_email", "customer_details.email", "string"),
+    ("customer_phone", "customer_details.phone", "string"),
+    ("customer_message", "customer_details.message", "string"),
+    ("configuration_id", ("configuration_ref.configuration_id", "configuration.id"), "string"),
+    ("catalog_version", ("configuration_ref.catalog_version",), "int64"),
+    ("stone_id", ("configuration_ref.stone_id", "configuration.stone_id"), "string"),
+    ("setting_id", ("configuration_ref.setting_id", "configuration.setting_id"), "string"),
+    ("metal_id", ("configuration_ref.metal_id", "configuration.metal_id"), "string"),
+    ("carat", ("configuration_ref.carat", "configuration.carat"), "double"),
+    ("personality_type", ("configuration_ref.personality_type", "configuration.personality_type"), "string"),
+    ("total_price", ("configuration_ref.total_price", "configuration.total_price"), "double"),
+]
+
+CONFIGURATION_COLUMNS: List[Tuple[str, Any, str]] = [
+    ("configuration_id", "id", "string"),
+    ("stone_id", "stone_id", "string"),
+    ("setting_id", "setting_id", "string"),
+    ("metal_id", "metal_id", "string"),
+    ("carat", "carat", "double"),
+    ("personality_type", "personality_type", "string"),
+    ("total_price", "total_price", "double"),
+    ("catalog_version", "catalog_version", "int64"),
+    ("created_at", "created_at", "timestamp"),
+    ("updated_at", "updated_at", "timestamp"),
+]
+
+MEDIA_TYPES = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+
+def _paths(path) -> Tuple[str, ...]:
+    return (path,) if isinstance(path, str) else tuple(path)
+
+
+def _lookup(doc: Dict[str, Any], path) -> Any:
+    for candidate in _paths(path):
+        value = doc
+        for part in candidate.split("."):
+            if not isinstance(value, dict):
+                value = None
+                break
+            value = value.get(part)
+        if value is not None:
+            return decode_id(value)
+    return None
+
+
+class CsvEncoder:
+    def __init__(self, columns):
+        self.columns = columns
+        self._header_written = False
+
+    def encode(self, rows: List[List[Any]]) -> bytes:
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        if not self._header_written:
+            writer.writerow([name for name, _, _ in self.columns])
+            self._header_written = True
+        writer.writerows(
+            [value.isoformat() if isinstance(value, datetime) else value for value in row]
+            for row in rows
+        )
+        return buffer.getvalue().encode("utf-8")
+
+    def close(self) -> bytes:
+        return b"" if self._header_written else self.encode([])
+
+
+class NdjsonEncoder:
+    def __init__(self, columns):
+        self.names = [name for name, _, _ in columns]
+
+    def encode(self, rows: List[List[Any]]) -> bytes:
+        return "".join(
+            json.dumps(dict(zip(self.names, row)), default=lambda v: v.isoformat()) + "\n"
+            for row in rows
+        ).encode("utf-8")
+
+    def close(self) -> bytes:
+        return b""
+
+
+class _ChunkSink:
+    """Minimal writable file object that hands back whatever was written since the last drain"""
+
+    def __init__(self):
+        self._chunks = []
+        self.closed = False
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+class ParquetEncoder:
+    """Writes one Parquet row group per batch into a streaming sink"""
+
+    def __init__(self, columns):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ValueError("Parquet export requires the 'pyarrow' package")
+
+        types = {"string": pa.string(), "int64": pa.int64(), "double": pa.float64(), "timestamp": pa.timestamp("ms")}
+        self._pa = pa
+        self.names = [name for name, _, _ in columns]
+        self.schema = pa.schema([(name, types[kind]) for name, _, kind in columns])
+        self._sink = _ChunkSink()
+        self._writer = pq.ParquetWriter(self._sink, self.schema, compression="snappy")
+
+    def encode(self, rows: List[List[Any]]) -> bytes:
+        columns = list(zip(*rows)) if rows else [[] for _ in self.names]
+        table = self._pa.Table.from_arrays(
+            [self._pa.array(column, type=field.type) for column, field in zip(columns, self.schema)],
+            schema=self.schema
+        )
+        self._writer.write_table(table)
+        return self._sink.drain()
+
+    def close(self) -> bytes:
+        self._writer.close()
+        return self._sink.drain()
+
+
+ENCODERS = {
+    "csv": CsvEncoder,
+    "ndjson": NdjsonEncoder,
+    "parquet": ParquetEncoder,
+}
+
+
+def create_encoder(export_format: str, columns):
+    if export_format not in ENCODERS:
+        raise ValueError(f"Unsupported export format '{export_format}'")
+    return ENCODERS[export_format](columns)
+
+
+async def stream_export(
+    collection: AsyncIOMotorCollection,
+    columns: List[Tuple[str, Any, str]],
+    encoder,
+    since: Optional[datetime] = None,
+    batch_size: int = 5000
+) -> AsyncIterator[bytes]:
+    """Stream projected, flattened rows from a cursor, encoding each batch in a worker thread.
+
+    Only one batch of documents is held in memory at a time.
+    """
+    query = {"created_at": {"$gte": since}} if since else {}
+    projection = {candidate: 1 for _, path, _ in columns for candidate in _paths(path)}
+    projection["_id"] = 0
+    cursor = collection.find(query, projection, batch_size=batch_size).sort("created_at", 1)
+
+    rows = []
+    async for doc in cursor:
+        rows.append([_lookup(doc, path) for _, path, _ in columns])
+        if len(rows) >= batch_size:
+            yield await run_in_threadpool(encoder.encode, rows)
+            rows = []
+    if rows:
+        yield await run_in_threadpool(encoder.encode, rows)
+    tail = await run_in_threadpool(encoder.close)
+    if tail:
+        yield tail
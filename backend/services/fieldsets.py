@@ -0,0 +1,106 @@
+from typing import Optional, Dict, Any, Tuple, Type, Iterable
+from collections import OrderedDict
+from fastapi.encoders import jsonable_encoder
+from pydantic import BaseModel
+import json
+import os
+import threading
+
+FieldSet = Optional[Tuple[str, ...]]
+
+
+def parse_fields(fields: Optional[str], model: Type[BaseModel]) -> FieldSet:
+    """Parse a ?fields=a,b,c parameter into a canonical field set (None means all fields)
+
+    `id` is always included so clients can address what they receive.
+    """
+    if fields is None:
+        return None
+    requested = {name.strip() for name in fields.split(",") if name.strip()}
+    unknown = requested - set(model.model_fields)
+    if unknown:
+        raise ValueError(f"Unknown fields for {model.__name__}: {', '.join(sorted(unknown))}")
+    return tuple(sorted(requested | {"id"}))
+
+
+def projection_for(fields: FieldSet) -> Dict[str, int]:
+    """Mongo projection for a field set"""
+    projection = {"_id": 0}
+    if fields is not None:
+        projection.update({name: 1 for name in fields})
+    return projection
+
+
+def select_fields(document: Dict[str, Any], fields: FieldSet) -> Dict[str, Any]:
+    if fields is None:
+        return document
+    return {name: document[name] for name in fields if name in document}
+
+
+def serialize(documents: Iterable[Dict[str, Any]]) -> bytes:
+    """Render documents as compact JSON, the way the response would be encoded"""
+    return json.dumps(jsonable_encoder(list(documents)), separators=(",", ":")).encode()
+
+
+class CatalogResponseCache:
+    """LRU of pre-serialized catalog list responses keyed by (kind, catalog version, field set)
+
+    `variant` distinguishes renderings of the same catalog version, such as
+    stones under different live availability. Only the most recently requested
+    field sets stay resident; entries for older catalog versions are never
+    served again and age out of the LRU.
+    """
+
+    def __init__(self, max_entries: int = 64):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[tuple, bytes]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, kind: str, version: int, fields: FieldSet, variant: Optional[str] = None) -> Optional[bytes]:
+        key = (kind, version, fields, variant)
+        with self._lock:
+            body = self._entries.get(key)
+            if body is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return body
+
+    def put(self, kind: str, version: int, fields: FieldSet, body: bytes, variant: Optional[str] = None) -> None:
+        if self.max_entries <= 0:
+            return
+        key = (kind, version, fields, variant)
+        with self._lock:
+            self._entries[key] = body
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": sum(len(body) for body in self._entries.values()),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+                "variants": [
+                    {"kind": kind, "catalog_version": version, "fields": list(fields) if fields else None, "variant": variant}
+                    for kind, version, fields, variant in self._entries
+                ],
+            }
+
+
+# Process-wide cache shared by the catalog list endpoints
+catalog_response_cache = CatalogResponseCache(
+    max_entries=int(os.environ.get("CATALOG_RESPONSE_CACHE_ENTRIES", "64")),
+)
@@ -0,0 +1,124 @@
+"""Liveness and readiness for the load balancer.
+
+A background task per worker checks the worker's dependencies every
+HEALTH_CHECK_INTERVAL_SECONDS and caches the result, so probes only read memory
+however often they arrive and never add queries of their own:
+
+- mongo: a ping round trip within HEALTH_PING_TIMEOUT_SECONDS
+- pool: connection pool waiters at or below the admission controller's limit
+- catalog: the pricing snapshot has been loaded (warm-up finished)
+- outbox: buffered analytics counters are being flushed, not piling up
+
+A report older than HEALTH_STALE_SECONDS counts as not ready, so a wedged
+checker takes the worker out of rotation instead of freezing its last result.
+"""
+from typing import Dict, Optional, Any
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from services.pool_monitor import pool_monitor
+from services.rate_limiter import admission_controller
+from services.catalog_state import catalog_state
+from services.shared_catalog import shared_catalog
+from services.analytics import analytics_recorder
+from datetime import datetime
+import asyncio
+import logging
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class HealthChecker:
+    def __init__(self, interval: float = 5.0, ping_timeout: float = 2.0, stale_after: float = 15.0):
+        self.interval = interval
+        self.ping_timeout = ping_timeout
+        self.stale_after = stale_after
+        self.report: Optional[Dict[str, Any]] = None
+        self.checks_run = 0
+        self._checked_at = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+    async def _check_mongo(self, db: AsyncIOMotorDatabase) -> Dict[str, Any]:
+        started = time.perf_counter()
+        try:
+            await asyncio.wait_for(db.command("ping"), timeout=self.ping_timeout)
+        except Exception as e:
+            return {"ok": False, "error": type(e).__name__}
+        return {"ok": True, "latency_ms": round((time.perf_counter() - started) * 1000, 2)}
+
+    @staticmethod
+    def _check_pool() -> Dict[str, Any]:
+        pool = pool_monitor.snapshot()
+        return {"ok": pool["waiting"] <= admission_controller.max_pool_waiting, **pool}
+
+    @staticmethod
+    def _check_catalog() -> Dict[str, Any]:
+        snapshot = catalog_state.snapshot or shared_catalog.snapshot()
+        if snapshot is None:
+            return {"ok": False, "catalog_version": None}
+        return {"ok": True, "catalog_version": snapshot.published}
+
+    @staticmethod
+    def _check_outbox() -> Dict[str, Any]:
+        pending = analytics_recorder.pending_keys
+        # The recorder flushes early once max_pending_keys is reached; staying above it means flushes are failing
+        return {
+            "ok": pending <= analytics_recorder.max_pending_keys,
+            "pending_keys": pending,
+            "flush_errors": analytics_recorder.flush_errors,
+        }
+
+    async def check(self, db: AsyncIOMotorDatabase) -> Dict[str, Any]:
+        checks = {
+            "mongo": await self._check_mongo(db),
+            "pool": self._check_pool(),
+            "catalog": self._check_catalog(),
+            "outbox": self._check_outbox(),
+        }
+        self.report = {
+            "ready": all(check["ok"] for check in checks.values()),
+            "checked_at": datetime.utcnow().isoformat(),
+            "checks": checks,
+        }
+        self._checked_at = time.monotonic()
+        self.checks_run += 1
+        return self.report
+
+    async def _run(self, db: AsyncIOMotorDatabase) -> None:
+        while True:
+            try:
+                await self.check(db)
+            except Exception as e:
+                logger.error("Health check failed: %s", e)
+            await asyncio.sleep(self.interval)
+
+    def readiness(self) -> Dict[str, Any]:
+        """The cached report, marked not ready if missing or stale"""
+        report = self.report
+        if report is None:
+            return {"ready": False, "reason": "not checked yet"}
+        age = time.monotonic() - self._checked_at
+        if age > self.stale_after:
+            return {**report, "ready": False, "reason": f"report is {age:.1f}s old"}
+        return report
+
+    async def start(self, db: AsyncIOMotorDatabase) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(db))
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+_interval = float(os.environ.get("HEALTH_CHECK_INTERVAL_SECONDS", "5"))
+health_checker = HealthChecker(
+    interval=_interval,
+    ping_timeout=float(os.environ.get("HEALTH_PING_TIMEOUT_SECONDS", "2")),
+    stale_after=float(os.environ.get("HEALTH_STALE_SECONDS", str(_interval * 3))),
+)
@@ -0,0 +1,66 @@
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from services.retention import ARCHIVE_GRACE_SECONDS
+from services.config_invalidation import RECORD_TTL_SECONDS
+import logging
+
+logger = logging.getLogger(__name__)
+
+# collection -> list of (keys, options)
+INDEXES = {
+    "stones": [
+        ([("catalog_version", 1)], {}),
+    ],
+    "settings": [
+        ([("catalog_version", 1)], {}),
+    ],
+    "metals": [
+        ([("catalog_version", 1)], {}),
+    ],
+    "catalog_revisions": [
+        ([("kind", 1), ("item_id", 1), ("catalog_version", -1)], {"unique": True}),
+        ([("catalog_version", 1)], {}),
+    ],
+    "configurations": [
+        ([("id", 1)], {}),
+        ([("created_at", 1)], {}),
+        # TTL backstop; configurations without expires_at (pinned) never expire
+        ([("expires_at", 1)], {"expireAfterSeconds": ARCHIVE_GRACE_SECONDS}),
+    ],
+    "configuration_invalidations": [
+        ([("at", 1)], {"expireAfterSeconds": RECORD_TTL_SECONDS}),
+    ],
+    "inventory": [
+        ([("stone_id", 1), ("carat", 1)], {"unique": True}),
+        ([("updated_at", 1)], {}),
+    ],
+    "inventory_holds": [
+        ([("hold_id", 1)], {"unique": True}),
+        ([("status", 1), ("expires_at", 1)], {}),
+        ([("quote_request_id", 1)], {}),
+    ],
+    "analytics_rollups": [
+        ([("kind", 1), ("saved", -1)], {}),
+        ([("kind", 1), ("quoted", -1)], {}),
+        ([("kind", 1), ("component", 1), ("saved", -1)], {}),
+        ([("kind", 1), ("component", 1), ("quoted", -1)], {}),
+    ],
+    "quiz_sessions": [
+        ([("id", 1)], {"unique": True}),
+        ([("expires_at", 1)], {"expireAfterSeconds": 0}),
+    ],
+    "quote_requests": [
+        ([("created_at", 1)], {}),
+        ([("configuration.id", 1)], {}),
+        ([("configuration_ref.configuration_id", 1)], {}),
+    ],
+}
+
+
+async def ensure_indexes(db: AsyncIOMotorDatabase) -> None:
+    """Create the indexes the service relies on (idempotent)"""
+    for collection, indexes in INDEXES.items():
+        for keys, options in indexes:
+            try:
+                await db[collection].create_index(keys, **options)
+            except Exception as e:
+                logger.error("Error creating index %s on %s: %s", keys, collection, e)
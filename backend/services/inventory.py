@@ -0,0 +1,298 @@
+"""Per stone-size stock counts, time-limited holds and an in-memory availability view.
+
+inventory documents hold {stone_id, carat, on_hand, held, available} with
+available == on_hand - held. Holds are taken with a single conditional
+find_one_and_update ($inc guarded by available >= quantity), so concurrent
+submissions for the last unit cannot both succeed. Stone sizes without an
+inventory document are untracked and keep their catalog availability string.
+"""
+from typing import Dict, List, Optional, Any, Tuple
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import OperationFailure
+from models.inventory import InventoryHold, StockLevel, StockUpdateResponse
+from services.storage_ids import encode_id, encode_doc, decode_doc, decode_id, match_id
+from datetime import datetime, timedelta
+import asyncio
+import logging
+import os
+import time
+import zlib
+
+logger = logging.getLogger(__name__)
+
+HOLD_SECONDS = float(os.environ.get("INVENTORY_HOLD_HOURS", "48")) * 3600
+
+
+class OutOfStockError(ValueError):
+    """The requested stone size has no unheld stock left"""
+
+
+class InventoryService:
+    def __init__(self, db: AsyncIOMotorDatabase):
+        self.db = db
+
+    async def reserve(self, stone_id: str, carat: float, quantity: int = 1,
+                      quote_request_id: Optional[str] = None, configuration_id: Optional[str] = None) -> Optional[InventoryHold]:
+        """Hold stock for a quote; None if the size is untracked, OutOfStockError if none is left"""
+        now = datetime.utcnow()
+        level = await self.db.inventory.find_one_and_update(
+            {"stone_id": match_id(stone_id), "carat": carat, "available": {"$gte": quantity}},
+            {"$inc": {"available": -quantity, "held": quantity}, "$set": {"updated_at": now}},
+            return_document=ReturnDocument.AFTER
+        )
+        if level is None:
+            if await self.db.inventory.count_documents({"stone_id": match_id(stone_id), "carat": carat}, limit=1):
+                raise OutOfStockError(f"Stone size {carat} carat is out of stock")
+            return None
+
+        hold = InventoryHold(
+            stone_id=stone_id,
+            carat=carat,
+            quantity=quantity,
+            quote_request_id=quote_request_id,
+            configuration_id=configuration_id,
+            expires_at=now + timedelta(seconds=HOLD_SECONDS)
+        )
+        try:
+            await self.db.inventory_holds.insert_one(encode_doc(hold.dict()))
+        except Exception:
+            await self._return_stock(stone_id, carat, quantity)
+            raise
+        return hold
+
+    async def _claim(self, hold_id: str, status: str) -> Optional[Dict[str, Any]]:
+        """Move an active hold to a final status; only one caller can win the claim"""
+        hold = await self.db.inventory_holds.find_one_and_update(
+            {"hold_id": match_id(hold_id), "status": "active"},
+            {"$set": {"status": status, "closed_at": datetime.utcnow()}}
+        )
+        return decode_doc(hold) if hold else None
+
+    async def _return_stock(self, stone_id: str, carat: float, quantity: int) -> None:
+        await self.db.inventory.update_one(
+            {"stone_id": match_id(stone_id), "carat": carat},
+            {"$inc": {"available": quantity, "held": -quantity}, "$set": {"updated_at": datetime.utcnow()}}
+        )
+
+    async def release(self, hold_id: str, status: str = "released") -> bool:
+        """Return a hold's stock to the available pool"""
+        hold = await self._claim(hold_id, status)
+        if hold is None:
+            return False
+        await self._return_stock(hold["stone_id"], hold["carat"], hold["quantity"])
+        return True
+
+    async def commit(self, hold_id: str) -> bool:
+        """Convert a hold into a sale, removing the units from stock"""
+        hold = await self._claim(hold_id, "committed")
+        if hold is None:
+            return False
+        await self.db.inventory.update_one(
+            {"stone_id": match_id(hold["stone_id"]), "carat": hold["carat"]},
+            {"$inc": {"on_hand": -hold["quantity"], "held": -hold["quantity"]}, "$set": {"updated_at": datetime.utcnow()}}
+        )
+        return True
+
+    async def release_expired(self, batch_size: int = 500) -> int:
+        """Release holds past their expiry; safe to run from every worker"""
+        cursor = self.db.inventory_holds.find(
+            {"status": "active", "expires_at": {"$lte": datetime.utcnow()}},
+            {"hold_id": 1}
+        ).limit(batch_size)
+        released = 0
+        async for hold in cursor:
+            if await self.release(decode_id(hold["hold_id"]), status="expired"):
+                released += 1
+        return released
+
+    async def set_stock(self, levels: List[StockLevel]) -> StockUpdateResponse:
+        """Set on-hand counts; available is recomputed against outstanding holds"""
+        now = datetime.utcnow()
+        operations = [
+            UpdateOne(
+                {"stone_id": encode_id(level.stone_id), "carat": level.carat},
+                [{"$set": {
+                    "on_hand": level.on_hand,
+                    "held": {"$ifNull": ["$held", 0]},
+                    "available": {"$subtract": [level.on_hand, {"$ifNull": ["$held", 0]}]},
+                    "updated_at": now,
+                }}],
+                upsert=True
+            )
+            for level in levels
+        ]
+        if not operations:
+            return StockUpdateResponse()
+        result = await self.db.inventory.bulk_write(operations, ordered=False)
+        return StockUpdateResponse(created=result.upserted_count, updated=result.matched_count)
+
+
+class InventoryTracker:
+    """Per-worker view of which tracked stone sizes are in stock.
+
+    Fed by a change stream on inventory, or by polling updated_at when change
+    streams are unavailable (standalone mongod). Any other failure restarts the
+    feed, with a full reload, after an exponential backoff. Also runs the hold
+    expiry sweeper.
+    """
+
+    def __init__(self, poll_seconds: float = 5.0, sweep_seconds: float = 60.0,
+                 retry_seconds: float = 1.0, max_retry_seconds: float = 60.0):
+        self.poll_seconds = poll_seconds
+        self.sweep_seconds = sweep_seconds
+        self.retry_seconds = retry_seconds
+        self.max_retry_seconds = max_retry_seconds
+        self.restarts = 0
+        self._available: Dict[Tuple[str, float], int] = {}
+        self._out_of_stock = set()
+        self._signature: Optional[str] = None
+        self._tasks: List[asyncio.Task] = []
+        self.mode: Optional[str] = None
+        self.expired_released = 0
+
+    @property
+    def tracking(self) -> bool:
+        """Whether any stone size has an inventory level"""
+        return bool(self._available)
+
+    def availability(self, stone_id: str, carat: float, default: str) -> str:
+        available = self._available.get((stone_id, carat))
+        if available is None:
+            return default
+        return "in_stock" if available > 0 else "out_of_stock"
+
+    def apply_to_stone(self, stone: Dict[str, Any]) -> Dict[str, Any]:
+        """Overlay live availability onto a stone's sizes (stone as a dict, modified in place)"""
+        for size in stone.get("sizes") or []:
+            size["availability"] = self.availability(stone["id"], size["carat"], size.get("availability"))
+        return stone
+
+    @property
+    def signature(self) -> str:
+        """Stable digest of the out-of-stock set, identical across workers in the same state"""
+        if self._signature is None:
+            keys = ",".join(sorted(f"{stone_id}@{carat}" for stone_id, carat in self._out_of_stock))
+            self._signature = format(zlib.crc32(keys.encode()), "08x")
+        return self._signature
+
+    def _update(self, doc: Dict[str, Any]) -> None:
+        key = (decode_id(doc["stone_id"]), doc["carat"])
+        available = doc.get("available", 0)
+        self._available[key] = available
+        out = available <= 0
+        if out != (key in self._out_of_stock):
+            if out:
+                self._out_of_stock.add(key)
+            else:
+                self._out_of_stock.discard(key)
+            self._signature = None
+
+    async def _load(self, db: AsyncIOMotorDatabase) -> None:
+        """Reload every level; readers keep the previous view until the new one is complete"""
+        available = {}
+        out_of_stock = set()
+        async for doc in db.inventory.find({}, {"_id": 0, "stone_id": 1, "carat": 1, "available": 1}):
+            key = (decode_id(doc["stone_id"]), doc["carat"])
+            available[key] = doc.get("available", 0)
+            if available[key] <= 0:
+                out_of_stock.add(key)
+        self._available = available
+        if out_of_stock != self._out_of_stock:
+            self._out_of_stock = out_of_stock
+            self._signature = None
+
+    async def _supervise(self, db: AsyncIOMotorDatabase) -> None:
+        """Run the feed forever; a failed or ended feed is restarted after a backoff"""
+        delay = self.retry_seconds
+        while True:
+            started = time.monotonic()
+            try:
+                await self._watch(db)
+                logger.warning("Inventory change stream ended, restarting in %.1fs", delay)
+            except Exception as e:
+                logger.error("Inventory feed failed, restarting in %.1fs: %s", delay, e)
+            self.mode = "reconnecting"
+            self.restarts += 1
+            # A feed that ran for a while was healthy; start the backoff over
+            if time.monotonic() - started > self.max_retry_seconds:
+                delay = self.retry_seconds
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, self.max_retry_seconds)
+
+    async def _watch(self, db: AsyncIOMotorDatabase) -> None:
+        await self._load(db)
+        try:
+            async with db.inventory.watch(full_document="updateLookup") as stream:
+                self.mode = "change_stream"
+                # Catch up on anything written between the initial load and the stream opening
+                await self._load(db)
+                async for change in stream:
+                    document = change.get("fullDocument")
+                    if document is not None:
+                        self._update(document)
+                    elif change.get("operationType") in ("delete", "drop", "invalidate"):
+                        await self._load(db)
+        except OperationFailure as e:
+            logger.info("Inventory change stream unavailable (%s), polling every %ss", e.code, self.poll_seconds)
+            await self._poll(db)
+
+    async def _poll(self, db: AsyncIOMotorDatabase) -> None:
+        self.mode = "polling"
+        since = datetime.utcnow()
+        while True:
+            await asyncio.sleep(self.poll_seconds)
+            try:
+                # Overlap the window so writes committed out of timestamp order are not missed
+                started = datetime.utcnow()
+                cursor = db.inventory.find(
+                    {"updated_at": {"$gte": since - timedelta(seconds=self.poll_seconds)}},
+                    {"_id": 0, "stone_id": 1, "carat": 1, "available": 1}
+                )
+                async for doc in cursor:
+                    self._update(doc)
+                since = started
+            except Exception as e:
+                logger.error("Inventory poll failed: %s", e)
+
+    async def _sweep(self, db: AsyncIOMotorDatabase) -> None:
+        service = InventoryService(db)
+        while True:
+            await asyncio.sleep(self.sweep_seconds)
+            try:
+                self.expired_released += await service.release_expired()
+            except Exception as e:
+                logger.error("Inventory hold sweep failed: %s", e)
+
+    async def start(self, db: AsyncIOMotorDatabase) -> None:
+        if self._tasks:
+            return
+        # The initial load runs inside the watch task so startup does not wait on it
+        self._tasks = [asyncio.create_task(self._supervise(db)), asyncio.create_task(self._sweep(db))]
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        for task in self._tasks:
+            try:
+                await task
+            except (asyncio.CancelledError, Exception):
+                pass
+        self._tasks = []
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "mode": self.mode,
+            "restarts": self.restarts,
+            "tracked_sizes": len(self._available),
+            "out_of_stock": len(self._out_of_stock),
+            "signature": self.signature,
+            "expired_holds_released": self.expired_released,
+        }
+
+
+inventory_tracker = InventoryTracker(
+    poll_seconds=float(os.environ.get("INVENTORY_POLL_SECONDS", "5")),
+    sweep_seconds=float(os.environ.get("INVENTORY_SWEEP_SECONDS", "60")),
+    max_retry_seconds=float(os.environ.get("INVENTORY_MAX_RETRY_SECONDS", "60")),
+)
@@ -0,0 +1,198 @@
+"""Live pricing sessions for the interactive builder.
+
+Clients stream selection deltas over a WebSocket, e.g. {"carat": 1.5}, and
+receive prices computed from the in-memory catalog snapshot. Bursts of deltas
+are coalesced with a per-session timer, and one watcher per worker pushes new
+prices to every session when the published catalog or pricing rules change.
+
+Per-connection state is a handful of slots (the selection, the last price sent
+and at most one timer handle), so idle sessions cost little beyond the socket.
+"""
+from typing import Dict, Optional, Any
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from starlette.websockets import WebSocket, WebSocketDisconnect
+from services.catalog_state import catalog_state, price_selection
+from services.catalog_version import current_catalog_version
+from services.pricing_rules import pricing_rules
+import asyncio
+import json
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+SELECTION_FIELDS = ("stone_id", "setting_id", "metal_id", "carat")
+MAX_MESSAGE_BYTES = 1024
+
+
+class LiveSession:
+    __slots__ = ("websocket", "stone_id", "setting_id", "metal_id", "carat", "last_total", "timer")
+
+    def __init__(self, websocket: WebSocket):
+        self.websocket = websocket
+        self.stone_id: Optional[str] = None
+        self.setting_id: Optional[str] = None
+        self.metal_id: Optional[str] = None
+        self.carat: Optional[float] = None
+        self.last_total: Optional[float] = None
+        self.timer: Optional[asyncio.TimerHandle] = None
+
+    def apply(self, delta: Dict[str, Any]) -> None:
+        """Merge a selection delta, validating types so bad input can't grow session state"""
+        validated = {}
+        for name, value in delta.items():
+            if name not in SELECTION_FIELDS:
+                raise ValueError(f"Unknown selection field '{name}'")
+            if value is not None:
+                if name == "carat":
+                    if isinstance(value, bool) or not isinstance(value, (int, float)):
+                        raise ValueError("carat must be a number")
+                    value = float(value)
+                elif not isinstance(value, str) or len(value) > 64:
+                    raise ValueError(f"{name} must be an id string")
+            validated[name] = value
+        for name, value in validated.items():
+            setattr(self, name, value)
+
+    @property
+    def complete(self) -> bool:
+        return None not in (self.stone_id, self.setting_id, self.metal_id, self.carat)
+
+    def selection(self) -> Dict[str, Any]:
+        return {name: getattr(self, name) for name in SELECTION_FIELDS}
+
+
+class LivePricingHub:
+    """Tracks live sessions in a worker and prices them from the shared catalog snapshot"""
+
+    def __init__(self, debounce_seconds: float = 0.075, max_sessions: int = 5000, watch_interval: float = 2.0):
+        self.debounce_seconds = debounce_seconds
+        self.max_sessions = max_sessions
+        self.watch_interval = watch_interval
+        self.sessions = set()
+        self.db: Optional[AsyncIOMotorDatabase] = None
+        self.messages_received = 0
+        self.prices_pushed = 0
+        self.rejected = 0
+        self._tasks = set()
+        self._watcher: Optional[asyncio.Task] = None
+
+    async def serve(self, websocket: WebSocket, db: AsyncIOMotorDatabase) -> None:
+        """Run one client session until it disconnects"""
+        self.db = db
+        if len(self.sessions) >= self.max_sessions:
+            self.rejected += 1
+            await websocket.close(code=1013, reason="Too many live sessions")
+            return
+
+        await websocket.accept()
+        session = LiveSession(websocket)
+        self.sessions.add(session)
+        try:
+            while True:
+                message = await websocket.receive_text()
+                self.messages_received += 1
+                try:
+                    if len(message) > MAX_MESSAGE_BYTES:
+                        raise ValueError("Message too large")
+                    delta = json.loads(message)
+                    if not isinstance(delta, dict):
+                        raise ValueError("Expected a JSON object of selection fields")
+                    session.apply(delta)
+                except ValueError as e:
+                    await websocket.send_json({"type": "error", "detail": str(e)})
+                    continue
+                self._schedule(session)
+        except WebSocketDisconnect:
+            pass
+        finally:
+            if session.timer is not None:
+                session.timer.cancel()
+            self.sessions.discard(session)
+
+    def _schedule(self, session: LiveSession) -> None:
+        """Price the session once its deltas stop arriving for the debounce window"""
+        if session.timer is not None:
+            session.timer.cancel()
+        session.timer = asyncio.get_running_loop().call_later(self.debounce_seconds, self._fire, session)
+
+    def _fire(self, session: LiveSession) -> None:
+        session.timer = None
+        if session in self.sessions:
+            task = asyncio.ensure_future(self._push(session, force=True))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _push(self, session: LiveSession, force: bool = False, reason: str = "selection") -> None:
+        if not session.complete:
+            return
+        try:
+            snapshot = await catalog_state.get(self.db)
+            rules = await pricing_rules.get(self.db)
+            try:
+                price = price_selection(snapshot, session.stone_id, session.setting_id, session.metal_id, session.carat, rules)
+            except ValueError as e:
+                session.last_total = None
+                await session.websocket.send_json({"type": "error", "detail": str(e), "selection": session.selection()})
+                return
+            if not force and price["total_price"] == session.last_total:
+                return
+            session.last_total = price["total_price"]
+            await session.websocket.send_json({"type": "price", "reason": reason, "selection": session.selection(), **price})
+            self.prices_pushed += 1
+        except Exception as e:
+            # The session's receive loop notices closed sockets; nothing to clean up here
+            logger.debug("Live price push failed: %s", e)
+
+    async def broadcast(self) -> None:
+        """Re-price every session after a catalog change, pushing only prices that moved"""
+        for session in list(self.sessions):
+            await self._push(session, reason="catalog_updated")
+
+    async def start(self, db: AsyncIOMotorDatabase) -> None:
+        self.db = db
+        if self._watcher is None:
+            self._watcher = asyncio.create_task(self._watch())
+
+    async def stop(self) -> None:
+        if self._watcher is not None:
+            self._watcher.cancel()
+            try:
+                await self._watcher
+            except asyncio.CancelledError:
+                pass
+            self._watcher = None
+
+    async def _watch(self) -> None:
+        """Single per-worker watcher of the published catalog and pricing rules versions"""
+        while True:
+            await asyncio.sleep(self.watch_interval)
+            try:
+                snapshot = catalog_state.snapshot
+                if snapshot is None or not self.sessions:
+                    continue
+                rules_version = pricing_rules.compiled.version
+                catalog_moved = await current_catalog_version(self.db) > snapshot.published
+                rules_moved = (await pricing_rules.get(self.db)).version != rules_version
+                if catalog_moved or rules_moved:
+                    await catalog_state.get(self.db)
+                    await self.broadcast()
+            except Exception as e:
+                logger.error("Live pricing catalog watch failed: %s", e)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "sessions": len(self.sessions),
+            "max_sessions": self.max_sessions,
+            "messages_received": self.messages_received,
+            "prices_pushed": self.prices_pushed,
+            "rejected": self.rejected,
+            "catalog": catalog_state.stats(),
+        }
+
+
+live_pricing_hub = LivePricingHub(
+    debounce_seconds=float(os.environ.get("LIVE_PRICING_DEBOUNCE_MS", "75")) / 1000,
+    max_sessions=int(os.environ.get("LIVE_PRICING_MAX_SESSIONS", "5000")),
+    watch_interval=float(os.environ.get("LIVE_PRICING_WATCH_SECONDS", "2.0")),
+)
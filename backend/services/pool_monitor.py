@@ -0,0 +1,68 @@
+from typing import Dict, Any
+from pymongo import monitoring
+import threading
+
+
+class PoolMonitor(monitoring.ConnectionPoolListener):
+    """Tracks MongoDB connection pool usage from pymongo's CMAP events.
+
+    Motor runs pymongo on worker threads, so counters are guarded by a lock.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.waiting = 0
+        self.checked_out = 0
+        self.open_connections = 0
+        self.checkout_failures = 0
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "waiting": self.waiting,
+                "checked_out": self.checked_out,
+                "open_connections": self.open_connections,
+                "checkout_failures": self.checkout_failures,
+            }
+
+    def _adjust(self, **deltas):
+        with self._lock:
+            for name, delta in deltas.items():
+                setattr(self, name, max(0, getattr(self, name) + delta))
+
+    def connection_check_out_started(self, event):
+        self._adjust(waiting=1)
+
+    def connection_checked_out(self, event):
+        self._adjust(waiting=-1, checked_out=1)
+
+    def connection_check_out_failed(self, event):
+        self._adjust(waiting=-1, checkout_failures=1)
+
+    def connection_checked_in(self, event):
+        self._adjust(checked_out=-1)
+
+    def connection_created(self, event):
+        self._adjust(open_connections=1)
+
+    def connection_closed(self, event):
+        self._adjust(open_connections=-1)
+
+    def connection_ready(self, event):
+        pass
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+
+# Registered on the Motor client in database.get_client()
+pool_monitor = PoolMonitor()
@@ -0,0 +1,200 @@
+"""Data-defined pricing rules compiled into a fast in-memory evaluator.
+
+The active rule set is a single versioned document in pricing_rules, replaced
+as a whole through the admin API. Each worker compiles a rule set once per
+version. Every rule is filed under its most selective condition (stone, setting,
+metal, cut, or global), so pricing a selection only examines rules that can
+match it, already in priority order, with conditions pre-built as frozensets
+and date windows as epoch seconds.
+"""
+from typing import Dict, List, Optional, Any
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import ReturnDocument
+from models.pricing import PricingRule, PricingRuleSet
+from datetime import datetime, timezone
+import asyncio
+import logging
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+RULES_ID = "rules"
+RULES_TTL_SECONDS = float(os.environ.get("PRICING_RULES_TTL_SECONDS", "5.0"))
+TARGETS = ("total", "stone", "setting", "metal_adjustment")
+
+
+def _epoch(value: Optional[datetime], default: float) -> float:
+    if value is None:
+        return default
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+
+class CompiledRule:
+    __slots__ = ("rank", "id", "name", "percentage", "value", "target", "stone_ids", "cuts",
+                 "setting_ids", "metal_ids", "min_carat", "max_carat", "starts", "ends", "exclusive")
+
+    def __init__(self, rule: PricingRule, rank: int):
+        self.rank = rank
+        self.id = rule.id
+        self.name = rule.name
+        self.percentage = rule.kind == "percentage"
+        self.value = rule.value / 100.0 if self.percentage else rule.value
+        self.target = rule.target
+        self.stone_ids = frozenset(rule.stone_ids) if rule.stone_ids else None
+        self.cuts = frozenset(rule.cuts) if rule.cuts else None
+        self.setting_ids = frozenset(rule.setting_ids) if rule.setting_ids else None
+        self.metal_ids = frozenset(rule.metal_ids) if rule.metal_ids else None
+        self.min_carat = rule.min_carat
+        self.max_carat = rule.max_carat
+        self.starts = _epoch(rule.starts_at, float("-inf"))
+        self.ends = _epoch(rule.ends_at, float("inf"))
+        self.exclusive = rule.exclusive
+
+    def matches(self, stone_id: str, cut: Optional[str], setting_id: str, metal_id: str, carat: float, now: float) -> bool:
+        return (
+            self.starts <= now < self.ends
+            and (self.stone_ids is None or stone_id in self.stone_ids)
+            and (self.cuts is None or cut in self.cuts)
+            and (self.setting_ids is None or setting_id in self.setting_ids)
+            and (self.metal_ids is None or metal_id in self.metal_ids)
+            and (self.min_carat is None or carat >= self.min_carat)
+            and (self.max_carat is None or carat <= self.max_carat)
+        )
+
+
+class CompiledRules:
+    """Evaluator for one rules version"""
+
+    def __init__(self, version: int, rules: List[PricingRule]):
+        self.version = version
+        self.global_rules: List[CompiledRule] = []
+        self.by_stone: Dict[str, List[CompiledRule]] = {}
+        self.by_setting: Dict[str, List[CompiledRule]] = {}
+        self.by_metal: Dict[str, List[CompiledRule]] = {}
+        self.by_cut: Dict[str, List[CompiledRule]] = {}
+
+        active = [rule for rule in rules if rule.is_active]
+        # Rank once so evaluation only merges pre-sorted candidates
+        active.sort(key=lambda rule: -rule.priority)
+        for rank, rule in enumerate(active):
+            compiled = CompiledRule(rule, rank)
+            if rule.stone_ids:
+                index, keys = self.by_stone, rule.stone_ids
+            elif rule.setting_ids:
+                index, keys = self.by_setting, rule.setting_ids
+            elif rule.metal_ids:
+                index, keys = self.by_metal, rule.metal_ids
+            elif rule.cuts:
+                index, keys = self.by_cut, rule.cuts
+            else:
+                self.global_rules.append(compiled)
+                continue
+            for key in keys:
+                index.setdefault(key, []).append(compiled)
+        self.size = len(active)
+
+    def candidates(self, stone_id: str, cut: Optional[str], setting_id: str, metal_id: str) -> List[CompiledRule]:
+        buckets = [
+            bucket for bucket in (
+                self.global_rules,
+                self.by_stone.get(stone_id),
+                self.by_setting.get(setting_id),
+                self.by_metal.get(metal_id),
+                self.by_cut.get(cut) if cut is not None else None,
+            ) if bucket
+        ]
+        if len(buckets) == 1:
+            return buckets[0]
+        merged = [rule for bucket in buckets for rule in bucket]
+        merged.sort(key=lambda rule: rule.rank)
+        return merged
+
+    def evaluate(self, stone_id: str, cut: Optional[str], setting_id: str, metal_id: str, carat: float,
+                 amounts: Dict[str, float], rate: float = 1.0, decimals: int = 2,
+                 now: Optional[float] = None) -> List[Dict[str, Any]]:
+        """Discount lines for a priced selection; `amounts` holds the undiscounted stone, setting, metal_adjustment and total"""
+        if not self.size:
+            return []
+        now = time.time() if now is None else now
+        remaining = amounts["total"]
+        lines = []
+        for rule in self.candidates(stone_id, cut, setting_id, metal_id):
+            if not rule.matches(stone_id, cut, setting_id, metal_id, carat, now):
+                continue
+            base = amounts[rule.target]
+            discount = base * rule.value if rule.percentage else min(rule.value * rate, base)
+            # Never discount below zero, however many rules stack
+            discount = round(min(discount, remaining), decimals)
+            if discount > 0:
+                remaining -= discount
+                lines.append({"rule_id": rule.id, "name": rule.name, "amount": discount})
+            if rule.exclusive:
+                break
+        return lines
+
+
+async def get_rule_set(db: AsyncIOMotorDatabase) -> PricingRuleSet:
+    doc = await db.pricing_rules.find_one({"_id": RULES_ID}, {"_id": 0})
+    return PricingRuleSet(**doc) if doc else PricingRuleSet()
+
+
+async def set_rule_set(db: AsyncIOMotorDatabase, rules: List[PricingRule]) -> PricingRuleSet:
+    """Replace the whole rule set atomically and bump its version"""
+    for rule in rules:
+        if rule.kind not in ("percentage", "amount"):
+            raise ValueError(f"Rule '{rule.name}': unknown kind '{rule.kind}'")
+        if rule.target not in TARGETS:
+            raise ValueError(f"Rule '{rule.name}': unknown target '{rule.target}'")
+        if rule.kind == "percentage" and rule.value > 100:
+            raise ValueError(f"Rule '{rule.name}': percentage above 100")
+    doc = await db.pricing_rules.find_one_and_update(
+        {"_id": RULES_ID},
+        {"$set": {"rules": [rule.dict() for rule in rules], "updated_at": datetime.utcnow()}, "$inc": {"version": 1}},
+        projection={"_id": 0},
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
+    pricing_rules.forget()
+    return PricingRuleSet(**doc)
+
+
+class PricingRulesEngine:
+    """Process-wide compiled rules, recompiled when the rules version changes"""
+
+    def __init__(self):
+        self.compiled = CompiledRules(0, [])
+        self.compilations = 0
+        self._checked_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def forget(self) -> None:
+        self._checked_until = 0.0
+
+    async def get(self, db: AsyncIOMotorDatabase) -> CompiledRules:
+        """Compiled rules; the rules version is re-read at most every PRICING_RULES_TTL_SECONDS"""
+        if self._checked_until > time.monotonic():
+            return self.compiled
+        async with self._lock:
+            if self._checked_until <= time.monotonic():
+                meta = await db.pricing_rules.find_one({"_id": RULES_ID}, {"version": 1})
+                version = meta.get("version", 0) if meta else 0
+                if version != self.compiled.version:
+                    rule_set = await get_rule_set(db)
+                    self.compiled = CompiledRules(rule_set.version, rule_set.rules)
+                    self.compilations += 1
+                    logger.info("Compiled pricing rules version %s: %s active rules", rule_set.version, self.compiled.size)
+                self._checked_until = time.monotonic() + RULES_TTL_SECONDS
+        return self.compiled
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "rules_version": self.compiled.version,
+            "active_rules": self.compiled.size,
+            "compilations": self.compilations,
+        }
+
+
+pricing_rules = PricingRulesEngine()
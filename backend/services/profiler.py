@@ -0,0 +1,193 @@
+"""Production profiling for a live worker.
+
+SamplingProfiler runs only while an admin asks for it: a daemon thread reads
+every thread's stack through sys._current_frames() at a fixed interval and
+counts identical stacks, producing collapsed-stack text that flamegraph.pl and
+speedscope load directly. Nothing is installed in the interpreter, so the
+sampled code runs unmodified, and no thread exists between profiles.
+
+RequestProfilingMiddleware profiles single requests with cProfile when they
+carry X-Profile: 1 alongside a valid X-Admin-Token. Other requests only pay for
+one header scan. Results are kept in a bounded in-memory list
+(PROFILER_MAX_REQUEST_PROFILES) and fetched by the ID returned in the
+X-Profile-Id response header. cProfile sees every coroutine the event loop runs
+while the request is in flight, so profiles are clearest on a quiet worker.
+"""
+from typing import Dict, List, Optional, Any, Tuple
+from collections import Counter, deque
+from datetime import datetime
+import asyncio
+import cProfile
+import hmac
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+import uuid
+
+MAX_SAMPLE_SECONDS = float(os.environ.get("PROFILER_MAX_SECONDS", "60"))
+MIN_INTERVAL_SECONDS = 0.001
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class ProfilerBusyError(RuntimeError):
+    """A sampling profile is already running on this worker"""
+
+
+def _frame_label(code) -> str:
+    filename = code.co_filename
+    if filename.startswith(BACKEND_DIR):
+        filename = os.path.relpath(filename, BACKEND_DIR)
+    elif "site-packages" in filename:
+        filename = filename.split("site-packages" + os.sep, 1)[-1]
+    return f"{code.co_name} ({filename}:{code.co_firstlineno})"
+
+
+class SamplingProfiler:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.profiles_taken = 0
+
+    def _sample(self, seconds: float, interval: float) -> Tuple[Counter, int]:
+        stacks: Counter = Counter()
+        labels: Dict[Any, str] = {}
+        sampler_id = threading.get_ident()
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        samples = 0
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == sampler_id:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    label = labels.get(code)
+                    if label is None:
+                        label = labels[code] = _frame_label(code)
+                    stack.append(label)
+                    frame = frame.f_back
+                stack.append(names.get(thread_id) or f"thread-{thread_id}")
+                stacks[";".join(reversed(stack))] += 1
+            samples += 1
+            time.sleep(interval)
+        return stacks, samples
+
+    async def profile(self, seconds: float, interval: float = 0.005) -> Dict[str, Any]:
+        """Sample all threads for `seconds`; raises ProfilerBusyError if another profile is running"""
+        seconds = min(max(seconds, 0.1), MAX_SAMPLE_SECONDS)
+        interval = max(interval, MIN_INTERVAL_SECONDS)
+        if not self._lock.acquire(blocking=False):
+            raise ProfilerBusyError("A profile is already running on this worker")
+        try:
+            # A dedicated thread, so a busy request thread pool cannot delay or skew sampling
+            loop = asyncio.get_running_loop()
+            done = loop.create_future()
+
+            def run():
+                try:
+                    result = self._sample(seconds, interval)
+                except BaseException as e:
+                    loop.call_soon_threadsafe(done.set_exception, e)
+                else:
+                    loop.call_soon_threadsafe(done.set_result, result)
+
+            threading.Thread(target=run, name="sampling-profiler", daemon=True).start()
+            stacks, samples = await done
+            self.profiles_taken += 1
+        finally:
+            self._lock.release()
+        return {
+            "pid": os.getpid(),
+            "seconds": seconds,
+            "interval": interval,
+            "samples": samples,
+            "collapsed": "\n".join(f"{stack} {count}" for stack, count in stacks.most_common()),
+        }
+
+
+class RequestProfileStore:
+    """Most recent per-request cProfile results"""
+
+    def __init__(self, max_profiles: int = 20, max_lines: int = 60):
+        self.max_lines = max_lines
+        self._profiles: deque = deque(maxlen=max_profiles)
+        self.active = False
+        self.skipped = 0
+
+    def add(self, profile_id: str, method: str, path: str, duration: float, profile: cProfile.Profile) -> None:
+        output = io.StringIO()
+        stats = pstats.Stats(profile, stream=output)
+        stats.sort_stats("cumulative").print_stats(self.max_lines)
+        self._profiles.append({
+            "id": profile_id,
+            "method": method,
+            "path": path,
+            "created_at": datetime.utcnow().isoformat(),
+            "duration_ms": round(duration * 1000, 2),
+            "stats": output.getvalue(),
+        })
+
+    def get(self, profile_id: str) -> Optional[Dict[str, Any]]:
+        for entry in self._profiles:
+            if entry["id"] == profile_id:
+                return entry
+        return None
+
+    def list(self) -> List[Dict[str, Any]]:
+        return [{key: value for key, value in entry.items() if key != "stats"} for entry in reversed(self._profiles)]
+
+    def stats(self) -> Dict[str, Any]:
+        return {"stored": len(self._profiles), "active": self.active, "skipped": self.skipped}
+
+
+def _admin_token_valid(token: Optional[bytes]) -> bool:
+    expected = os.environ.get("ADMIN_API_TOKEN")
+    return bool(expected and token and hmac.compare_digest(token, expected.encode()))
+
+
+class RequestProfilingMiddleware:
+    """ASGI middleware capturing a cProfile for requests that opt in with X-Profile: 1"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        requested = False
+        token = None
+        for name, value in scope.get("headers", ()):
+            if name == b"x-profile":
+                requested = value == b"1"
+            elif name == b"x-admin-token":
+                token = value
+        # Only one cProfile can be active per thread, and the event loop is one thread
+        if not requested or not _admin_token_valid(token) or request_profiles.active:
+            if requested:
+                request_profiles.skipped += 1
+            return await self.app(scope, receive, send)
+
+        profile = cProfile.Profile()
+        profile_id = uuid.uuid4().hex
+        started = time.perf_counter()
+
+        async def send_with_id(message):
+            if message["type"] == "http.response.start":
+                message = {**message, "headers": [*message.get("headers", ()), (b"x-profile-id", profile_id.encode())]}
+            await send(message)
+
+        request_profiles.active = True
+        profile.enable()
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            profile.disable()
+            request_profiles.active = False
+            request_profiles.add(profile_id, scope["method"], scope["path"], time.perf_counter() - started, profile)
+
+
+sampling_profiler = SamplingProfiler()
+request_profiles = RequestProfileStore(max_profiles=int(os.environ.get("PROFILER_MAX_REQUEST_PROFILES", "20")))
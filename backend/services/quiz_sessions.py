@@ -0,0 +1,168 @@
+"""Server-side quiz sessions with incremental scoring.
+
+Each answer updates a running personality tally in O(1); the provisional
+personality is the tally's leader, with ties broken exactly as
+Counter(answers).most_common(1) breaks them (the personality seen first wins).
+Changing an earlier answer rebuilds the tally from the session's few answers.
+
+MongoDB is the source of truth, so a session's answers may go to any worker.
+Every answer is a single find_one_and_update that sets the answer, pushes
+expires_at QUIZ_SESSION_TTL_HOURS out (a TTL index removes expired sessions)
+and increments the session's version, returning the stored session. A
+per-worker LRU (QUIZ_SESSION_CACHE_ENTRIES) keeps each session's tally: when
+the stored version is exactly one past the cached one, no other worker
+answered in between and the tally is updated incrementally; otherwise it is
+rebuilt from the stored answers. Completion is a conditional update, so
+exactly one worker completes a session and records it in analytics.
+"""
+from typing import Dict, Iterable, Optional, Any
+from collections import OrderedDict
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import ReturnDocument
+from models.quiz import QuizSession
+from services.storage_ids import encode_doc, decode_doc, match_id
+from datetime import datetime, timedelta
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+
+class QuizScore:
+    """Running personality tally whose leader matches Counter.most_common(1)"""
+
+    __slots__ = ("counts", "first_seen", "leader", "answered")
+
+    def __init__(self):
+        self.counts: Dict[str, int] = {}
+        self.first_seen: Dict[str, int] = {}
+        self.leader: Optional[str] = None
+        self.answered = 0
+
+    @classmethod
+    def from_answers(cls, personalities: Iterable[str]) -> "QuizScore":
+        score = cls()
+        for personality in personalities:
+            score.add(personality)
+        return score
+
+    def add(self, personality: str) -> None:
+        count = self.counts.get(personality, 0) + 1
+        self.counts[personality] = count
+        if personality not in self.first_seen:
+            self.first_seen[personality] = self.answered
+        self.answered += 1
+        # Only this personality's count moved, so it is the only possible new leader
+        leader = self.leader
+        if leader is None or count > self.counts[leader] or \
+                (count == self.counts[leader] and self.first_seen[personality] < self.first_seen[leader]):
+            self.leader = personality
+
+    @property
+    def confidence(self) -> float:
+        return self.counts[self.leader] / self.answered if self.answered else 0.0
+
+
+class QuizSessionEntry:
+    __slots__ = ("session", "score")
+
+    def __init__(self, session: QuizSession):
+        self.session = session
+        self.score = QuizScore.from_answers(session.answers.values())
+
+
+class QuizSessionStore:
+    def __init__(self, ttl_seconds: float = 86400, max_entries: int = 10000):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        # session id -> entry holding the tally at the session version it was computed for
+        self._entries: "OrderedDict[str, QuizSessionEntry]" = OrderedDict()
+        self.incremental = 0
+        self.rebuilds = 0
+
+    def _remember(self, entry: QuizSessionEntry) -> None:
+        self._entries[entry.session.id] = entry
+        self._entries.move_to_end(entry.session.id)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _entry_for(self, session: QuizSession) -> QuizSessionEntry:
+        """Entry for a stored session, reusing the cached tally when it is already at the stored version"""
+        cached = self._entries.get(session.id)
+        if cached is not None and cached.session.version == session.version:
+            cached.session = session
+            entry = cached
+        else:
+            entry = QuizSessionEntry(session)
+            self.rebuilds += 1
+        self._remember(entry)
+        return entry
+
+    async def create(self, db: AsyncIOMotorDatabase) -> QuizSessionEntry:
+        session = QuizSession()
+        session.expires_at = session.updated_at + timedelta(seconds=self.ttl_seconds)
+        await db.quiz_sessions.insert_one(encode_doc(session.dict()))
+        entry = QuizSessionEntry(session)
+        self._remember(entry)
+        return entry
+
+    async def get(self, db: AsyncIOMotorDatabase, session_id: str) -> Optional[QuizSessionEntry]:
+        # The TTL monitor only runs once a minute, so filter on expiry as well
+        doc = await db.quiz_sessions.find_one(
+            {"id": match_id(session_id), "expires_at": {"$gt": datetime.utcnow()}}, {"_id": 0}
+        )
+        return self._entry_for(QuizSession(**decode_doc(doc))) if doc else None
+
+    async def answer(self, db: AsyncIOMotorDatabase, session_id: str, question_id: int,
+                     personality: str) -> Optional[QuizSessionEntry]:
+        """Store one answer atomically and return the session with its updated tally (None if missing or expired)"""
+        now = datetime.utcnow()
+        key = str(question_id)
+        doc = await db.quiz_sessions.find_one_and_update(
+            {"id": match_id(session_id), "expires_at": {"$gt": now}},
+            {
+                "$set": {f"answers.{key}": personality, "updated_at": now,
+                         "expires_at": now + timedelta(seconds=self.ttl_seconds)},
+                "$inc": {"version": 1},
+            },
+            projection={"_id": 0},
+            return_document=ReturnDocument.AFTER
+        )
+        if doc is None:
+            return None
+        session = QuizSession(**decode_doc(doc))
+        cached = self._entries.get(session.id)
+        if cached is None or cached.session.version != session.version - 1:
+            # Another worker answered in between (or the tally was evicted)
+            return self._entry_for(session)
+
+        previous = cached.session.answers.get(key)
+        cached.session = session
+        if previous is None:
+            cached.score.add(personality)
+        elif previous != personality:
+            cached.score = QuizScore.from_answers(session.answers.values())
+        self.incremental += 1
+        self._remember(cached)
+        return cached
+
+    async def complete(self, db: AsyncIOMotorDatabase, entry: QuizSessionEntry) -> bool:
+        """Mark the session completed; True only for the call that completed it"""
+        result = await db.quiz_sessions.update_one(
+            {"id": match_id(entry.session.id), "completed": False}, {"$set": {"completed": True}}
+        )
+        entry.session.completed = True
+        return result.modified_count == 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "cached_sessions": len(self._entries),
+            "incremental_updates": self.incremental,
+            "rebuilds": self.rebuilds,
+        }
+
+
+quiz_sessions = QuizSessionStore(
+    ttl_seconds=float(os.environ.get("QUIZ_SESSION_TTL_HOURS", "24")) * 3600,
+    max_entries=int(os.environ.get("QUIZ_SESSION_CACHE_ENTRIES", "10000")),
+)
@@ -0,0 +1,259 @@
+from typing import Dict, FrozenSet, Tuple, Optional, Any
+from collections import Counter, OrderedDict
+from dataclasses import dataclass
+from services.pool_monitor import pool_monitor
+import hashlib
+import math
+import os
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class RouteBudget:
+    rate: float   # tokens refilled per second
+    burst: int    # bucket capacity
+
+
+# Default per-route budgets, overridable with RATE_LIMIT_<ROUTE>="rate:burst"
+DEFAULT_BUDGETS = {
+    "calculate-price": RouteBudget(rate=10.0, burst=30),
+    "configurations": RouteBudget(rate=2.0, burst=10),
+    "quote-request": RouteBudget(rate=0.2, burst=5),
+}
+
+
+def load_budgets() -> Dict[str, RouteBudget]:
+    """Resolve route budgets from defaults and environment overrides"""
+    budgets = dict(DEFAULT_BUDGETS)
+    for route in budgets:
+        name = "RATE_LIMIT_" + route.upper().replace("-", "_")
+        override = os.environ.get(name)
+        if not override:
+            continue
+        try:
+            rate, burst = override.split(":")
+            budget = RouteBudget(rate=float(rate), burst=int(burst))
+        except ValueError:
+            logger.error("Ignoring %s=%r: expected \"rate:burst\"", name, override)
+            continue
+        # A zero rate would divide by zero when computing Retry-After, and a bucket below one token admits nothing
+        if not (budget.rate > 0 and math.isfinite(budget.rate)) or budget.burst < 1:
+            logger.error("Ignoring %s=%r: rate must be positive and burst at least 1", name, override)
+            continue
+        budgets[route] = budget
+    return budgets
+
+
+class InMemoryBucketStore:
+    """Token buckets held in process memory (per worker), at most max_keys of them"""
+
+    def __init__(self, max_keys: int = 100000):
+        self.max_keys = max_keys
+        # Least recently used first
+        self._buckets: "OrderedDict[str, list]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    async def consume(self, key: str, budget: RouteBudget, cost: float = 1.0) -> Tuple[bool, float]:
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                if len(self._buckets) >= self.max_keys:
+                    self._prune(now)
+                bucket = self._buckets[key] = [float(budget.burst), now, budget]
+            else:
+                self._buckets.move_to_end(key)
+
+            tokens = min(budget.burst, bucket[0] + (now - bucket[1]) * budget.rate)
+            bucket[1] = now
+            if tokens >= cost:
+                bucket[0] = tokens - cost
+                return True, 0.0
+
+            bucket[0] = tokens
+            return False, (cost - tokens) / budget.rate
+
+    def _prune(self, now: float) -> None:
+        """Forget buckets that have refilled completely; they carry no state"""
+        full = [
+            key for key, (tokens, updated, budget) in self._buckets.items()
+            if tokens + (now - updated) * budget.rate >= budget.burst
+        ]
+        for key in full:
+            del self._buckets[key]
+        # Still at the cap (e.g. a flood of distinct clients): drop the least recently used buckets
+        while len(self._buckets) >= self.max_keys:
+            self._buckets.popitem(last=False)
+            self.evictions += 1
+
+
+class RedisBucketStore:
+    """Token buckets in Redis (or any Redis-protocol stand-in) shared across workers"""
+
+    SCRIPT = """
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local cost = tonumber(ARGV[4])
+local tokens = tonumber(state[1]) or burst
+local ts = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - ts) * rate)
+local allowed = 0
+local retry = 0
+if tokens >= cost then
+  tokens = tokens - cost
+  allowed = 1
+else
+  retry = (cost - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate) + 1)
+return {allowed, tostring(retry)}
+"""
+
+    def __init__(self, url: str, prefix: str = "ratelimit:"):
+        try:
+            import redis.asyncio as redis_asyncio
+        except ImportError:
+            raise RuntimeError("RATE_LIMIT_STORAGE=redis requires the 'redis' package")
+
+        self.prefix = prefix
+        self._redis = redis_asyncio.from_url(url)
+        self._script = self._redis.register_script(self.SCRIPT)
+
+    async def consume(self, key: str, budget: RouteBudget, cost: float = 1.0) -> Tuple[bool, float]:
+        allowed, retry_after = await self._script(
+            keys=[self.prefix + key],
+            args=[budget.rate, budget.burst, time.time(), cost],
+        )
+        return bool(int(allowed)), float(retry_after)
+
+
+def create_bucket_store():
+    """Pick the bucket storage backend from RATE_LIMIT_STORAGE"""
+    storage = os.environ.get("RATE_LIMIT_STORAGE", "memory")
+    if storage == "redis":
+        return RedisBucketStore(os.environ.get("RATE_LIMIT_REDIS_URL", "redis://localhost:6379/0"))
+    return InMemoryBucketStore(max_keys=int(os.environ.get("RATE_LIMIT_MAX_KEYS", "100000")))
+
+
+class LoadShedError(Exception):
+    """Raised when a request is rejected by rate limiting or admission control"""
+
+    def __init__(self, status_code: int, reason: str, retry_after: float):
+        super().__init__(reason)
+        self.status_code = status_code
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """Per-client token buckets plus a global in-flight limit guarded by Mongo pool pressure"""
+
+    def __init__(
+        self,
+        store=None,
+        budgets: Optional[Dict[str, RouteBudget]] = None,
+        max_in_flight: int = 200,
+        max_pool_waiting: int = 50,
+        shed_retry_after: float = 1.0,
+    ):
+        self.store = store
+        self.budgets = budgets if budgets is not None else load_budgets()
+        self.max_in_flight = max_in_flight
+        self.max_pool_waiting = max_pool_waiting
+        self.shed_retry_after = shed_retry_after
+        self.in_flight = 0
+        self.admitted = Counter()
+        self.shed = Counter()
+
+    def _get_store(self):
+        if self.store is None:
+            self.store = create_bucket_store()
+        return self.store
+
+    async def acquire(self, route: str, client_key: str) -> None:
+        """Admit a request or raise LoadShedError; callers must release() on success"""
+        budget = self.budgets.get(route)
+        if budget:
+            try:
+                allowed, retry_after = await self._get_store().consume(f"{route}:{client_key}", budget)
+            except Exception as e:
+                # Fail open: a broken limiter store must not take the API down
+                logger.error("Rate limiter store error: %s", e)
+                allowed, retry_after = True, 0.0
+            if not allowed:
+                self.shed[(route, "rate_limited")] += 1
+                raise LoadShedError(429, "Rate limit exceeded", retry_after)
+
+        if self.in_flight >= self.max_in_flight:
+            self.shed[(route, "concurrency")] += 1
+            raise LoadShedError(503, "Server busy", self.shed_retry_after)
+
+        if pool_monitor.waiting > self.max_pool_waiting:
+            self.shed[(route, "db_pool_saturated")] += 1
+            raise LoadShedError(503, "Server busy", self.shed_retry_after)
+
+        self.in_flight += 1
+        self.admitted[route] += 1
+
+    def release(self) -> None:
+        self.in_flight -= 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "in_flight": self.in_flight,
+            "max_in_flight": self.max_in_flight,
+            "max_pool_waiting": self.max_pool_waiting,
+            "pool": pool_monitor.snapshot(),
+            "admitted": dict(self.admitted),
+            "shed": [
+                {"route": route, "reason": reason, "count": count}
+                for (route, reason), count in self.shed.items()
+            ],
+            "budgets": {route: {"rate": b.rate, "burst": b.burst} for route, b in self.budgets.items()},
+        }
+
+
+admission_controller = AdmissionController(
+    max_in_flight=int(os.environ.get("ADMISSION_MAX_IN_FLIGHT", "200")),
+    max_pool_waiting=int(os.environ.get("ADMISSION_MAX_POOL_WAITING", "50")),
+    shed_retry_after=float(os.environ.get("ADMISSION_RETRY_AFTER_SECONDS", "1")),
+)
+
+
+_api_keys: Dict[str, Any] = {"raw": None, "keys": frozenset()}
+
+
+def _configured_api_keys() -> FrozenSet[str]:
+    """RATE_LIMIT_API_KEYS: comma-separated keys that get their own budget"""
+    raw = os.environ.get("RATE_LIMIT_API_KEYS", "")
+    if raw != _api_keys["raw"]:
+        _api_keys["raw"] = raw
+        _api_keys["keys"] = frozenset(key.strip() for key in raw.split(",") if key.strip())
+    return _api_keys["keys"]
+
+
+def client_key_for(headers, client_host: Optional[str]) -> str:
+    """Identify the caller by a configured API key, falling back to the client IP.
+
+    Unknown keys are ignored, so rotating made-up keys cannot mint fresh budgets.
+    """
+    api_key = headers.get("x-api-key")
+    if api_key and api_key in _configured_api_keys():
+        return "key:" + hashlib.sha256(api_key.encode()).hexdigest()[:16]
+    if os.environ.get("RATE_LIMIT_TRUST_FORWARDED") == "1":
+        forwarded = headers.get("x-forwarded-for")
+        if forwarded:
+            return "ip:" + forwarded.split(",")[0].strip()
+    return "ip:" + (client_host or "unknown")
+
+
+def retry_after_header(seconds: float) -> Dict[str, str]:
+    return {"Retry-After": str(max(1, math.ceil(seconds)))}
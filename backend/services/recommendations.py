@@ -0,0 +1,331 @@
+"""Similar-ring recommendations from precomputed nearest neighbours.
+
+A ring is a (stone size, setting, metal) combination, and the full combination
+space of a large catalog is far too big to compare pairwise. Each component is
+embedded on its own instead:
+
+- stone size: cut and stone type (one-hot), carat and log price (scaled to 0..1)
+- setting: personality_tags (multi-hot) and log base price
+- metal: metal type (one-hot) and price multiplier
+
+and its top-K nearest neighbours (itself first) are computed with NumPy in
+blocked matrix products whenever the published catalog version changes. Rows
+are compared exactly while a component has at most RECOMMENDATION_CANDIDATES
+of them. Beyond that the search is approximate and bounded: rows are ordered
+(stone sizes by cut, carat and price; settings by price) and each block of rows
+is only compared with the RECOMMENDATION_CANDIDATES rows around it in that
+order, so a build costs O(n) rather than O(n²) in time and memory.
+Combination similarity is the weighted sum of the component similarities, so
+the best combinations are a k-best merge over three lists that are already
+sorted: a small heap walk bounded by the number of results, with no vector
+math per request.
+
+Indexes are built off the request path: requests use the newest finished index
+and a version change only schedules a background rebuild, so they never wait
+on one.
+
+Personality alternatives start from an anchor built from the quiz's preferred
+cut and metal and the settings tagged with the personality, then list the
+anchor's neighbours.
+"""
+from typing import Dict, List, Optional, Any, Tuple
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from starlette.concurrency import run_in_threadpool
+from services.catalog_version import current_catalog_version
+from services.inventory import inventory_tracker
+from services.storage_ids import decode_id
+import asyncio
+import heapq
+import logging
+import math
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+NEIGHBOURS = int(os.environ.get("RECOMMENDATION_NEIGHBOURS", "20"))
+BLOCK_ROWS = 512
+CANDIDATE_ROWS = max(int(os.environ.get("RECOMMENDATION_CANDIDATES", "2048")), BLOCK_ROWS)
+WEIGHTS = {"stone": 0.5, "setting": 0.35, "metal": 0.15}
+
+StoneKey = Tuple[str, float]
+
+
+def _scaled(values: List[float]) -> List[float]:
+    low, high = min(values, default=0.0), max(values, default=0.0)
+    span = high - low
+    return [(value - low) / span if span else 0.0 for value in values]
+
+
+def _one_hot(values: List[str]) -> List[List[float]]:
+    vocabulary = {value: index for index, value in enumerate(sorted(set(values)))}
+    rows = []
+    for value in values:
+        row = [0.0] * len(vocabulary)
+        row[vocabulary[value]] = 1.0
+        rows.append(row)
+    return rows
+
+
+def nearest_neighbours(features: List[List[float]], k: int, order: Optional[List[int]] = None,
+                       candidates: int = CANDIDATE_ROWS) -> Tuple[List[List[int]], List[List[float]]]:
+    """Top-k neighbours of every row by Euclidean distance, as (indices, similarities in 0..1).
+
+    Exact for up to `candidates` rows. Larger inputs are walked in `order` (a permutation that puts likely
+    neighbours next to each other) and each block is compared with the `candidates` rows around it.
+    """
+    import numpy as np
+
+    count = len(features)
+    if count == 0:
+        return [], []
+    k = min(k, count)
+    window = min(candidates, count)
+    ordering = np.arange(count) if order is None or count <= window else np.asarray(order)
+    matrix = np.asarray(features, dtype=np.float32)[ordering]
+    norms = np.einsum("ij,ij->i", matrix, matrix)
+    indices = np.empty((count, k), dtype=np.int64)
+    similarities = np.empty((count, k), dtype=np.float32)
+    # Each block is compared with a window that contains it, so memory stays at BLOCK_ROWS x window
+    for start in range(0, count, BLOCK_ROWS):
+        stop = min(start + BLOCK_ROWS, count)
+        low = min(max((start + stop) // 2 - window // 2, 0), count - window)
+        block = matrix[start:stop]
+        distances = norms[start:stop, None] + norms[None, low:low + window] - 2.0 * block @ matrix[low:low + window].T
+        np.maximum(distances, 0.0, out=distances)
+        # Each row's own distance is zero in exact arithmetic; pin it so it always ranks first
+        rows = np.arange(stop - start)
+        distances[rows, rows + start - low] = -1.0
+        top = np.argpartition(distances, k - 1, axis=1)[:, :k]
+        top = np.take_along_axis(top, np.take_along_axis(distances, top, axis=1).argsort(axis=1), axis=1)
+        nearest = np.sqrt(np.maximum(np.take_along_axis(distances, top, axis=1), 0.0))
+        indices[ordering[start:stop]] = ordering[top + low]
+        similarities[ordering[start:stop]] = 1.0 / (1.0 + nearest)
+    return indices.tolist(), similarities.tolist()
+
+
+class RecommendationIndex:
+    """Neighbour lists for one catalog version"""
+
+    def __init__(self, version: int, stones: List[Dict[str, Any]], settings: List[Dict[str, Any]],
+                 metals: List[Dict[str, Any]], neighbours: int = NEIGHBOURS):
+        self.version = version
+        self.stone_keys: List[StoneKey] = []
+        self.stone_cuts: List[str] = []
+        stone_types, carats, stone_prices = [], [], []
+        for stone in stones:
+            for size in stone.get("sizes") or []:
+                self.stone_keys.append((stone["id"], size["carat"]))
+                self.stone_cuts.append(stone.get("cut") or "")
+                stone_types.append(stone.get("type") or "")
+                carats.append(size["carat"])
+                stone_prices.append(math.log1p(max(size["price"], 0.0)))
+        stone_features = [
+            cut + kind + [carat, price]
+            for cut, kind, carat, price in zip(
+                _one_hot(self.stone_cuts), [[0.5 * v for v in row] for row in _one_hot(stone_types)],
+                _scaled(carats), _scaled(stone_prices)
+            )
+        ]
+
+        self.setting_ids = [setting["id"] for setting in settings]
+        self.setting_tags = [frozenset(setting.get("personality_tags") or []) for setting in settings]
+        tags = sorted(set().union(*self.setting_tags)) if self.setting_tags else []
+        setting_prices = _scaled([math.log1p(max(setting["base_price"], 0.0)) for setting in settings])
+        setting_features = [
+            [1.0 if tag in setting_tags else 0.0 for tag in tags] + [price]
+            for setting_tags, price in zip(self.setting_tags, setting_prices)
+        ]
+
+        self.metal_ids = [metal["id"] for metal in metals]
+        self.metal_names = [metal.get("name") or "" for metal in metals]
+        metal_features = [
+            kind + [multiplier]
+            for kind, multiplier in zip(
+                _one_hot([metal.get("type") or "" for metal in metals]),
+                _scaled([metal["multiplier"] for metal in metals])
+            )
+        ]
+
+        stone_order = sorted(range(len(self.stone_keys)), key=lambda i: (self.stone_cuts[i], carats[i], stone_prices[i]))
+        setting_order = sorted(range(len(self.setting_ids)), key=lambda i: settings[i]["base_price"])
+        self.stones = nearest_neighbours(stone_features, neighbours, stone_order)
+        self.settings = nearest_neighbours(setting_features, neighbours, setting_order)
+        self.metals = nearest_neighbours(metal_features, neighbours)
+        self.stone_index = {key: index for index, key in enumerate(self.stone_keys)}
+        self.setting_index = {setting_id: index for index, setting_id in enumerate(self.setting_ids)}
+        self.metal_index = {metal_id: index for index, metal_id in enumerate(self.metal_ids)}
+
+    def similar(self, stone_id: str, carat: float, setting_id: str, metal_id: str,
+                limit: int = 10, include_self: bool = False) -> List[Dict[str, Any]]:
+        """Best-scoring combinations around a selection, by a k-best merge of the component neighbour lists"""
+        positions = (
+            self.stone_index.get((stone_id, carat)),
+            self.setting_index.get(setting_id),
+            self.metal_index.get(metal_id),
+        )
+        if None in positions:
+            return []
+        lists = [
+            (self.stones[0][positions[0]], self.stones[1][positions[0]], WEIGHTS["stone"]),
+            (self.settings[0][positions[1]], self.settings[1][positions[1]], WEIGHTS["setting"]),
+            (self.metals[0][positions[2]], self.metals[1][positions[2]], WEIGHTS["metal"]),
+        ]
+
+        def score(i: int, j: int, k: int) -> float:
+            return lists[0][1][i] * lists[0][2] + lists[1][1][j] * lists[1][2] + lists[2][1][k] * lists[2][2]
+
+        heap = [(-score(0, 0, 0), 0, 0, 0)]
+        seen = {(0, 0, 0)}
+        results = []
+        while heap and len(results) < limit:
+            negative, i, j, k = heapq.heappop(heap)
+            stone_key = self.stone_keys[lists[0][0][i]]
+            if (include_self or (i, j, k) != (0, 0, 0)) and \
+                    inventory_tracker.availability(stone_key[0], stone_key[1], "in_stock") != "out_of_stock":
+                results.append({
+                    "stone_id": stone_key[0],
+                    "carat": stone_key[1],
+                    "setting_id": self.setting_ids[lists[1][0][j]],
+                    "metal_id": self.metal_ids[lists[2][0][k]],
+                    "score": round(-negative, 4),
+                })
+            for step in ((i + 1, j, k), (i, j + 1, k), (i, j, k + 1)):
+                if step not in seen and all(position < len(lists[axis][0]) for axis, position in enumerate(step)):
+                    seen.add(step)
+                    heapq.heappush(heap, (-score(*step), *step))
+        return results
+
+    def anchor_for(self, personality: str, cut: Optional[str], metal_slug: Optional[str],
+                   carat: float = 1.0) -> Optional[Tuple[str, float, str, str]]:
+        """A representative selection for a personality from the quiz's preferences"""
+        if not self.stone_keys or not self.setting_ids or not self.metal_ids:
+            return None
+        stone_candidates = [index for index, stone_cut in enumerate(self.stone_cuts) if stone_cut == cut] \
+            or range(len(self.stone_keys))
+        stone = min(stone_candidates, key=lambda index: abs(self.stone_keys[index][1] - carat))
+        setting = max(
+            range(len(self.setting_ids)),
+            key=lambda index: (personality in self.setting_tags[index], -index)
+        )
+        slug = (metal_slug or "").replace("-", " ")
+        metal = next((index for index, name in enumerate(self.metal_names) if slug and slug in name.lower()), 0)
+        stone_id, stone_carat = self.stone_keys[stone]
+        return stone_id, stone_carat, self.setting_ids[setting], self.metal_ids[metal]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "catalog_version": self.version,
+            "stone_sizes": len(self.stone_keys),
+            "settings": len(self.setting_ids),
+            "metals": len(self.metal_ids),
+        }
+
+
+async def _load_catalog(db: AsyncIOMotorDatabase) -> Tuple[List[Dict[str, Any]], ...]:
+    stones = await db.stones.find(
+        {"is_active": True}, {"_id": 0, "id": 1, "cut": 1, "type": 1, "sizes.carat": 1, "sizes.price": 1}
+    ).to_list(None)
+    settings = await db.settings.find(
+        {"is_active": True}, {"_id": 0, "id": 1, "base_price": 1, "personality_tags": 1}
+    ).to_list(None)
+    metals = await db.metals.find(
+        {"is_active": True}, {"_id": 0, "id": 1, "name": 1, "type": 1, "multiplier": 1}
+    ).to_list(None)
+    for doc in stones + settings + metals:
+        doc["id"] = decode_id(doc["id"])
+    return stones, settings, metals
+
+
+class RecommendationEngine:
+    """Process-wide recommendation index, rebuilt in the background when the published catalog version changes"""
+
+    def __init__(self, retry_seconds: float = 5.0, max_retry_seconds: float = 300.0):
+        self.index: Optional[RecommendationIndex] = None
+        self.rebuilds = 0
+        self.build_errors = 0
+        self.last_build_seconds: Optional[float] = None
+        self.retry_seconds = retry_seconds
+        self.max_retry_seconds = max_retry_seconds
+        # Version whose build last failed, when, and how long to wait before building it again
+        self.failed_version: Optional[int] = None
+        self._failed_at = 0.0
+        self._retry_delay = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+    async def get(self, db: AsyncIOMotorDatabase) -> Optional[RecommendationIndex]:
+        """The newest finished index (None before the first build); never waits for a rebuild"""
+        version = await current_catalog_version(db)
+        index = self.index
+        if (index is None or index.version < version) and not self._backing_off(version):
+            self._schedule(db)
+        return index
+
+    def _backing_off(self, version: int) -> bool:
+        """Whether a build of `version` failed recently; a persistent bad document must not cost a scan per request"""
+        return version == self.failed_version and time.monotonic() - self._failed_at < self._retry_delay
+
+    async def refresh(self, db: AsyncIOMotorDatabase) -> Optional[RecommendationIndex]:
+        """Build the index for the current catalog version if needed and wait for it (warm-up)"""
+        version = await current_catalog_version(db)
+        if self.index is None or self.index.version < version:
+            await asyncio.shield(self._schedule(db))
+        return self.index
+
+    def _schedule(self, db: AsyncIOMotorDatabase) -> asyncio.Task:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._rebuild(db))
+        return self._task
+
+    async def _rebuild(self, db: AsyncIOMotorDatabase) -> None:
+        # Loop so a publish that lands during a build is picked up by the same task
+        while True:
+            version = None
+            try:
+                version = await current_catalog_version(db)
+                if self.index is not None and self.index.version >= version:
+                    return
+                started = time.monotonic()
+                stones, settings, metals = await _load_catalog(db)
+                index = await run_in_threadpool(RecommendationIndex, version, stones, settings, metals)
+            except Exception as e:
+                self.build_errors += 1
+                if version == self.failed_version:
+                    self._retry_delay = min(self._retry_delay * 2, self.max_retry_seconds)
+                else:
+                    self.failed_version, self._retry_delay = version, self.retry_seconds
+                self._failed_at = time.monotonic()
+                logger.error("Error building recommendation index for catalog version %s, retrying in %.0fs: %s",
+                             version, self._retry_delay, e)
+                return
+            self.index = index
+            self.failed_version = None
+            self.rebuilds += 1
+            self.last_build_seconds = round(time.monotonic() - started, 3)
+            logger.info("Built recommendation index for catalog version %s in %.2fs: %s stone sizes, %s settings, %s metals",
+                        version, self.last_build_seconds, len(index.stone_keys), len(index.setting_ids), len(index.metal_ids))
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except (asyncio.CancelledError, Exception):
+                pass
+            self._task = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **(self.index.stats() if self.index else {}),
+            "rebuilds": self.rebuilds,
+            "build_errors": self.build_errors,
+            "last_build_seconds": self.last_build_seconds,
+            "building": self._task is not None and not self._task.done(),
+            "failed_version": self.failed_version,
+        }
+
+
+recommendation_engine = RecommendationEngine(
+    retry_seconds=float(os.environ.get("RECOMMENDATION_RETRY_SECONDS", "5")),
+    max_retry_seconds=float(os.environ.get("RECOMMENDATION_MAX_RETRY_SECONDS", "300")),
+)
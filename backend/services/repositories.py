@@ -0,0 +1,75 @@
+"""Storage access for the catalog, saved configurations and quote requests.
+
+Repositories own the document shapes (storage ids, projections) and take the
+database handle from database.get_database(), so RingBuilderService works the
+same on MongoDB and on the embedded store (STORAGE_BACKEND=embedded): both
+expose the collection API used here. Documents come back with ids decoded to
+API strings.
+"""
+from typing import Dict, List, Optional, Any
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import ReturnDocument
+from services.storage_ids import encode_doc, decode_doc, match_id
+
+CATALOG_PAGE_SIZE = 100
+
+
+class CatalogRepository:
+    """Stones, settings or metals"""
+
+    def __init__(self, db: AsyncIOMotorDatabase, kind: str):
+        self.kind = kind
+        self.collection = db[kind]
+
+    async def count(self) -> int:
+        return await self.collection.count_documents({})
+
+    async def insert(self, item: Dict[str, Any]) -> None:
+        await self.collection.insert_one(encode_doc(item))
+
+    async def list_active(self, projection: Optional[Dict[str, Any]] = None,
+                          limit: Optional[int] = CATALOG_PAGE_SIZE) -> List[Dict[str, Any]]:
+        """Active items, the first page of them unless `limit` is None"""
+        docs = await self.collection.find({"is_active": True}, projection).to_list(limit)
+        return [decode_doc(doc) for doc in docs]
+
+    async def get(self, item_id: str) -> Optional[Dict[str, Any]]:
+        doc = await self.collection.find_one({"id": match_id(item_id)})
+        return decode_doc(doc) if doc else None
+
+    async def changed_between(self, since: int, until: int) -> List[Dict[str, Any]]:
+        """Items, active or not, last written at a catalog version in (since, until]"""
+        docs = await self.collection.find({"catalog_version": {"$gt": since, "$lte": until}}, {"_id": 0}).to_list(None)
+        return [decode_doc(doc) for doc in docs]
+
+
+class ConfigurationRepository:
+    def __init__(self, db: AsyncIOMotorDatabase):
+        self.collection = db.configurations
+
+    async def insert(self, config: Dict[str, Any]) -> None:
+        await self.collection.insert_one(encode_doc(config))
+
+    async def get(self, config_id: str, projection: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+        doc = await self.collection.find_one({"id": match_id(config_id)}, projection)
+        return decode_doc(doc) if doc else None
+
+    async def compare_and_set(self, config_id: str, version: int, fields: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Set `fields` and move to version + 1 if the stored configuration is still at `version`; None otherwise"""
+        # Configurations saved before versioning have no version field and count as version 1
+        expected = {"$in": [1, None]} if version == 1 else version
+        doc = await self.collection.find_one_and_update(
+            {"id": match_id(config_id), "version": expected},
+            {"$set": encode_doc({**fields, "version": version + 1})},
+            projection={"_id": 0},
+            return_document=ReturnDocument.AFTER
+        )
+        return decode_doc(doc) if doc else None
+
+
+class QuoteRepository:
+    def __init__(self, db: AsyncIOMotorDatabase):
+        self.collection = db.quote_requests
+
+    async def insert(self, quote: Dict[str, Any]) -> None:
+        await self.collection.insert_one(encode_doc(quote))
@@ -0,0 +1,168 @@
+from typing import Dict, List, Optional, Any
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from bson import Binary, json_util
+from pymongo import UpdateOne
+from starlette.concurrency import run_in_threadpool
+from datetime import datetime, timedelta
+from services.config_cache import configuration_cache
+from services.storage_ids import decode_doc, decode_id, match_ids
+import gzip
+import logging
+import os
+import zlib
+
+logger = logging.getLogger(__name__)
+
+# Configurations without a quote expire this many days after they are saved (0 disables)
+RETENTION_DAYS = int(os.environ.get("CONFIGURATION_RETENTION_DAYS", "30"))
+# The TTL index fires this long after expires_at, giving the archival job time to run first
+ARCHIVE_GRACE_SECONDS = int(os.environ.get("CONFIGURATION_ARCHIVE_GRACE_HOURS", "24")) * 3600
+
+
+def expiry_for(created_at: datetime) -> Optional[datetime]:
+    """expires_at for a newly saved configuration, or None when retention is disabled"""
+    return created_at + timedelta(days=RETENTION_DAYS) if RETENTION_DAYS > 0 else None
+
+
+def is_interesting(doc: Dict[str, Any]) -> bool:
+    """Expired configurations worth keeping for analysis: quiz-driven or with customer data"""
+    return bool(doc.get("personality_type") or doc.get("customer_info"))
+
+
+async def pin_configurations(db: AsyncIOMotorDatabase, config_ids: List[str]) -> None:
+    """Exempt configurations from expiry (they are referenced by a quote)"""
+    await db.configurations.update_many({"id": match_ids(config_ids)}, {"$unset": {"expires_at": ""}})
+    for config_id in config_ids:
+        configuration_cache.invalidate(config_id)
+
+
+class CollectionArchive:
+    """Stores each archived batch as one zlib-compressed document"""
+
+    def __init__(self, db: AsyncIOMotorDatabase):
+        self.collection = db.configurations_archive
+
+    async def write(self, docs: List[Dict[str, Any]]) -> None:
+        payload = zlib.compress(json_util.dumps(docs).encode("utf-8"), 9)
+        await self.collection.insert_one({
+            "archived_at": datetime.utcnow(),
+            "count": len(docs),
+            "first_created_at": min(doc["created_at"] for doc in docs),
+            "last_created_at": max(doc["created_at"] for doc in docs),
+            "format": "json+zlib",
+            "data": Binary(payload),
+        })
+
+
+class FileArchive:
+    """Appends archived configurations to a gzip-compressed NDJSON file"""
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def _append(self, docs: List[Dict[str, Any]]) -> None:
+        # Each call appends a new gzip member; gzip readers concatenate members transparently
+        with gzip.open(self.path, "at", encoding="utf-8") as archive:
+            for doc in docs:
+                archive.write(json_util.dumps(doc) + "\n")
+
+    async def write(self, docs: List[Dict[str, Any]]) -> None:
+        await run_in_threadpool(self._append, docs)
+
+
+class ConfigurationRetention:
+    """Archives and removes expired configurations ahead of the TTL index"""
+
+    def __init__(self, db: AsyncIOMotorDatabase, archive=None, archive_all: bool = False, batch_size: int = 1000):
+        self.db = db
+        self.archive = archive or CollectionArchive(db)
+        self.archive_all = archive_all
+        self.batch_size = batch_size
+
+    async def _referenced_ids(self, ids: List[str]) -> set:
+        # Quotes reference configurations by configuration_ref; older ones embed the whole configuration
+        cursor = self.db.quote_requests.find(
+            {"$or": [
+                {"configuration_ref.configuration_id": match_ids(ids)},
+                {"configuration.id": match_ids(ids)}
+            ]},
+            {"configuration_ref.configuration_id": 1, "configuration.id": 1}
+        )
+        referenced = set()
+        async for doc in cursor:
+            if "configuration_ref" in doc:
+                referenced.add(decode_id(doc["configuration_ref"]["configuration_id"]))
+            else:
+                referenced.add(decode_id(doc["configuration"]["id"]))
+        return referenced
+
+    async def archive_expired(self, now: Optional[datetime] = None) -> Dict[str, int]:
+        """Process every configuration past expires_at; returns counts"""
+        now = now or datetime.utcnow()
+        stats = {"scanned": 0, "archived": 0, "deleted": 0, "pinned": 0}
+
+        while True:
+            docs = await self.db.configurations.find(
+                {"expires_at": {"$lte": now}},
+                {"_id": 0}
+            ).limit(self.batch_size).to_list(self.batch_size)
+            docs = [decode_doc(doc) for doc in docs]
+            if not docs:
+                break
+            stats["scanned"] += len(docs)
+
+            # A quote may have been submitted after the configuration was saved; pin instead of expiring
+            referenced = await self._referenced_ids([doc["id"] for doc in docs])
+            if referenced:
+                await pin_configurations(self.db, list(referenced))
+            stats["pinned"] += len(referenced)
+
+            expired = [doc for doc in docs if doc["id"] not in referenced]
+            keep = expired if self.archive_all else [doc for doc in expired if is_interesting(doc)]
+            if keep:
+                await self.archive.write(keep)
+                stats["archived"] += len(keep)
+
+            expired_ids = [doc["id"] for doc in expired]
+            if expired_ids:
+                result = await self.db.configurations.delete_many({
+                    "id": match_ids(expired_ids),
+                    "expires_at": {"$lte": now}
+                })
+                stats["deleted"] += result.deleted_count
+                for config_id in expired_ids:
+                    configuration_cache.invalidate(config_id)
+
+        logger.info("Configuration retention run: %s", stats)
+        return stats
+
+    async def backfill_expiry(self) -> Dict[str, int]:
+        """Give configurations saved before retention existed an expiry, unless a quote references them"""
+        stats = {"expiring": 0, "pinned": 0}
+        if RETENTION_DAYS <= 0:
+            return stats
+
+        last_id = None
+        while True:
+            query: Dict[str, Any] = {"expires_at": None}
+            if last_id is not None:
+                query["_id"] = {"$gt": last_id}
+            docs = await self.db.configurations.find(query, {"_id": 1, "id": 1, "created_at": 1}) \
+                .sort("_id", 1).limit(self.batch_size).to_list(self.batch_size)
+            if not docs:
+                break
+            last_id = docs[-1]["_id"]
+            docs = [decode_doc(doc) for doc in docs]
+
+            referenced = await self._referenced_ids([doc["id"] for doc in docs])
+            stats["pinned"] += len(referenced)
+            operations = [
+                UpdateOne({"_id": doc["_id"]}, {"$set": {"expires_at": expiry_for(doc["created_at"])}})
+                for doc in docs if doc["id"] not in referenced
+            ]
+            if operations:
+                await self.db.configurations.bulk_write(operations, ordered=False)
+                stats["expiring"] += len(operations)
+            for doc in docs:
+                configuration_cache.invalidate(doc["id"])
+        return stats
@@ -1,19 +1,95 @@
 from typing import List, Optional, Dict, Any
 from motor.motor_asyncio import AsyncIOMotorDatabase
-from models.ring_builder import *
+from models.ring_builder import (
+    Stone, Setting, Metal, QuizQuestion, PersonalityRecommendation, QuizAnalysisRequest, QuizAnalysisResponse,
+    PriceCalculationRequest, PriceBreakdown, PriceCalculationResponse, BatchPriceRequest, BatchPriceItem,
+    BatchPriceResponse, RingConfiguration, ConfigurationUpdate, QuoteRequest, ConfigurationReference, QuoteRequestResponse,
+    RecommendedCombination, SimilarConfigurationsResponse, CatalogChanges,
+)
+from models.pricing import PriceMatrixRequest, PriceMatrixResponse, PriceMatrixCell
+from models.quiz import QuizAnswer, QuizSessionResponse
+from services.config_cache import configuration_cache
+from services.config_invalidation import configuration_invalidator
+from services.analytics import analytics_recorder
+from services.retention import expiry_for, pin_configurations
+from services.repositories import CatalogRepository, ConfigurationRepository, QuoteRepository
+from services.catalog_version import (
+    reserve_catalog_version, publish_catalog_version, release_catalog_version, current_catalog_version,
+    synced_catalog_version,
+)
+from services.catalog_revisions import record_version, get_item_at
+from services.inventory import InventoryService, inventory_tracker
+from services.catalog_state import price_selection, reprice_selection, catalog_state
+from services.currency import BASE_CURRENCY, currency_tables
+from services.pricing_rules import pricing_rules
+from services.shared_catalog import shared_catalog
+from services.recommendations import recommendation_engine
+from services.quiz_sessions import quiz_sessions, QuizSessionEntry
+from services.fieldsets import FieldSet, projection_for, select_fields, serialize, catalog_response_cache
 import logging
+import os
+import time
+import uuid
 from collections import Counter
+from datetime import datetime
 
 logger = logging.getLogger(__name__)
 
+MAX_MATRIX_CELLS = 2000
+# Clients further behind than this many catalog versions get a full snapshot instead of a delta
+CATALOG_DELTA_MAX_VERSIONS = int(os.environ.get("CATALOG_DELTA_MAX_VERSIONS", "100"))
+SELECTION_FIELDS = ("stone_id", "setting_id", "metal_id", "carat")
+
+
+class ConfigurationConflictError(ValueError):
+    """The configuration was changed since the version the update was based on"""
+
+# Quiz result per personality; analyze_quiz and quiz sessions recommend from it
+PERSONALITY_RECOMMENDATIONS = {
+    "classic": {
+        "stone": "round",
+        "setting": "solitaire",
+        "metal": "white-gold",
+        "description": "Perfect for someone who values timeless elegance and traditional beauty."
+    },
+    "glamorous": {
+        "stone": "oval", 
+        "setting": "halo",
+        "metal": "white-gold",
+        "description": "Ideal for someone who loves to sparkle and make a statement."
+    },
+    "romantic": {
+        "stone": "cushion",
+        "setting": "vintage",
+        "metal": "rose-gold",
+        "description": "Beautiful choice for someone with a romantic, vintage-loving soul."
+    },
+    "modern": {
+        "stone": "princess",
+        "setting": "tension",
+        "metal": "platinum",
+        "description": "Contemporary and sleek for the minimalist who appreciates modern design."
+    },
+    "artistic": {
+        "stone": "pear",
+        "setting": "three-stone",
+        "metal": "yellow-gold",
+        "description": "Unique and meaningful for the creative spirit who values individuality."
+    }
+}
+
+CATALOG_MODELS = {
+    "stones": Stone,
+    "settings": Setting,
+    "metals": Metal,
+}
+
 class RingBuilderService:
     def __init__(self, db: AsyncIOMotorDatabase):
         self.db = db
-        self.stones_collection = db.stones
-        self.settings_collection = db.settings
-        self.metals_collection = db.metals
-        self.configurations_collection = db.configurations
-        self.quotes_collection = db.quote_requests
+        self.catalog = {kind: CatalogRepository(db, kind) for kind in CATALOG_MODELS}
+        self.configurations = ConfigurationRepository(db)
+        self.quotes = QuoteRepository(db)
         
         # Initialize default data if collections are empty - will be called on first request
     
@@ -21,17 +97,24 @@ class RingBuilderService:
         """Ensure collections have default data"""
         try:
             # Check if data exists
-            stones_count = await self.stones_collection.count_documents({})
+            stones_count = await self.catalog["stones"].count()
             
             if stones_count == 0:
-                await self._seed_stones()
-                await self._seed_settings()
-                await self._seed_metals()
+                version = await reserve_catalog_version(self.db)
+                try:
+                    await self._seed_stones(version)
+                    await self._seed_settings(version)
+                    await self._seed_metals(version)
+                    await record_version(self.db, version)
+                except BaseException:
+                    await release_catalog_version(self.db, version)
+                    raise
+                await publish_catalog_version(self.db, version)
                 logger.info("Initialized ring builder with default data")
         except Exception as e:
-            logger.error(f"Error initializing default data: {e}")
+            logger.error("Error initializing default data: %s", e)
 
-    async def _seed_stones(self):
+    async def _seed_stones(self, version: int):
         """Seed stones collection with moissanite options"""
         stones_data = [
             {
@@ -133,10 +216,10 @@ class RingBuilderService:
         ]
         
         for stone_data in stones_data:
-            stone = Stone(**stone_data)
-            await self.stones_collection.insert_one(stone.dict())
+            stone = Stone(**stone_data, catalog_version=version)
+            await self.catalog["stones"].insert(stone.dict())
 
-    async def _seed_settings(self):
+    async def _seed_settings(self, version: int):
         """Seed settings collection"""
         settings_data = [
             {
@@ -190,10 +273,10 @@ class RingBuilderService:
         ]
         
         for setting_data in settings_data:
-            setting = Setting(**setting_data)
-            await self.settings_collection.insert_one(setting.dict())
+            setting = Setting(**setting_data, catalog_version=version)
+            await self.catalog["settings"].insert(setting.dict())
 
-    async def _seed_metals(self):
+    async def _seed_metals(self, version: int):
         """Seed metals collection"""
         metals_data = [
             {
@@ -231,76 +314,206 @@ class RingBuilderService:
         ]
         
         for metal_data in metals_data:
-            metal = Metal(**metal_data)
-            await self.metals_collection.insert_one(metal.dict())
+            metal = Metal(**metal_data, catalog_version=version)
+            await self.catalog["metals"].insert(metal.dict())
 
     # CRUD Operations
     async def get_all_stones(self) -> List[Stone]:
         """Get all active stones"""
         await self._ensure_data_initialized()
-        stones = await self.stones_collection.find({"is_active": True}).to_list(100)
-        return [Stone(**stone) for stone in stones]
+        stones = await self.catalog["stones"].list_active()
+        return [Stone(**inventory_tracker.apply_to_stone(stone)) for stone in stones]
 
     async def get_all_settings(self) -> List[Setting]:
         """Get all active settings"""
         await self._ensure_data_initialized()
-        settings = await self.settings_collection.find({"is_active": True}).to_list(100)
+        settings = await self.catalog["settings"].list_active()
         return [Setting(**setting) for setting in settings]
 
     async def get_all_metals(self) -> List[Metal]:
         """Get all active metals"""
         await self._ensure_data_initialized()
-        metals = await self.metals_collection.find({"is_active": True}).to_list(100)
+        metals = await self.catalog["metals"].list_active()
         return [Metal(**metal) for metal in metals]
 
+    async def catalog_variant(self, kind: str, currency: Optional[str] = None) -> Optional[str]:
+        """Discriminates renderings of one catalog version for response caching and ETags"""
+        parts = []
+        # Stone sizes carry live availability, so stones vary with the availability state
+        if kind == "stones":
+            parts.append(inventory_tracker.signature)
+        if currency and currency.upper() != BASE_CURRENCY and kind in ("stones", "settings"):
+            rates = await currency_tables.current_rates(self.db)
+            if currency.upper() not in rates.currencies:
+                raise ValueError(f"Unsupported currency '{currency}'")
+            parts.append(f"{currency.upper()}.{rates.version}")
+        return "-".join(parts) or None
+
+    async def get_catalog_json(self, kind: str, fields: FieldSet = None, currency: Optional[str] = None) -> bytes:
+        """Active catalog items as pre-serialized JSON, limited to `fields` and priced in `currency` when given"""
+        await self._ensure_data_initialized()
+        version = await current_catalog_version(self.db)
+        variant = await self.catalog_variant(kind, currency)
+        base_currency = not currency or currency.upper() == BASE_CURRENCY
+        if fields is None and base_currency and not (kind == "stones" and inventory_tracker.tracking):
+            # The host-wide snapshot carries the full base-currency lists
+            body = shared_catalog.body(kind, version)
+            if body is not None:
+                return body
+        body = catalog_response_cache.get(kind, version, fields, variant)
+        if body is not None:
+            return body
+
+        docs = await self.catalog[kind].list_active(projection_for(fields))
+        if kind == "stones":
+            docs = [inventory_tracker.apply_to_stone(doc) for doc in docs]
+        if currency and currency.upper() != BASE_CURRENCY:
+            converted = await currency_tables.get(self.db, currency)
+            if kind == "stones":
+                docs = [currency_tables.convert_stone(doc, converted) for doc in docs]
+            elif kind == "settings":
+                docs = [currency_tables.convert_setting(doc, converted) for doc in docs]
+        if fields is None:
+            model = CATALOG_MODELS[kind]
+            items = [model(**doc).dict() for doc in docs]
+        else:
+            items = [select_fields(doc, fields) for doc in docs]
+        body = serialize(items)
+        catalog_response_cache.put(kind, version, fields, body, variant)
+        return body
+
+    async def get_catalog_changes(self, since: int) -> CatalogChanges:
+        """Catalog items added, changed or deactivated after catalog version `since`.
+
+        Every catalog write stamps the items it touches with its version, so a delta is one indexed range query per
+        kind. Clients with no copy, one from a version this catalog never published, or one too far behind get
+        the full active catalog instead. Deltas end at the synced version, below any write still in progress.
+        """
+        await self._ensure_data_initialized()
+        version = await synced_catalog_version(self.db)
+        full = since <= 0 or since > version or version - since > CATALOG_DELTA_MAX_VERSIONS
+        changes = CatalogChanges(since=since, catalog_version=version, full=full)
+        if since == version:
+            return changes
+        for kind, model in CATALOG_MODELS.items():
+            if full:
+                # Clients replace their copy with a full response, so it must hold every active item
+                docs = await self.catalog[kind].list_active(limit=None)
+            else:
+                docs = await self.catalog[kind].changed_between(since, version)
+                removed = [doc["id"] for doc in docs if not doc.get("is_active", True)]
+                if removed:
+                    changes.removed[kind] = removed
+                docs = [doc for doc in docs if doc.get("is_active", True)]
+            if kind == "stones":
+                docs = [inventory_tracker.apply_to_stone(doc) for doc in docs]
+            setattr(changes, kind, [model(**doc) for doc in docs])
+        return changes
+
     async def get_stone_by_id(self, stone_id: str) -> Optional[Stone]:
         """Get stone by ID"""
-        stone = await self.stones_collection.find_one({"id": stone_id})
-        return Stone(**stone) if stone else None
+        stone = await self.catalog["stones"].get(stone_id)
+        return Stone(**inventory_tracker.apply_to_stone(stone)) if stone else None
 
     async def get_setting_by_id(self, setting_id: str) -> Optional[Setting]:
         """Get setting by ID"""
-        setting = await self.settings_collection.find_one({"id": setting_id})
+        setting = await self.catalog["settings"].get(setting_id)
         return Setting(**setting) if setting else None
 
     async def get_metal_by_id(self, metal_id: str) -> Optional[Metal]:
         """Get metal by ID"""
-        metal = await self.metals_collection.find_one({"id": metal_id})
+        metal = await self.catalog["metals"].get(metal_id)
         return Metal(**metal) if metal else None
 
-    async def calculate_price(self, request: PriceCalculationRequest) -> PriceCalculationResponse:
-        """Calculate total price for ring configuration"""
-        stone = await self.get_stone_by_id(request.stone_id)
-        setting = await self.get_setting_by_id(request.setting_id)
-        metal = await self.get_metal_by_id(request.metal_id)
-        
-        if not all([stone, setting, metal]):
-            raise ValueError("Invalid stone, setting, or metal ID")
-        
-        # Find stone price for carat
-        stone_size = next((size for size in stone.sizes if size.carat == request.carat), None)
-        if not stone_size:
-            raise ValueError(f"Stone size {request.carat} carat not available")
-        
-        stone_price = stone_size.price
-        setting_price = setting.base_price
-        metal_adjustment = (stone_price + setting_price) * (metal.multiplier - 1.0)
-        
-        total_price = stone_price + setting_price + metal_adjustment
-        
-        return PriceCalculationResponse(
-            total_price=round(total_price, 2),
-            breakdown=PriceBreakdown(
-                stone=stone_price,
-                setting=setting_price,
-                metal_adjustment=metal_adjustment
-            ),
-            details={
+    async def get_catalog_item(self, kind: str, item_id: str, version: Optional[int] = None) -> Optional[Dict[str, Any]]:
+        """Get a stone, setting or metal as it was at a catalog version (current state if omitted)"""
+        return await get_item_at(self.db, kind, item_id, version)
+
+    async def calculate_price(self, request: PriceCalculationRequest, expand_details: bool = False,
+                              currency: Optional[str] = None) -> PriceCalculationResponse:
+        """Calculate total price for ring configuration from the in-memory catalog and pricing rules"""
+        snapshot = await currency_tables.get(self.db, currency)
+        rules = await pricing_rules.get(self.db)
+        price = price_selection(snapshot, request.stone_id, request.setting_id, request.metal_id, request.carat, rules)
+
+        if expand_details:
+            # Full items are the only part of a price that needs the database
+            stone = await self.get_stone_by_id(request.stone_id)
+            setting = await self.get_setting_by_id(request.setting_id)
+            metal = await self.get_metal_by_id(request.metal_id)
+            if not all([stone, setting, metal]):
+                raise ValueError("Invalid stone, setting, or metal ID")
+            details = {
                 "stone": stone.dict(),
                 "setting": setting.dict(),
                 "metal": metal.dict(),
                 "carat": request.carat
             }
+        else:
+            details = {
+                "stone_id": request.stone_id,
+                "setting_id": request.setting_id,
+                "metal_id": request.metal_id,
+                "carat": request.carat
+            }
+
+        return PriceCalculationResponse(
+            total_price=price["total_price"],
+            breakdown=PriceBreakdown(**price["breakdown"]),
+            savings=price["savings"],
+            catalog_version=price["catalog_version"],
+            currency=price["currency"],
+            details=details
+        )
+
+    async def calculate_prices(self, request: BatchPriceRequest) -> BatchPriceResponse:
+        """Price many selections from the in-memory catalog snapshot, without per-item reads"""
+        snapshot = await currency_tables.get(self.db, request.currency)
+        rules = await pricing_rules.get(self.db)
+        now = time.time()
+        prices = []
+        for item in request.items:
+            try:
+                price = price_selection(snapshot, item.stone_id, item.setting_id, item.metal_id, item.carat, rules, now)
+                prices.append(BatchPriceItem(
+                    total_price=price["total_price"],
+                    breakdown=PriceBreakdown(**price["breakdown"]),
+                    savings=price["savings"]
+                ))
+            except ValueError as e:
+                prices.append(BatchPriceItem(error=str(e)))
+        return BatchPriceResponse(currency=snapshot.currency, catalog_version=snapshot.version, prices=prices)
+
+    async def price_matrix(self, request: PriceMatrixRequest) -> PriceMatrixResponse:
+        """Price one stone across carats x settings x metals"""
+        snapshot = await currency_tables.get(self.db, request.currency)
+        rules = await pricing_rules.get(self.db)
+        sizes = snapshot.stones.get(request.stone_id)
+        if sizes is None:
+            raise ValueError("Invalid stone, setting, or metal ID")
+        carats = request.carats if request.carats is not None else sorted(sizes)
+        if len(carats) * len(request.setting_ids) * len(request.metal_ids) > MAX_MATRIX_CELLS:
+            raise ValueError(f"Price matrix is limited to {MAX_MATRIX_CELLS} cells")
+
+        now = time.time()
+        cells = []
+        for carat in carats:
+            for setting_id in request.setting_ids:
+                for metal_id in request.metal_ids:
+                    cell = PriceMatrixCell(carat=carat, setting_id=setting_id, metal_id=metal_id)
+                    try:
+                        price = price_selection(snapshot, request.stone_id, setting_id, metal_id, carat, rules, now)
+                        cell.total_price = price["total_price"]
+                        cell.savings = price["savings"]
+                    except ValueError as e:
+                        cell.error = str(e)
+                    cells.append(cell)
+        return PriceMatrixResponse(
+            stone_id=request.stone_id,
+            currency=snapshot.currency,
+            catalog_version=snapshot.version,
+            rules_version=rules.version,
+            prices=cells
         )
 
     def get_quiz_questions(self) -> List[QuizQuestion]:
@@ -364,74 +577,244 @@ class RingBuilderService:
         dominant_personality = personality_counts.most_common(1)[0][0]
         confidence = personality_counts[dominant_personality] / len(personalities)
         
-        # Get recommendations based on personality
-        recommendations_map = {
-            "classic": {
-                "stone": "round",
-                "setting": "solitaire",
-                "metal": "white-gold",
-                "description": "Perfect for someone who values timeless elegance and traditional beauty."
-            },
-            "glamorous": {
-                "stone": "oval", 
-                "setting": "halo",
-                "metal": "white-gold",
-                "description": "Ideal for someone who loves to sparkle and make a statement."
-            },
-            "romantic": {
-                "stone": "cushion",
-                "setting": "vintage",
-                "metal": "rose-gold",
-                "description": "Beautiful choice for someone with a romantic, vintage-loving soul."
-            },
-            "modern": {
-                "stone": "princess",
-                "setting": "tension",
-                "metal": "platinum",
-                "description": "Contemporary and sleek for the minimalist who appreciates modern design."
-            },
-            "artistic": {
-                "stone": "pear",
-                "setting": "three-stone",
-                "metal": "yellow-gold",
-                "description": "Unique and meaningful for the creative spirit who values individuality."
-            }
-        }
-        
-        recommendation_data = recommendations_map.get(dominant_personality, recommendations_map["classic"])
+        recommendation_data = PERSONALITY_RECOMMENDATIONS.get(dominant_personality, PERSONALITY_RECOMMENDATIONS["classic"])
         
+        analytics_recorder.record_quiz(dominant_personality)
+
         return QuizAnalysisResponse(
             personality=dominant_personality,
             recommendation=PersonalityRecommendation(**recommendation_data),
-            confidence=confidence
+            confidence=confidence,
+            alternatives=await self._personality_alternatives(dominant_personality, recommendation_data)
         )
 
+    async def _priced(self, items: List[Dict[str, Any]]) -> List[RecommendedCombination]:
+        snapshot = await catalog_state.get(self.db)
+        rules = await pricing_rules.get(self.db)
+        now = time.time()
+        combinations = []
+        for item in items:
+            combination = RecommendedCombination(**item)
+            try:
+                combination.total_price = price_selection(
+                    snapshot, item["stone_id"], item["setting_id"], item["metal_id"], item["carat"], rules, now
+                )["total_price"]
+            except ValueError:
+                # Index and snapshot can straddle a catalog publish for a moment
+                pass
+            combinations.append(combination)
+        return combinations
+
+    async def _personality_alternatives(self, personality: str, preferences: Dict[str, str],
+                                        limit: int = 6) -> List[RecommendedCombination]:
+        """Catalog combinations around the personality's preferred cut, metal and tagged settings"""
+        try:
+            index = await recommendation_engine.get(self.db)
+            if index is None:
+                return []
+            anchor = index.anchor_for(personality, preferences.get("stone"), preferences.get("metal"))
+            if anchor is None:
+                return []
+            return await self._priced(index.similar(*anchor, limit=limit, include_self=True))
+        except Exception as e:
+            logger.error("Error building personality alternatives: %s", e)
+            return []
+
+    async def similar_configurations(self, config_id: str, limit: int = 10) -> Optional[SimilarConfigurationsResponse]:
+        """Combinations most similar to a saved configuration, from the precomputed neighbour index"""
+        config = await self.get_configuration(config_id)
+        if not config:
+            return None
+        index = await recommendation_engine.get(self.db)
+        if index is None:
+            return SimilarConfigurationsResponse(configuration_id=config.id, items=[])
+        items = index.similar(config.stone_id, config.carat, config.setting_id, config.metal_id, limit=limit)
+        return SimilarConfigurationsResponse(
+            configuration_id=config.id,
+            catalog_version=index.version,
+            items=await self._priced(items)
+        )
+
+    def _quiz_options(self) -> Dict[int, set]:
+        return {question.id: {option.personality for option in question.options} for question in self.get_quiz_questions()}
+
+    async def _quiz_session_response(self, entry: QuizSessionEntry, total_questions: int) -> QuizSessionResponse:
+        score = entry.score
+        response = QuizSessionResponse(
+            session_id=entry.session.id,
+            answered=score.answered,
+            total_questions=total_questions,
+            complete=entry.session.completed,
+            scores=dict(score.counts),
+            personality=score.leader,
+            confidence=score.confidence
+        )
+        if score.leader is not None:
+            recommendation_data = PERSONALITY_RECOMMENDATIONS.get(score.leader, PERSONALITY_RECOMMENDATIONS["classic"])
+            response.recommendation = PersonalityRecommendation(**recommendation_data)
+            response.alternatives = await self._personality_alternatives(score.leader, recommendation_data)
+        return response
+
+    async def start_quiz_session(self) -> QuizSessionResponse:
+        """Open a quiz session that takes answers one at a time"""
+        entry = await quiz_sessions.create(self.db)
+        return await self._quiz_session_response(entry, len(self._quiz_options()))
+
+    async def get_quiz_session(self, session_id: str) -> Optional[QuizSessionResponse]:
+        entry = await quiz_sessions.get(self.db, session_id)
+        if entry is None:
+            return None
+        return await self._quiz_session_response(entry, len(self._quiz_options()))
+
+    async def answer_quiz_question(self, session_id: str, answer: QuizAnswer) -> Optional[QuizSessionResponse]:
+        """Record one answer and return the provisional result with prefetched recommendations"""
+        options = self._quiz_options()
+        if answer.personality not in options.get(answer.question_id, ()):
+            raise ValueError(f"Invalid answer for question {answer.question_id}")
+        entry = await quiz_sessions.answer(self.db, session_id, answer.question_id, answer.personality)
+        if entry is None:
+            return None
+
+        if not entry.session.completed and entry.score.answered == len(options):
+            # Only the worker whose update completed the session records it
+            if await quiz_sessions.complete(self.db, entry):
+                analytics_recorder.record_quiz(entry.score.leader)
+        return await self._quiz_session_response(entry, len(options))
+
     async def save_configuration(self, config: RingConfiguration) -> str:
         """Save ring configuration to database"""
-        config_dict = config.dict()
-        await self.configurations_collection.insert_one(config_dict)
+        if config.expires_at is None:
+            config.expires_at = expiry_for(config.created_at)
+        await self.configurations.insert(config.dict())
+        # Write-through so the save -> quote flow and shared links skip the database
+        configuration_cache.put(config)
+        analytics_recorder.record_configuration(config.stone_id, config.setting_id, config.metal_id, config.personality_type)
         return config.id
 
     async def get_configuration(self, config_id: str) -> Optional[RingConfiguration]:
         """Get ring configuration by ID"""
-        config = await self.configurations_collection.find_one({"id": config_id})
-        return RingConfiguration(**config) if config else None
+        cached = configuration_cache.get(config_id)
+        if cached:
+            return cached
+
+        config = await self.configurations.get(config_id)
+        if not config:
+            return None
+
+        configuration = RingConfiguration(**config)
+        configuration_cache.put(configuration)
+        return configuration
+
+    async def update_configuration(self, config_id: str, update: ConfigurationUpdate) -> Optional[RingConfiguration]:
+        """Change components of a saved configuration in place, repricing only what changed.
+
+        The write is a compare-and-set on the version the client read, so of two concurrent edits one wins and the
+        other gets ConfigurationConflictError.
+        """
+        config = configuration_cache.get(config_id)
+        if config is None or config.version != update.version:
+            # The cached copy may be behind an edit made through another worker
+            doc = await self.configurations.get(config_id)
+            if not doc:
+                return None
+            config = RingConfiguration(**doc)
+        if config.version != update.version:
+            raise ConfigurationConflictError(f"Configuration was modified (now at version {config.version})")
+
+        changes = {
+            field: value for field, value in update.dict(exclude_unset=True, exclude={"version"}).items()
+            if (value is not None or field == "personality_type") and value != getattr(config, field)
+        }
+        if not changes:
+            return config
+
+        fields: Dict[str, Any] = dict(changes)
+        changed_selection = set(changes) & set(SELECTION_FIELDS)
+        if changed_selection:
+            snapshot = await catalog_state.get(self.db)
+            rules = await pricing_rules.get(self.db)
+            selection = {field: changes.get(field, getattr(config, field)) for field in SELECTION_FIELDS}
+            price = reprice_selection(
+                snapshot, selection, changed_selection,
+                config.price_breakdown.dict() if config.price_breakdown else None, config.catalog_version, rules
+            )
+            fields.update(
+                total_price=price["total_price"],
+                price_breakdown=PriceBreakdown(**price["breakdown"]).dict(),
+                catalog_version=price["catalog_version"],
+            )
+        fields["updated_at"] = datetime.utcnow()
 
-    async def submit_quote_request(self, request: QuoteRequest) -> QuoteRequestResponse:
+        doc = await self.configurations.compare_and_set(config_id, config.version, fields)
+        if doc is None:
+            configuration_cache.invalidate(config_id)
+            raise ConfigurationConflictError("Configuration was modified by another update")
+        configuration = RingConfiguration(**doc)
+        configuration_cache.put(configuration)
+        # Other workers drop their cached copy within one poll; the compare-and-set above guards writes meanwhile
+        await configuration_invalidator.publish(self.db, config_id)
+        return configuration
+
+    async def get_configuration_fields(self, config_id: str, fields: FieldSet) -> Optional[Dict[str, Any]]:
+        """Get selected fields of a configuration, projecting in Mongo on cache misses"""
+        cached = configuration_cache.get(config_id)
+        if cached:
+            return select_fields(cached.dict(), fields)
+
+        config = await self.configurations.get(config_id, projection_for(fields))
+        return select_fields(config, fields) if config else None
+
+    async def submit_quote_request(self, request: QuoteRequest, expand_configuration: bool = False) -> QuoteRequestResponse:
         """Submit a quote request"""
         # Get the configuration
         config = await self.get_configuration(request.configuration_id)
         if not config:
             raise ValueError("Configuration not found")
+
+        # Quoted configurations are kept indefinitely
+        if config.expires_at is not None:
+            await pin_configurations(self.db, [config.id])
+            config.expires_at = None
         
-        # Create quote request
+        # Hold the stone size while the quote is open; raises OutOfStockError for the last unit race
+        quote_request_id = str(uuid.uuid4())
+        inventory = InventoryService(self.db)
+        hold = await inventory.reserve(
+            config.stone_id,
+            config.carat,
+            quote_request_id=quote_request_id,
+            configuration_id=config.id
+        )
+
+        # Create quote request referencing the configuration and the catalog version it was priced at
         quote_request = QuoteRequestResponse(
-            quote_request_id=str(uuid.uuid4()),
-            configuration=config,
-            customer_details=request.customer_details
+            quote_request_id=quote_request_id,
+            configuration_ref=ConfigurationReference(
+                configuration_id=config.id,
+                configuration_version=config.version,
+                catalog_version=config.catalog_version,
+                stone_id=config.stone_id,
+                setting_id=config.setting_id,
+                metal_id=config.metal_id,
+                carat=config.carat,
+                personality_type=config.personality_type,
+                total_price=config.total_price,
+                breakdown=config.price_breakdown
+            ),
+            customer_details=request.customer_details,
+            hold_id=hold.hold_id if hold else None,
+            hold_expires_at=hold.expires_at if hold else None
         )
         
         # Save to database
-        await self.quotes_collection.insert_one(quote_request.dict())
+        try:
+            await self.quotes.insert(quote_request.dict(exclude={"configuration"}))
+        except Exception:
+            if hold:
+                await inventory.release(hold.hold_id)
+            raise
+        if expand_configuration:
+            quote_request.configuration = config
+        analytics_recorder.record_quote(config.stone_id, config.setting_id, config.metal_id, config.total_price)
         
         return quote_request
\ No newline at end of file
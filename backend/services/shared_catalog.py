@@ -0,0 +1,397 @@
+"""Catalog snapshot shared by every worker on a host through a memory-mapped file.
+
+Enabled by CATALOG_SNAPSHOT_PATH. One worker per host, elected by holding an
+flock on "<path>.lock", watches the published catalog version and rewrites the
+snapshot when it moves. The new file is written next to the old one and
+swapped in with os.replace. Every worker maps the current file read-only and
+remaps when it changes; readers of the previous mapping keep a valid view
+until they drop it.
+
+File layout: b"RCAT", a little-endian u32 manifest length, the JSON manifest
+(format, versions, section offsets and dtypes), then 8-byte aligned sections:
+sorted fixed-width id arrays, float64 price/carat/multiplier arrays, stone
+size offsets, and pre-rendered JSON bodies for the /stones, /settings and
+/metals list endpoints. Lookups binary search the id arrays in place, so
+pricing and list responses read from the same pages of the OS page cache in
+every worker.
+"""
+from typing import Dict, Optional, Any, Iterator, List, Tuple
+from collections.abc import Mapping
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from starlette.concurrency import run_in_threadpool
+from models.ring_builder import Stone, Setting, Metal
+from services.catalog_state import CatalogSnapshot, catalog_state
+from services.catalog_version import get_catalog_version
+from services.fieldsets import serialize
+from services.storage_ids import decode_doc
+import asyncio
+import fcntl
+import json
+import logging
+import mmap
+import os
+import struct
+import time
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"RCAT"
+FORMAT_VERSION = 1
+LIST_MODELS = {"stones": Stone, "settings": Setting, "metals": Metal}
+
+
+class _IdIndex:
+    """Sorted fixed-width byte-string ids, binary searched in place"""
+
+    def __init__(self, ids):
+        self.ids = ids
+
+    def find(self, key: Any) -> int:
+        if not isinstance(key, str):
+            return -1
+        encoded = key.encode()
+        if len(encoded) > self.ids.dtype.itemsize:
+            return -1
+        position = int(self.ids.searchsorted(encoded))
+        if position < len(self.ids) and self.ids[position] == encoded:
+            return position
+        return -1
+
+    def __iter__(self) -> Iterator[str]:
+        return (value.decode() for value in self.ids)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+
+class _ValueMap(Mapping):
+    """id -> float view over an id index and a parallel float64 array"""
+
+    def __init__(self, index: _IdIndex, array):
+        self.index = index
+        self.array = array
+
+    def __getitem__(self, key):
+        position = self.index.find(key)
+        if position < 0:
+            raise KeyError(key)
+        return float(self.array[position])
+
+    def __iter__(self):
+        return iter(self.index)
+
+    def __len__(self):
+        return len(self.index)
+
+
+class _SizePrices(Mapping):
+    """carat -> price over one stone's slice of the (carat-sorted) size arrays"""
+
+    def __init__(self, carats, prices):
+        self.carats = carats
+        self.prices = prices
+
+    def __getitem__(self, carat):
+        position = int(self.carats.searchsorted(carat))
+        if position < len(self.carats) and self.carats[position] == carat:
+            return float(self.prices[position])
+        raise KeyError(carat)
+
+    def __iter__(self):
+        return iter(self.carats.tolist())
+
+    def __len__(self):
+        return len(self.carats)
+
+
+class _StoneSizes(Mapping):
+    """stone id -> carat/price view, sliced from the size arrays without copying"""
+
+    def __init__(self, index: _IdIndex, offsets, carats, prices):
+        self.index = index
+        self.offsets = offsets
+        self.carats = carats
+        self.prices = prices
+
+    def __getitem__(self, key):
+        position = self.index.find(key)
+        if position < 0:
+            raise KeyError(key)
+        start, end = int(self.offsets[position]), int(self.offsets[position + 1])
+        return _SizePrices(self.carats[start:end], self.prices[start:end])
+
+    def __iter__(self):
+        return iter(self.index)
+
+    def __len__(self):
+        return len(self.index)
+
+
+class _StoneCuts(Mapping):
+    def __init__(self, index: _IdIndex, cut_codes, names: List[Optional[str]]):
+        self.index = index
+        self.cut_codes = cut_codes
+        self.names = names
+
+    def __getitem__(self, key):
+        position = self.index.find(key)
+        if position < 0:
+            raise KeyError(key)
+        return self.names[int(self.cut_codes[position])]
+
+    def __iter__(self):
+        return iter(self.index)
+
+    def __len__(self):
+        return len(self.index)
+
+
+def encode_snapshot(snapshot: CatalogSnapshot, bodies: Dict[str, bytes]) -> bytes:
+    """Serialize a pricing snapshot and list bodies into the shared file format"""
+    import numpy as np
+
+    sections: List[Tuple[str, bytes]] = []
+    manifest: Dict[str, Any] = {
+        "format": FORMAT_VERSION,
+        "version": snapshot.version,
+        "published": snapshot.published,
+        "arrays": {},
+        "bodies": {},
+    }
+
+    def add_array(name: str, array) -> None:
+        manifest["arrays"][name] = {"dtype": array.dtype.str, "count": len(array)}
+        sections.append((name, array.tobytes()))
+
+    def add_ids(name: str, ids: List[str]):
+        width = max([len(value.encode()) for value in ids] or [1])
+        add_array(name, np.array([value.encode() for value in ids], dtype=f"S{width}"))
+
+    stone_ids = sorted(snapshot.stones)
+    add_ids("stone_ids", stone_ids)
+    offsets = [0]
+    carats: List[float] = []
+    prices: List[float] = []
+    for stone_id in stone_ids:
+        sizes = sorted(snapshot.stones[stone_id].items())
+        carats.extend(carat for carat, _ in sizes)
+        prices.extend(price for _, price in sizes)
+        offsets.append(len(carats))
+    add_array("stone_offsets", np.array(offsets, dtype="<i8"))
+    add_array("stone_carats", np.array(carats, dtype="<f8"))
+    add_array("stone_prices", np.array(prices, dtype="<f8"))
+    cut_names = sorted({cut for cut in snapshot.cuts.values() if cut is not None})
+    manifest["cuts"] = cut_names + [None]
+    codes = {cut: code for code, cut in enumerate(manifest["cuts"])}
+    add_array("stone_cuts", np.array([codes[snapshot.cuts.get(stone_id)] for stone_id in stone_ids], dtype="<i4"))
+
+    for kind, values in (("setting", snapshot.settings), ("metal", snapshot.metals)):
+        ids = sorted(values)
+        add_ids(f"{kind}_ids", ids)
+        add_array(f"{kind}_values", np.array([values[value_id] for value_id in ids], dtype="<f8"))
+
+    for kind, body in bodies.items():
+        manifest["bodies"][kind] = {"length": len(body)}
+        sections.append((f"body:{kind}", body))
+
+    # Section offsets are relative to the 8-byte aligned end of the manifest
+    offset = 0
+    for name, data in sections:
+        entry = manifest["bodies"][name[5:]] if name.startswith("body:") else manifest["arrays"][name]
+        entry["offset"] = offset
+        offset = (offset + len(data) + 7) // 8 * 8
+
+    manifest_bytes = json.dumps(manifest).encode()
+    output = bytearray(MAGIC + struct.pack("<I", len(manifest_bytes)) + manifest_bytes)
+    base = (len(output) + 7) // 8 * 8
+    for name, data in sections:
+        entry = manifest["bodies"][name[5:]] if name.startswith("body:") else manifest["arrays"][name]
+        output.extend(b"\0" * (base + entry["offset"] - len(output)))
+        output.extend(data)
+    return bytes(output)
+
+
+def write_snapshot_file(path: str, data: bytes) -> None:
+    """Write and atomically publish a snapshot file"""
+    temporary = f"{path}.{os.getpid()}.tmp"
+    with open(temporary, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temporary, path)
+
+
+class MappedSnapshot:
+    """A read-only mapping of one snapshot file"""
+
+    def __init__(self, path: str):
+        import numpy as np
+
+        with open(path, "rb") as f:
+            self.identity = os.fstat(f.fileno())
+            self.buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.buffer[:4] != MAGIC:
+            raise ValueError(f"{path} is not a catalog snapshot")
+        manifest_length = struct.unpack_from("<I", self.buffer, 4)[0]
+        self.manifest = json.loads(self.buffer[8:8 + manifest_length])
+        self.base = (8 + manifest_length + 7) // 8 * 8
+        if self.manifest.get("format") != FORMAT_VERSION:
+            raise ValueError(f"Unsupported catalog snapshot format {self.manifest.get('format')}")
+
+        def array(name: str):
+            entry = self.manifest["arrays"][name]
+            return np.frombuffer(self.buffer, dtype=entry["dtype"], count=entry["count"], offset=self.base + entry["offset"])
+
+        stones = _IdIndex(array("stone_ids"))
+        settings = _IdIndex(array("setting_ids"))
+        metals = _IdIndex(array("metal_ids"))
+        self.version = self.manifest["version"]
+        self.published = self.manifest["published"]
+        self.snapshot = CatalogSnapshot(
+            self.version,
+            self.published,
+            _StoneSizes(stones, array("stone_offsets"), array("stone_carats"), array("stone_prices")),
+            _StoneCuts(stones, array("stone_cuts"), self.manifest["cuts"]),
+            _ValueMap(settings, array("setting_values")),
+            _ValueMap(metals, array("metal_values")),
+        )
+
+    def body(self, kind: str) -> Optional[bytes]:
+        entry = self.manifest["bodies"].get(kind)
+        if entry is None:
+            return None
+        start = self.base + entry["offset"]
+        return self.buffer[start:start + entry["length"]]
+
+
+class SharedCatalog:
+    """Maps the host's shared snapshot and, in the elected worker, keeps it current"""
+
+    def __init__(self, path: Optional[str], refresh_seconds: float = 1.0, check_seconds: float = 0.5):
+        self.path = path
+        self.refresh_seconds = refresh_seconds
+        self.check_seconds = check_seconds
+        self.mapped: Optional[MappedSnapshot] = None
+        self.is_refresher = False
+        self.writes = 0
+        self.remaps = 0
+        self._checked_at = 0.0
+        self._lock_file = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.path)
+
+    def current(self) -> Optional[MappedSnapshot]:
+        """The mapped snapshot, remapped at most every check_seconds when the file was replaced"""
+        if not self.enabled:
+            return None
+        now = time.monotonic()
+        if now - self._checked_at >= self.check_seconds:
+            self._checked_at = now
+            try:
+                identity = os.stat(self.path)
+                mapped = self.mapped
+                if mapped is None or (identity.st_ino, identity.st_mtime_ns) != (mapped.identity.st_ino, mapped.identity.st_mtime_ns):
+                    self.mapped = MappedSnapshot(self.path)
+                    self.remaps += 1
+            except FileNotFoundError:
+                pass
+            except Exception as e:
+                logger.error("Error mapping catalog snapshot %s: %s", self.path, e)
+        return self.mapped
+
+    def snapshot(self) -> Optional[CatalogSnapshot]:
+        mapped = self.current()
+        return mapped.snapshot if mapped else None
+
+    def body(self, kind: str, version: int) -> Optional[bytes]:
+        """Pre-rendered list body for `kind`, only if the snapshot is at `version`"""
+        mapped = self.current()
+        if mapped is None or mapped.published != version:
+            return None
+        return mapped.body(kind)
+
+    def _try_lead(self) -> bool:
+        if self.is_refresher:
+            return True
+        lock_file = open(f"{self.path}.lock", "a+")
+        try:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        # Held for the life of the process; the OS releases it if the worker dies
+        self._lock_file = lock_file
+        self.is_refresher = True
+        logger.info("Worker %s is refreshing the shared catalog snapshot", os.getpid())
+        return True
+
+    async def refresh(self, db: AsyncIOMotorDatabase) -> bool:
+        """Rewrite the snapshot if the published catalog version moved (refresher only)"""
+        version = await get_catalog_version(db)
+        mapped = self.current()
+        if version == 0 or (mapped is not None and mapped.published == version):
+            # Version 0 is a catalog that has not been seeded yet
+            return False
+
+        snapshot = await catalog_state.load(db, version)
+        if not (snapshot.stones and snapshot.settings and snapshot.metals):
+            logger.warning("Not writing shared catalog snapshot for version %s: catalog is empty", version)
+            return False
+        bodies = {}
+        for kind, model in LIST_MODELS.items():
+            docs = await db[kind].find({"is_active": True}).to_list(100)
+            bodies[kind] = serialize(model(**decode_doc(doc)).dict() for doc in docs)
+        data = await run_in_threadpool(encode_snapshot, snapshot, bodies)
+        await run_in_threadpool(write_snapshot_file, self.path, data)
+        self.writes += 1
+        self._checked_at = 0.0
+        logger.info("Wrote shared catalog snapshot for version %s (%s bytes)", version, len(data))
+        return True
+
+    async def _run(self, db: AsyncIOMotorDatabase) -> None:
+        while True:
+            try:
+                if self._try_lead():
+                    await self.refresh(db)
+            except Exception as e:
+                logger.error("Shared catalog refresh failed: %s", e)
+            await asyncio.sleep(self.refresh_seconds)
+
+    async def start(self, db: AsyncIOMotorDatabase) -> None:
+        if self.enabled and self._task is None:
+            self._task = asyncio.create_task(self._run(db))
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._lock_file is not None:
+            self._lock_file.close()
+            self._lock_file = None
+            self.is_refresher = False
+
+    def stats(self) -> Dict[str, Any]:
+        mapped = self.mapped
+        return {
+            "enabled": self.enabled,
+            "path": self.path,
+            "refresher": self.is_refresher,
+            "catalog_version": mapped.version if mapped else None,
+            "published": mapped.published if mapped else None,
+            "file_bytes": len(mapped.buffer) if mapped else 0,
+            "writes": self.writes,
+            "remaps": self.remaps,
+        }
+
+
+shared_catalog = SharedCatalog(
+    os.environ.get("CATALOG_SNAPSHOT_PATH"),
+    refresh_seconds=float(os.environ.get("CATALOG_SNAPSHOT_REFRESH_SECONDS", "1.0")),
+)
@@ -0,0 +1,434 @@
+from typing import Iterator, Iterable, Dict, List, Optional, Tuple, Any, TextIO
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import UpdateOne
+from starlette.concurrency import run_in_threadpool
+from models.catalog_admin import CatalogImportReport
+from services.catalog_version import (
+    reserve_catalog_version, publish_catalog_version, release_catalog_version, get_catalog_version,
+)
+from services.catalog_revisions import record_version
+from services.storage_ids import encode_id
+from datetime import datetime
+import csv
+import itertools
+import json
+import logging
+import os
+import re
+import uuid
+
+logger = logging.getLogger(__name__)
+
+MAX_REPORTED_ERRORS = 50
+# Largest single product a products.json export may hold, in characters
+MAX_PRODUCT_CHARS = int(os.environ.get("SHOPIFY_MAX_PRODUCT_CHARS", str(16 * 1024 * 1024)))
+
+# collection -> field holding the Shopify key
+SHOPIFY_KEYS = {
+    "stones": "shopify_product_id",
+    "settings": "shopify_variant_id",
+    "metals": "shopify_option_id",
+}
+
+
+# Parsing
+
+def _shopify_id(value: Any) -> str:
+    """Normalize REST ids and GraphQL gids (gid://shopify/Product/123) to plain strings"""
+    value = str(value)
+    return value.rsplit("/", 1)[-1] if value.startswith("gid://") else value
+
+
+def iter_json_products(stream: TextIO, chunk_size: int = 65536,
+                       max_product_size: int = MAX_PRODUCT_CHARS) -> Iterator[Dict]:
+    """Incrementally yield products from a products.json export.
+
+    Accepts either a top-level array or an object with a "products" array; only
+    one product is held in memory at a time. A product that fails to decode is
+    retried only after its buffered text has doubled, so a product spanning many
+    chunks costs linear rather than quadratic parse time, and a product larger
+    than `max_product_size` characters (or a malformed one) fails at its offset
+    instead of pulling the rest of the file into memory.
+    """
+    decoder = json.JSONDecoder()
+    buffer = ""
+    consumed = 0  # characters dropped from the front of the buffer, for error offsets
+    eof = False
+
+    def fill(size: int = 0) -> bool:
+        """Read at least one chunk, and until the buffer holds `size` characters; False at end of input"""
+        nonlocal buffer, eof
+        read = False
+        while not eof and (not read or len(buffer) < size):
+            chunk = stream.read(chunk_size)
+            if not chunk:
+                eof = True
+                break
+            buffer += chunk
+            read = True
+        return read
+
+    # Locate the opening bracket of the product array
+    start = re.compile(r'^\s*(\[|\{\s*"products"\s*:\s*\[)')
+    while True:
+        match = start.match(buffer)
+        if match:
+            pos = match.end()
+            break
+        if not fill():
+            raise ValueError("Expected a JSON array of products or an object with a 'products' array")
+
+    while True:
+        while True:
+            while pos < len(buffer) and buffer[pos] in " \t\r\n,":
+                pos += 1
+            if pos < len(buffer) or not fill():
+                break
+        if pos >= len(buffer):
+            raise ValueError("Unexpected end of JSON product export")
+        if buffer[pos] == "]":
+            return
+
+        try:
+            product, end = decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError:
+            pending = len(buffer) - pos
+            if pending > max_product_size:
+                raise ValueError(
+                    f"Malformed JSON product export: product at offset {consumed + pos} is not valid JSON "
+                    f"within {max_product_size} characters"
+                )
+            if not fill(pos + min(2 * pending, max_product_size + 1)):
+                raise ValueError(f"Malformed JSON product export at offset {consumed + pos}")
+            continue
+
+        yield product
+        buffer = buffer[end:]
+        consumed += end
+        pos = 0
+
+
+def iter_jsonl_products(stream: TextIO) -> Iterator[Dict]:
+    """Yield products from JSON Lines, including Bulk Operation output where
+    variants follow their product as separate lines carrying __parentId"""
+    current = None
+    for line in stream:
+        line = line.strip()
+        if not line:
+            continue
+        record = json.loads(line)
+        parent_id = record.pop("__parentId", None)
+        if parent_id is None:
+            if current is not None:
+                yield current
+            current = record
+            current.setdefault("variants", [])
+            if isinstance(current["variants"], dict):
+                # GraphQL connection shape: {"edges": [{"node": {...}}]}
+                current["variants"] = [edge["node"] for edge in current["variants"].get("edges", [])]
+        elif current is not None and _shopify_id(parent_id) == _shopify_id(current.get("id")):
+            current["variants"].append(record)
+    if current is not None:
+        yield current
+
+
+def iter_csv_products(stream: TextIO) -> Iterator[Dict]:
+    """Yield products from a Shopify product CSV export.
+
+    Rows are grouped by Handle; the first row carries product fields and every
+    row may carry a variant. "ID"/"Variant ID" columns (present in Matrixify
+    exports) are used as keys when available, otherwise the handle and SKU.
+    """
+    reader = csv.DictReader(stream)
+    for handle, rows in itertools.groupby(reader, key=lambda row: row.get("Handle", "")):
+        rows = list(rows)
+        first = rows[0]
+        option_names = [first.get(f"Option{i} Name") for i in (1, 2, 3)]
+        product = {
+            "id": first.get("ID") or handle,
+            "handle": handle,
+            "title": first.get("Title", ""),
+            "body_html": first.get("Body (HTML)", ""),
+            "product_type": first.get("Type", ""),
+            "tags": first.get("Tags", ""),
+            "images": [{"src": row["Image Src"]} for row in rows if row.get("Image Src")],
+            "options": [{"name": name} for name in option_names if name],
+            "variants": [],
+        }
+        for row in rows:
+            if not row.get("Variant Price"):
+                continue
+            variant_key = row.get("Variant SKU") or row.get("Option1 Value") or str(len(product["variants"]))
+            product["variants"].append({
+                "id": row.get("Variant ID") or f"{handle}:{variant_key}",
+                "title": " / ".join(v for v in (row.get("Option1 Value"), row.get("Option2 Value")) if v),
+                "option1": row.get("Option1 Value"),
+                "option2": row.get("Option2 Value"),
+                "price": row.get("Variant Price"),
+                "inventory_quantity": row.get("Variant Inventory Qty"),
+            })
+        yield product
+
+
+PARSERS = {
+    "json": iter_json_products,
+    "jsonl": iter_jsonl_products,
+    "csv": iter_csv_products,
+}
+
+
+def detect_format(filename: Optional[str]) -> str:
+    """Guess the export format from a file name"""
+    name = (filename or "").lower()
+    if name.endswith(".csv"):
+        return "csv"
+    if name.endswith((".jsonl", ".ndjson")):
+        return "jsonl"
+    return "json"
+
+
+# Mapping
+
+def _tags(product: Dict) -> Dict[str, str]:
+    """Parse "key:value" tags into a dict; plain tags map to themselves"""
+    tags = product.get("tags") or []
+    if isinstance(tags, str):
+        tags = tags.split(",")
+    parsed = {}
+    for tag in tags:
+        tag = tag.strip()
+        if not tag:
+            continue
+        key, _, value = tag.partition(":")
+        parsed.setdefault(key.strip().lower(), value.strip() if value else tag)
+    return parsed
+
+
+def _personality_tags(product: Dict) -> List[str]:
+    tags = product.get("tags") or []
+    if isinstance(tags, str):
+        tags = tags.split(",")
+    return [t.split(":", 1)[1].strip().lower() for t in tags if t.strip().lower().startswith("personality:")]
+
+
+def _images(product: Dict) -> List[str]:
+    return [image["src"] for image in product.get("images") or [] if image.get("src")]
+
+
+def _carat(variant: Dict) -> Optional[float]:
+    for field in ("option1", "option2", "title"):
+        match = re.search(r"(\d+(?:\.\d+)?)\s*(?:ct|carat)?", str(variant.get(field) or ""), re.IGNORECASE)
+        if match:
+            return float(match.group(1))
+    return None
+
+
+def _availability(variant: Dict) -> str:
+    quantity = variant.get("inventory_quantity")
+    if quantity in (None, ""):
+        return "in_stock"
+    return "in_stock" if int(float(quantity)) > 0 else "out_of_stock"
+
+
+def _variant_title(product: Dict, variant: Dict) -> str:
+    title = variant.get("title")
+    if not title or title == "Default Title":
+        return product.get("title", "")
+    return f"{product.get('title', '')} - {title}"
+
+
+def map_product(product: Dict) -> List[Tuple[str, str, Dict]]:
+    """Map a Shopify product to (collection, shopify key, document fields) tuples"""
+    product_type = (product.get("product_type") or "").lower()
+    tags = _tags(product)
+    description = product.get("body_html") or ""
+    variants = product.get("variants") or []
+
+    if any(word in product_type for word in ("stone", "moissanite", "diamond")):
+        sizes = []
+        for variant in variants:
+            carat = _carat(variant)
+            if carat is None:
+                raise ValueError(f"variant {variant.get('id')} has no carat weight")
+            sizes.append({"carat": carat, "price": float(variant["price"]), "availability": _availability(variant)})
+        if not sizes:
+            raise ValueError("stone product has no variants")
+        title = product.get("title", "")
+        return [("stones", _shopify_id(product["id"]), {
+            "name": title,
+            "type": tags.get("type", "moissanite"),
+            "cut": tags.get("cut", title.split(" ")[0].lower()),
+            "sizes": sorted(sizes, key=lambda size: size["carat"]),
+            "images": _images(product),
+            "description": description,
+        })]
+
+    if "setting" in product_type:
+        return [("settings", _shopify_id(variant["id"]), {
+            "name": _variant_title(product, variant),
+            "base_price": float(variant["price"]),
+            "images": _images(product),
+            "description": description,
+            "personality_tags": _personality_tags(product),
+        }) for variant in variants]
+
+    if "metal" in product_type:
+        if "multiplier" not in tags:
+            raise ValueError("metal product is missing a 'multiplier:<value>' tag")
+        name = product.get("title", "")
+        options = product.get("options") or []
+        key = options[0].get("id") if options and options[0].get("id") else product["id"]
+        return [("metals", _shopify_id(key), {
+            "name": name,
+            "type": tags.get("metal_type", "platinum" if "platinum" in name.lower() else "gold"),
+            "multiplier": float(tags["multiplier"]),
+            "images": _images(product),
+            "description": description,
+        })]
+
+    raise ValueError(f"unsupported product type '{product.get('product_type')}'")
+
+
+# Applying
+
+class ShopifyCatalogImporter:
+    """Applies mapped Shopify products to the catalog with batched bulk_write upserts.
+
+    Each batch is diffed against the stored items first, so only new or changed
+    items are written and stamped with the import's catalog version.
+    """
+
+    def __init__(self, db: AsyncIOMotorDatabase, batch_size: int = 500, deactivate_missing: bool = False):
+        self.db = db
+        self.batch_size = batch_size
+        self.deactivate_missing = deactivate_missing
+        self.report = CatalogImportReport()
+        self.version: Optional[int] = None
+        self._pending: Dict[str, Dict[str, Dict]] = {name: {} for name in SHOPIFY_KEYS}
+        self._seen: Dict[str, set] = {name: set() for name in SHOPIFY_KEYS}
+
+    def _record_error(self, message: str) -> None:
+        self.report.skipped += 1
+        if len(self.report.errors) < MAX_REPORTED_ERRORS:
+            self.report.errors.append(message)
+
+    def _queue(self, collection: str, key: str, fields: Dict) -> None:
+        self._seen[collection].add(key)
+        self._pending[collection][key] = {**fields, "is_active": True}
+
+    async def _flush(self, collection: str) -> None:
+        pending = self._pending[collection]
+        if not pending:
+            return
+        self._pending[collection] = {}
+
+        key_field = SHOPIFY_KEYS[collection]
+        projection = {field: 1 for fields in pending.values() for field in fields}
+        projection.update({key_field: 1, "_id": 0})
+        existing = {
+            doc[key_field]: doc
+            async for doc in self.db[collection].find({key_field: {"$in": list(pending)}}, projection)
+        }
+
+        counts = getattr(self.report, collection)
+        operations = []
+        for key, fields in pending.items():
+            current = existing.get(key)
+            if current is None:
+                counts.created += 1
+            elif any(current.get(field) != value for field, value in fields.items()):
+                counts.updated += 1
+            else:
+                counts.unchanged += 1
+                continue
+            operations.append(UpdateOne(
+                {key_field: key},
+                {
+                    "$set": {**fields, "catalog_version": self.version},
+                    "$setOnInsert": {"id": encode_id(str(uuid.uuid4())), key_field: key, "created_at": datetime.utcnow()},
+                },
+                upsert=True
+            ))
+        if operations:
+            await self.db[collection].bulk_write(operations, ordered=False)
+
+    async def apply(self, products: Iterable[Dict]) -> CatalogImportReport:
+        """Consume a product stream and return the import diff"""
+        self.version = await reserve_catalog_version(self.db)
+        try:
+            return await self._apply(products)
+        except BaseException:
+            await release_catalog_version(self.db, self.version)
+            raise
+
+    async def _apply(self, products: Iterable[Dict]) -> CatalogImportReport:
+        products = iter(products)
+        while True:
+            # Parsing is CPU-bound, so pull each batch off the event loop
+            batch = await run_in_threadpool(lambda: list(itertools.islice(products, self.batch_size)))
+            if not batch:
+                break
+
+            for product in batch:
+                self.report.products_read += 1
+                try:
+                    mapped = map_product(product)
+                except (KeyError, TypeError, ValueError) as e:
+                    self._record_error(f"product {product.get('id')}: {e}")
+                    continue
+                for collection, key, fields in mapped:
+                    self._queue(collection, key, fields)
+
+            for collection in SHOPIFY_KEYS:
+                if len(self._pending[collection]) >= self.batch_size:
+                    await self._flush(collection)
+
+        for collection in SHOPIFY_KEYS:
+            await self._flush(collection)
+
+        if self.deactivate_missing:
+            await self._deactivate_missing()
+
+        changed = sum(
+            counts.created + counts.updated + counts.deactivated
+            for counts in (self.report.stones, self.report.settings, self.report.metals)
+        )
+        if not changed:
+            # An empty or no-op import leaves the published catalog (and every cache keyed on it) alone
+            await release_catalog_version(self.db, self.version)
+            self.report.catalog_version = await get_catalog_version(self.db)
+            logger.info("Shopify import finished without changes: %s products, %s skipped",
+                        self.report.products_read, self.report.skipped)
+            return self.report
+
+        # One catalog version for the whole import, published once everything is written
+        await record_version(self.db, self.version)
+        self.report.catalog_version = await publish_catalog_version(self.db, self.version)
+        logger.info("Shopify import finished: %s products, %s skipped", self.report.products_read, self.report.skipped)
+        return self.report
+
+    async def _deactivate_missing(self) -> None:
+        """Deactivate Shopify-linked items that were not present in the export"""
+        for collection, key_field in SHOPIFY_KEYS.items():
+            seen = self._seen[collection]
+            if not seen:
+                continue
+            result = await self.db[collection].update_many(
+                {key_field: {"$nin": list(seen), "$ne": None}, "is_active": True},
+                {"$set": {"is_active": False, "catalog_version": self.version}}
+            )
+            getattr(self.report, collection).deactivated += result.modified_count
+
+
+async def import_shopify_export(
+    db: AsyncIOMotorDatabase,
+    stream: TextIO,
+    export_format: str,
+    batch_size: int = 500,
+    deactivate_missing: bool = False
+) -> CatalogImportReport:
+    """Stream-parse a Shopify export and upsert it into the catalog"""
+    if export_format not in PARSERS:
+        raise ValueError(f"Unsupported export format '{export_format}'")
+    importer = ShopifyCatalogImporter(db, batch_size=batch_size, deactivate_missing=deactivate_missing)
+    return await importer.apply(PARSERS[export_format](stream))
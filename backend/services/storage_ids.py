@@ -0,0 +1,81 @@
+"""Storage representation of entity ids.
+
+The API always speaks 36-character UUID strings. With ID_STORAGE=binary, ids are
+stored as 16-byte BSON binary UUIDs (subtype 4) instead, shrinking documents and
+every index that contains them. Reads decode either form, and id filters match
+both while a collection is being migrated (scripts.migrate_ids).
+"""
+from typing import Any, Dict, Iterable
+from bson.binary import Binary, UUID_SUBTYPE
+import os
+import uuid
+
+ID_STORAGE = os.environ.get("ID_STORAGE", "string")
+
+# Field names holding entity ids, at any nesting level
+ID_FIELDS = {"id", "stone_id", "setting_id", "metal_id", "quote_request_id", "configuration_id", "hold_id"}
+
+
+def binary_ids_enabled() -> bool:
+    return ID_STORAGE == "binary"
+
+
+def to_binary(value: Any) -> Any:
+    """UUID string -> BSON binary UUID; anything else is returned unchanged"""
+    if isinstance(value, str):
+        try:
+            return Binary.from_uuid(uuid.UUID(value))
+        except ValueError:
+            return value
+    return value
+
+
+def decode_id(value: Any) -> Any:
+    """BSON binary UUID -> canonical string; anything else is returned unchanged"""
+    if isinstance(value, Binary) and value.subtype == UUID_SUBTYPE:
+        return str(value.as_uuid())
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    return value
+
+
+def encode_id(value: Any) -> Any:
+    return to_binary(value) if binary_ids_enabled() else value
+
+
+def convert_ids(doc: Any, convert) -> Any:
+    """Apply convert to every id field of a document or value, at any depth"""
+    if isinstance(doc, dict):
+        return {
+            key: convert(value) if key in ID_FIELDS and not isinstance(value, (dict, list)) else convert_ids(value, convert)
+            for key, value in doc.items()
+        }
+    if isinstance(doc, list):
+        return [convert_ids(value, convert) for value in doc]
+    return doc
+
+
+def encode_doc(doc: Dict[str, Any]) -> Dict[str, Any]:
+    """Convert id fields of a document (including embedded ones) to the storage form"""
+    return convert_ids(doc, encode_id) if binary_ids_enabled() else doc
+
+
+def decode_doc(doc: Dict[str, Any]) -> Dict[str, Any]:
+    """Convert stored id fields back to strings, whatever form they were stored in"""
+    return convert_ids(doc, decode_id)
+
+
+def match_id(value: str) -> Any:
+    """Filter value matching an id in either storage form"""
+    if not binary_ids_enabled():
+        return value
+    binary = to_binary(value)
+    return {"$in": [binary, value]} if binary is not value else value
+
+
+def match_ids(values: Iterable[str]) -> Dict[str, Any]:
+    """$in filter matching any of the ids in either storage form"""
+    values = list(values)
+    if not binary_ids_enabled():
+        return {"$in": values}
+    return {"$in": values + [to_binary(value) for value in values]}
@@ -0,0 +1,30 @@
+"""Background warm-up run once the server is accepting connections.
+
+Index builds, default data seeding and the first catalog/rules loads all touch
+MongoDB; running them here keeps startup from blocking on the database, and
+the first requests simply load whatever has not been warmed yet themselves.
+"""
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from services.indexes import ensure_indexes
+from services.ring_builder_service import RingBuilderService
+from services.catalog_state import catalog_state
+from services.pricing_rules import pricing_rules
+from services.recommendations import recommendation_engine
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+
+async def warm_up(db: AsyncIOMotorDatabase) -> None:
+    started = time.monotonic()
+    await ensure_indexes(db)
+    try:
+        await RingBuilderService(db)._ensure_data_initialized()
+        await catalog_state.get(db)
+        await pricing_rules.get(db)
+        await recommendation_engine.refresh(db)
+    except Exception as e:
+        logger.error("Error warming catalog caches: %s", e)
+        return
+    logger.info("Catalog caches warm after %.2fs", time.monotonic() - started)
@@ -0,0 +1,115 @@
+"""Catalog deltas and full snapshots from get_catalog_changes, against the embedded backend."""
+import asyncio
+import sys
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / "backend"
+if str(BACKEND_DIR) not in sys.path:
+    sys.path.insert(0, str(BACKEND_DIR))
+
+from models.ring_builder import Stone, StoneSize  # noqa: E402
+from services.catalog_version import (  # noqa: E402
+    publish_catalog_version, release_catalog_version, reserve_catalog_version,
+)
+from services.embedded_store import EmbeddedDatabase  # noqa: E402
+from services.repositories import CATALOG_PAGE_SIZE, CatalogRepository  # noqa: E402
+from services.ring_builder_service import RingBuilderService  # noqa: E402
+
+
+def _run(coro):
+    return asyncio.run(coro)
+
+
+def _stone(name: str, version: int, price: float = 500.0) -> dict:
+    return Stone(
+        name=name, type="moissanite", cut="round", sizes=[StoneSize(carat=1.0, price=price)],
+        images=[], description=name, catalog_version=version
+    ).dict()
+
+
+async def _write(db, *names, price: float = 500.0) -> int:
+    """Insert stones under a newly reserved version and publish it"""
+    version = await reserve_catalog_version(db)
+    for name in names:
+        await CatalogRepository(db, "stones").insert(_stone(name, version, price))
+    await publish_catalog_version(db, version)
+    return version
+
+
+def test_full_snapshot_holds_every_active_item():
+    db = EmbeddedDatabase("test")
+    service = RingBuilderService(db)
+
+    async def scenario():
+        await _write(db, *(f"stone-{n}" for n in range(CATALOG_PAGE_SIZE + 50)))
+        return await service.get_catalog_changes(0)
+
+    changes = _run(scenario())
+    assert changes.full
+    assert len(changes.stones) == CATALOG_PAGE_SIZE + 50
+
+
+def test_delta_carries_changed_and_removed_items_only():
+    db = EmbeddedDatabase("test")
+    service = RingBuilderService(db)
+
+    async def scenario():
+        first = await _write(db, "kept", "dropped")
+        second = await _write(db, "added")
+        version = await reserve_catalog_version(db)
+        await db.stones.update_one({"name": "dropped"}, {"$set": {"is_active": False, "catalog_version": version}})
+        await publish_catalog_version(db, version)
+        return first, await service.get_catalog_changes(first), second
+
+    first, changes, second = _run(scenario())
+    assert not changes.full and changes.since == first
+    assert [stone.name for stone in changes.stones] == ["added"]
+    assert len(changes.removed["stones"]) == 1
+    assert changes.catalog_version == second + 1
+
+
+def test_delta_stops_below_a_write_still_in_progress():
+    db = EmbeddedDatabase("test")
+    service = RingBuilderService(db)
+
+    async def scenario():
+        base = await _write(db, "base")
+        slow = await reserve_catalog_version(db)
+        await _write(db, "fast")  # published after the slow writer reserved
+        during = await service.get_catalog_changes(base)
+        await CatalogRepository(db, "stones").insert(_stone("slow", slow))
+        await publish_catalog_version(db, slow)
+        after = await service.get_catalog_changes(base)
+        return base, during, after
+
+    base, during, after = _run(scenario())
+    assert during.catalog_version == base and during.stones == []
+    assert sorted(stone.name for stone in after.stones) == ["fast", "slow"]
+
+
+def test_released_reservation_does_not_hold_back_deltas():
+    db = EmbeddedDatabase("test")
+    service = RingBuilderService(db)
+
+    async def scenario():
+        base = await _write(db, "base")
+        await release_catalog_version(db, await reserve_catalog_version(db))
+        latest = await _write(db, "later")
+        return latest, await service.get_catalog_changes(base)
+
+    latest, changes = _run(scenario())
+    assert changes.catalog_version == latest
+    assert [stone.name for stone in changes.stones] == ["later"]
+
+
+def test_clients_ahead_of_the_catalog_get_a_full_snapshot():
+    db = EmbeddedDatabase("test")
+    service = RingBuilderService(db)
+
+    async def scenario():
+        version = await _write(db, "only")
+        return version, await service.get_catalog_changes(version + 5)
+
+    version, changes = _run(scenario())
+    assert changes.full and changes.catalog_version == version
+    assert [stone.name for stone in changes.stones] == ["only"]
@@ -0,0 +1,49 @@
+"""Cold-start budget for the backend: importing server must stay fast and offline."""
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / "backend"
+BUDGET_SECONDS = float(os.environ.get("COLD_START_BUDGET_SECONDS", "2.0"))
+
+PROBE = """
+import json, sys, time
+started = time.perf_counter()
+import server
+elapsed = time.perf_counter() - started
+import database
+server.create_app()
+print(json.dumps({
+    "seconds": elapsed,
+    "connected": database._client is not None,
+    "numpy": "numpy" in sys.modules,
+}))
+"""
+
+
+def _probe():
+    env = dict(os.environ)
+    # Anything that tried to reach this address at import would fail loudly
+    env["MONGO_URL"] = "mongodb://cold-start.invalid:27017/?serverSelectionTimeoutMS=100"
+    env.setdefault("DB_NAME", "cold_start")
+    result = subprocess.run(
+        [sys.executable, "-c", PROBE],
+        cwd=BACKEND_DIR, env=env, capture_output=True, text=True, timeout=60
+    )
+    assert result.returncode == 0, result.stderr
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def test_cold_import_within_budget():
+    probe = _probe()
+    assert probe["seconds"] <= BUDGET_SECONDS, (
+        f"import server took {probe['seconds']:.2f}s, budget is {BUDGET_SECONDS:.2f}s"
+    )
+
+
+def test_app_constructible_without_database():
+    probe = _probe()
+    assert not probe["connected"]
+    assert not probe["numpy"]
@@ -0,0 +1,84 @@
+"""Currency conversion tables and rounding rules."""
+import asyncio
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / "backend"
+if str(BACKEND_DIR) not in sys.path:
+    sys.path.insert(0, str(BACKEND_DIR))
+
+from models.currency import CurrencyRates, CurrencyRule  # noqa: E402
+from services.catalog_state import CatalogSnapshot, price_selection  # noqa: E402
+from services.currency import CurrencyTables, get_rates, round_prices, set_rates  # noqa: E402
+from services.embedded_store import EmbeddedDatabase  # noqa: E402
+
+
+def _run(coro):
+    return asyncio.run(coro)
+
+
+def _rounded(values, **rule) -> list:
+    return round_prices(np.array(values, dtype=np.float64), CurrencyRule(rate=1.0, **rule)).tolist()
+
+
+def test_nearest_rounds_to_the_currency_decimals():
+    assert _rounded([10.004, 10.006, 0.1 + 0.2]) == [10.0, 10.01, 0.3]
+    assert _rounded([150.4, 150.6], decimals=0) == [150.0, 151.0]
+
+
+def test_up_and_down_leave_exact_amounts_alone():
+    # Float noise from the conversion must not push an exact amount to the next step
+    assert _rounded([10.01, 450 * 1.1, 10.011], rounding="up") == [10.01, 495.0, 10.02]
+    assert _rounded([10.01, 0.7 * 3, 10.019], rounding="down") == [10.01, 2.1, 10.01]
+
+
+def test_increment_rounds_to_cash_steps():
+    assert _rounded([1.02, 1.03, 1.07], increment=0.05) == [1.0, 1.05, 1.05]
+    assert _rounded([1.01], increment=0.05, rounding="up") == [1.05]
+    assert _rounded([149.0, 151.0], decimals=0, increment=100.0) == [100.0, 200.0]
+
+
+def test_tables_convert_every_price_and_keep_multipliers():
+    snapshot = CatalogSnapshot(
+        3, 3, {"stone": {0.5: 450.0, 1.0: 750.0}}, {"stone": "round"}, {"setting": 200.0}, {"metal": 1.5}
+    )
+    rates = CurrencyRates(currencies={
+        "EUR": CurrencyRule(rate=0.92),
+        "JPY": CurrencyRule(rate=151.3, decimals=0),
+    })
+
+    tables = CurrencyTables._build(snapshot, rates)
+
+    eur, jpy = tables["EUR"], tables["JPY"]
+    assert eur.stones == {"stone": {0.5: 414.0, 1.0: 690.0}} and eur.settings == {"setting": 184.0}
+    assert jpy.stones == {"stone": {0.5: 68085.0, 1.0: 113475.0}} and jpy.settings == {"setting": 30260.0}
+    assert (jpy.currency, jpy.rate, jpy.decimals, jpy.version) == ("JPY", 151.3, 0, 3)
+    assert jpy.metals is snapshot.metals and jpy.cuts is snapshot.cuts
+
+
+def test_converted_price_uses_the_currency_decimals():
+    snapshot = CatalogSnapshot(1, 1, {"stone": {1.0: 750.0}}, {"stone": "round"}, {"setting": 200.0}, {"metal": 1.1})
+    jpy = CurrencyTables._build(snapshot, CurrencyRates(currencies={"JPY": CurrencyRule(rate=151.3, decimals=0)}))["JPY"]
+
+    price = price_selection(jpy, "stone", "setting", "metal", 1.0)
+
+    assert price["currency"] == "JPY"
+    assert price["total_price"] == round((113475.0 + 30260.0) * 1.1)
+
+
+def test_rates_round_trip_and_require_the_base_currency():
+    db = EmbeddedDatabase("test")
+
+    async def scenario():
+        await set_rates(db, CurrencyRates(currencies={"eur": CurrencyRule(rate=0.92)}))
+        second = await set_rates(db, CurrencyRates(currencies={"eur": CurrencyRule(rate=0.95)}))
+        return second, await get_rates(db)
+
+    second, stored = _run(scenario())
+    assert second.version == 2
+    assert stored.currencies["EUR"].rate == 0.95
+    with pytest.raises(ValueError):
+        _run(set_rates(db, CurrencyRates(base="EUR")))
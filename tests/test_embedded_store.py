@@ -0,0 +1,128 @@
+"""Update semantics and concurrency guards of the embedded storage backend (STORAGE_BACKEND=embedded)."""
+import asyncio
+import sys
+from pathlib import Path
+
+import pytest
+from pymongo import ReturnDocument
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / "backend"
+if str(BACKEND_DIR) not in sys.path:
+    sys.path.insert(0, str(BACKEND_DIR))
+
+from services.embedded_store import EmbeddedDatabase  # noqa: E402
+from models.inventory import InventoryHold  # noqa: E402
+from services.inventory import InventoryService, OutOfStockError  # noqa: E402
+
+
+def _run(coro):
+    return asyncio.run(coro)
+
+
+def test_upsert_inserts_once_then_updates():
+    db = EmbeddedDatabase("test")
+
+    async def scenario():
+        update = {"$set": {"price": 10}, "$setOnInsert": {"created": True}}
+        first = await db.items.update_one({"sku": "a"}, update, upsert=True)
+        second = await db.items.update_one({"sku": "a"}, {"$set": {"price": 12}, "$setOnInsert": {"created": False}}, upsert=True)
+        return first, second, await db.items.find({}, {"_id": 0}).to_list(None)
+
+    first, second, docs = _run(scenario())
+    assert first.upserted_id is not None and first.matched_count == 0
+    assert second.upserted_id is None and second.matched_count == 1
+    # The filter seeds the inserted document and $setOnInsert only applies on insert
+    assert docs == [{"sku": "a", "price": 12, "created": True}]
+
+
+def test_max_only_moves_forward():
+    db = EmbeddedDatabase("test")
+
+    async def scenario():
+        await db.meta.update_one({"_id": "catalog"}, {"$max": {"version": 5}}, upsert=True)
+        await db.meta.update_one({"_id": "catalog"}, {"$max": {"version": 3}})
+        lower = await db.meta.find_one({"_id": "catalog"})
+        await db.meta.update_one({"_id": "catalog"}, {"$max": {"version": 7}})
+        return lower, await db.meta.find_one({"_id": "catalog"})
+
+    lower, higher = _run(scenario())
+    assert lower["version"] == 5
+    assert higher["version"] == 7
+
+
+def test_inc_adds_and_creates_missing_fields():
+    db = EmbeddedDatabase("test")
+
+    async def scenario():
+        await db.inventory.insert_one({"stone_id": "s", "available": 2})
+        await db.inventory.update_one({"stone_id": "s"}, {"$inc": {"available": -1, "held": 1}})
+        await db.inventory.update_one({"stone_id": "s"}, {"$inc": {"available": -1, "held": 1}})
+        return await db.inventory.find_one({"stone_id": "s"}, {"_id": 0})
+
+    assert _run(scenario()) == {"stone_id": "s", "available": 0, "held": 2}
+
+
+def test_find_one_and_update_applies_only_when_guard_matches():
+    db = EmbeddedDatabase("test")
+
+    async def scenario():
+        await db.inventory.insert_one({"stone_id": "s", "available": 1})
+        guard = {"stone_id": "s", "available": {"$gte": 1}}
+        change = {"$inc": {"available": -1}}
+        before = await db.inventory.find_one_and_update(guard, change, projection={"_id": 0})
+        after_miss = await db.inventory.find_one_and_update(guard, change, return_document=ReturnDocument.AFTER)
+        return before, after_miss, await db.inventory.find_one({"stone_id": "s"}, {"_id": 0})
+
+    before, after_miss, stored = _run(scenario())
+    assert before == {"stone_id": "s", "available": 1}  # ReturnDocument.BEFORE is the default
+    assert after_miss is None
+    assert stored == {"stone_id": "s", "available": 0}
+
+
+def test_concurrent_holds_on_last_unit_one_wins():
+    db = EmbeddedDatabase("test")
+    inventory = InventoryService(db)
+
+    async def scenario():
+        await db.inventory.insert_one({"stone_id": "stone", "carat": 1.0, "on_hand": 1, "held": 0, "available": 1})
+        results = await asyncio.gather(
+            inventory.reserve("stone", 1.0), inventory.reserve("stone", 1.0), return_exceptions=True
+        )
+        return results, await db.inventory.find_one({"stone_id": "stone"}, {"_id": 0})
+
+    results, level = _run(scenario())
+    holds = [result for result in results if isinstance(result, InventoryHold)]
+    conflicts = [result for result in results if isinstance(result, OutOfStockError)]
+    assert len(holds) == 1 and len(conflicts) == 1
+    assert (level["available"], level["held"]) == (0, 1)
+
+
+@pytest.fixture
+def api():
+    from fastapi.testclient import TestClient
+    from routers.ring_builder import get_db
+    from server import create_app
+
+    db = EmbeddedDatabase("test")
+    app = create_app()
+    app.dependency_overrides[get_db] = lambda: db
+    # No context manager: startup would start the background services against the configured database
+    return TestClient(app), db
+
+
+def test_patch_with_stale_version_conflicts(api):
+    from models.ring_builder import RingConfiguration
+    from services.ring_builder_service import RingBuilderService
+
+    client, db = api
+    config = RingConfiguration(stone_id="stone", setting_id="setting", metal_id="metal", carat=1.0, total_price=100.0)
+    _run(RingBuilderService(db).save_configuration(config))
+    url = f"/api/ring-builder/configurations/{config.id}"
+
+    first = client.patch(url, json={"version": 1, "personality_type": "modern"})
+    assert first.status_code == 200
+    assert first.json()["version"] == 2
+
+    stale = client.patch(url, json={"version": 1, "personality_type": "classic"})
+    assert stale.status_code == 409
+    assert client.get(url).json()["personality_type"] == "modern"
@@ -0,0 +1,109 @@
+"""Pricing rule selection, ordering and exclusivity in the compiled evaluator."""
+import asyncio
+import sys
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import pytest
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / "backend"
+if str(BACKEND_DIR) not in sys.path:
+    sys.path.insert(0, str(BACKEND_DIR))
+
+from models.pricing import PricingRule  # noqa: E402
+from services.embedded_store import EmbeddedDatabase  # noqa: E402
+from services.pricing_rules import CompiledRules, get_rule_set, set_rule_set  # noqa: E402
+
+AMOUNTS = {"stone": 750.0, "setting": 250.0, "metal_adjustment": 100.0, "total": 1100.0}
+# Naive rule dates are UTC
+NOW = datetime(2026, 6, 1, tzinfo=timezone.utc).timestamp()
+
+
+def _run(coro):
+    return asyncio.run(coro)
+
+
+def _evaluate(rules, stone_id="stone-1", cut="round", setting_id="setting-1", metal_id="metal-1", carat=1.0,
+              amounts=AMOUNTS, **kwargs):
+    kwargs.setdefault("now", NOW)
+    return CompiledRules(1, rules).evaluate(stone_id, cut, setting_id, metal_id, carat, amounts, **kwargs)
+
+
+def _names(lines) -> list:
+    return [line["name"] for line in lines]
+
+
+def test_rules_apply_in_priority_order_across_condition_indexes():
+    rules = [
+        PricingRule(name="global", value=10, priority=1),
+        PricingRule(name="cut", value=5, cuts=["round"], priority=3),
+        PricingRule(name="metal", kind="amount", value=20, metal_ids=["metal-1"], priority=2),
+    ]
+    lines = _evaluate(rules)
+    assert _names(lines) == ["cut", "metal", "global"]
+    assert [line["amount"] for line in lines] == [55.0, 20.0, 110.0]
+
+
+def test_only_rules_whose_conditions_all_match_apply():
+    rules = [
+        PricingRule(name="other stone", value=10, stone_ids=["stone-2"]),
+        PricingRule(name="bundle", value=10, stone_ids=["stone-1"], metal_ids=["metal-2"]),
+        PricingRule(name="large", value=10, min_carat=1.5),
+        PricingRule(name="small", value=10, max_carat=1.0),
+        PricingRule(name="expired", value=10, ends_at=datetime(2026, 5, 1)),
+        PricingRule(name="upcoming", value=10, starts_at=datetime(2026, 7, 1)),
+        PricingRule(name="inactive", value=10, is_active=False),
+    ]
+    assert _names(_evaluate(rules)) == ["small"]
+    assert _names(_evaluate(rules, stone_id="stone-2", metal_id="metal-2", carat=2.0)) == ["other stone", "large"]
+
+
+def test_exclusive_rule_skips_lower_priority_rules_only_when_it_matches():
+    rules = [
+        PricingRule(name="first", value=5, priority=10),
+        PricingRule(name="exclusive", value=20, priority=5, exclusive=True, cuts=["oval"]),
+        PricingRule(name="last", value=10, priority=1),
+    ]
+    assert _names(_evaluate(rules, cut="oval")) == ["first", "exclusive"]
+    assert _names(_evaluate(rules, cut="round")) == ["first", "last"]
+
+
+def test_targets_and_stacking_never_discount_below_zero():
+    rules = [
+        PricingRule(name="stone", value=50, target="stone", priority=2),
+        PricingRule(name="big amount", kind="amount", value=5000, priority=1),
+    ]
+    lines = _evaluate(rules)
+    assert [line["amount"] for line in lines] == [375.0, 725.0]
+    assert sum(line["amount"] for line in lines) == AMOUNTS["total"]
+
+
+def test_amount_rules_convert_to_the_priced_currency():
+    rules = [PricingRule(name="fixed", kind="amount", value=12.345)]
+    assert _evaluate(rules, rate=2.0)[0]["amount"] == 24.69
+    yen = {target: amount * 151.3 for target, amount in AMOUNTS.items()}
+    assert _evaluate(rules, rate=151.3, decimals=0, amounts=yen)[0]["amount"] == 1868.0
+
+
+def test_rule_windows_use_the_evaluation_time():
+    starts = datetime(2026, 6, 1, tzinfo=timezone.utc)
+    rules = [PricingRule(name="sale", value=10, starts_at=starts, ends_at=starts + timedelta(days=1))]
+    assert _names(_evaluate(rules, now=starts.timestamp() - 1)) == []
+    assert _names(_evaluate(rules, now=starts.timestamp())) == ["sale"]
+    assert _names(_evaluate(rules, now=(starts + timedelta(days=1)).timestamp())) == []
+
+
+def test_rule_set_replacement_validates_and_bumps_the_version():
+    db = EmbeddedDatabase("test")
+
+    async def scenario():
+        await set_rule_set(db, [PricingRule(name="a", value=10)])
+        await set_rule_set(db, [PricingRule(name="b", value=5), PricingRule(name="c", value=3)])
+        return await get_rule_set(db)
+
+    stored = _run(scenario())
+    assert stored.version == 2 and [rule.name for rule in stored.rules] == ["b", "c"]
+    with pytest.raises(ValueError):
+        _run(set_rule_set(db, [PricingRule(name="too much", value=150)]))
+    with pytest.raises(ValueError):
+        _run(set_rule_set(db, [PricingRule(name="bad target", value=5, target="shipping")]))